@@ -0,0 +1,100 @@
+from card import getVideoCards, defaultSnapshotFields
+from fleet import Sweep
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import threading
+import time
+
+defaultWorkers = 8
+
+_executor = None
+_executorLock = threading.Lock()
+
+
+def getExecutor():
+	"""Returns the dedicated pool blocking NVML calls are run on."""
+	global _executor
+	with _executorLock:
+		if _executor is None:
+			_executor = ThreadPoolExecutor(max_workers=defaultWorkers, thread_name_prefix='nvml-async')
+		return _executor
+
+
+class AsyncVideoCard:
+	"""Awaitable facade over a VideoCard for asyncio services.
+
+	Every public VideoCard method is available as a coroutine with the same
+	name and arguments, e.g. `await card.utilizationRates()`. The blocking
+	call runs on a dedicated executor. Concurrent awaits of the same method
+	with the same arguments share a single call in flight, so many
+	coroutines asking at once cost one driver call. An instance should be
+	used from a single event loop."""
+
+	def __init__(self, card, executor=None):
+		self.card = card
+		self.executor = executor or getExecutor()
+		self._inflight = {}
+
+	def __getattr__(self, name):
+		method = getattr(self.card, name)
+		if name.startswith('_') or not callable(method):
+			return method
+		return partial(self.call, name)
+
+	async def call(self, name, *args, **kwargs):
+		"""Runs card.<name>(*args, **kwargs) on the executor, joining a matching call in flight."""
+		key = (name, args, tuple(sorted(kwargs.items()))) if (args or kwargs) else name
+		future = self._inflight.get(key)
+		if future is None:
+			method = getattr(self.card, name)
+			if kwargs:
+				method = partial(method, **kwargs)
+			future = asyncio.get_running_loop().run_in_executor(self.executor, method, *args)
+			self._inflight[key] = future
+			future.add_done_callback(partial(self._finished, key))
+		# a cancelled waiter must not cancel the call other waiters share
+		return await asyncio.shield(future)
+
+	def _finished(self, key, future):
+		if self._inflight.get(key) is future:
+			del self._inflight[key]
+
+	async def snapshot(self, fields=defaultSnapshotFields):
+		if not isinstance(fields, tuple):
+			fields = tuple(fields)
+		return await self.call('snapshot', fields)
+
+
+async def getAsyncVideoCards(backend=None, executor=None):
+	"""Awaitable getVideoCards() returning AsyncVideoCard wrappers."""
+	executor = executor or getExecutor()
+	cards = await asyncio.get_running_loop().run_in_executor(executor, getVideoCards, backend)
+	if cards is None:
+		return None
+	return [AsyncVideoCard(c, executor) for c in cards]
+
+
+async def pollAllAsync(cards, fields=defaultSnapshotFields):
+	"""Snapshots every AsyncVideoCard concurrently and returns one Sweep."""
+	start = time.time()
+	began = time.perf_counter()
+	samples = await asyncio.gather(*[c.snapshot(fields) for c in cards])
+	return Sweep(start, time.perf_counter() - began, samples)
+
+
+async def iterSnapshots(cards, interval=1.0, fields=defaultSnapshotFields):
+	"""Yields a Sweep of every card each interval seconds.
+
+	Ticks are scheduled on a fixed grid from the first sweep, so a slow sweep
+	does not push later ones back; missed ticks are skipped rather than
+	bunched up."""
+	loop = asyncio.get_running_loop()
+	nextTick = loop.time()
+	while True:
+		yield await pollAllAsync(cards, fields)
+		nextTick += interval
+		now = loop.time()
+		if nextTick < now:
+			nextTick += ((now - nextTick) // interval + 1) * interval
+		await asyncio.sleep(nextTick - now)
@@ -0,0 +1,84 @@
+from nvmlconstants import NVML_ERROR_NOT_SUPPORTED, NVML_ERROR_FUNCTION_NOT_FOUND
+import importlib
+
+
+class LazyModule:
+	"""Stands in for a module that is imported the first time an attribute is read.
+
+	Importing py3nvml also imports its nvidia_smi and utils modules and
+	logging with them, which costs more than card.py itself. card.py and
+	NvmlBackend reach py3nvml only through the py3nvml instance below, so
+	that cost is paid on the first NVML call or NVMLError check, and never
+	by code that only imports card.py."""
+
+	def __init__(self, name):
+		self.__dict__['_name'] = name
+
+	def __getattr__(self, name):
+		value = getattr(importlib.import_module(self._name), name)
+		self.__dict__[name] = value
+		return value
+
+	def __repr__(self):
+		return '<lazy module {!r}>'.format(self._name)
+
+
+py3nvml = LazyModule('py3nvml.py3nvml')
+
+
+def _notSupported(*args):
+	raise py3nvml.NVMLError(NVML_ERROR_NOT_SUPPORTED)
+
+
+def _functionNotFound(*args):
+	raise py3nvml.NVMLError(NVML_ERROR_FUNCTION_NOT_FOUND)
+
+
+class Backend:
+	"""The object VideoCard and getVideoCards() make their NVML calls through.
+
+	A backend exposes the py3nvml functions card.py uses (nvmlInit,
+	nvmlDeviceGetCount, nvmlDeviceGetTemperature, ...) under the same names
+	and signatures, and fails by raising py3nvml's NVMLError. Any nvml*
+	function a subclass does not define raises NVML_ERROR_NOT_SUPPORTED."""
+
+	def __getattr__(self, name):
+		if name.startswith('nvml'):
+			return _notSupported
+		raise AttributeError(name)
+
+
+class NvmlBackend(Backend):
+	"""Forwards every call to py3nvml and so to the real NVML library.
+
+	Functions the installed py3nvml does not wrap raise
+	NVML_ERROR_FUNCTION_NOT_FOUND, as NVML does for a driver that lacks them."""
+
+	def __getattr__(self, name):
+		# probes such as copy's __deepcopy__ lookup should not import py3nvml
+		fn = None if name.startswith('__') else getattr(py3nvml, name, None)
+		if fn is None:
+			if not name.startswith('nvml'):
+				raise AttributeError(name)
+			fn = _functionNotFound
+		# later lookups find the function directly on the instance
+		self.__dict__[name] = fn
+		return fn
+
+
+_backend = NvmlBackend()
+
+
+def getBackend():
+	"""Returns the backend used by cards created without an explicit one."""
+	return _backend
+
+
+def setBackend(backend):
+	"""Makes backend the default for getVideoCards(), VideoCard and nvmlInit().
+
+	Returns the previous default so it can be restored."""
+	global _backend
+	previous = _backend
+	_backend = backend
+	return previous
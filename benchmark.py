@@ -0,0 +1,553 @@
+from py3nvml.py3nvml import *
+from card import VideoCard, getVideoCards, nvmlInit, nvmlShutdown, setBackend
+from simulator import SimulatedBackend
+from fleet import pollAll
+from exporter import Exporter
+from fleetsnapshot import FleetSnapshot
+from telemetrylog import TelemetryWriter, TelemetryLog
+from replay import ReplayBackend
+from instrument import InstrumentedBackend
+from remote import Agent, BatchDecoder, BatchEncoder, Collector
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+benchmarks = {}
+
+# name: statistics dict, filled by benchmarks that call record()
+results = {}
+
+# benchmarks that went over a stated budget; the run then exits non-zero
+overBudget = []
+
+def benchmark(name):
+	"""Registers a benchmark function under name; it receives the list of cards."""
+	def register(fn):
+		benchmarks[name] = fn
+		return fn
+	return register
+
+
+def countCalls(fn):
+	"""Returns (python calls, C calls) made while running fn once."""
+	counts = {'call': 0, 'c_call': 0}
+	def profiler(frame, event, arg):
+		if event in counts:
+			counts[event] += 1
+	sys.setprofile(profiler)
+	try:
+		fn()
+	finally:
+		sys.setprofile(None)
+	return counts['call'], counts['c_call']
+
+
+def measure(label, fn, samples):
+	"""Prints calls, retained allocations and wall time per sample of fn."""
+	fn()
+	calls, cCalls = countCalls(fn)
+
+	kept = []
+	tracemalloc.start()
+	before = sys.getallocatedblocks()
+	for i in range(samples):
+		kept.append(fn())
+	blocks = (sys.getallocatedblocks() - before) / samples
+	current, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	del kept
+
+	start = time.perf_counter()
+	for i in range(samples):
+		fn()
+	elapsed = time.perf_counter() - start
+
+	print("    {:<24} {:>7} py calls {:>7} C calls {:>9.1f} blocks {:>9.0f} B {:>9.1f} us".format(
+		label, calls, cCalls, blocks, current / samples, elapsed / samples * 1e6))
+
+
+def profile(fn, seconds=0.2, maxCalls=5000, allocationCalls=50):
+	"""Times fn call by call and returns its statistics as a dict.
+
+	fn runs for about seconds (at most maxCalls times, at least 10) after a
+	warm-up call. peak_bytes is the average peak of memory allocated while
+	one call runs, and retained_blocks the memory blocks still held after
+	each call with its result dropped; both come from allocationCalls
+	separate calls so the timings are not skewed by tracemalloc."""
+	fn()
+	timings = []
+	clock = time.perf_counter_ns
+	deadline = time.perf_counter() + seconds
+	while len(timings) < maxCalls and (len(timings) < 10 or time.perf_counter() < deadline):
+		start = clock()
+		fn()
+		timings.append(clock() - start)
+	timings.sort()
+
+	tracemalloc.start()
+	peak = 0
+	before = sys.getallocatedblocks()
+	for i in range(allocationCalls):
+		tracemalloc.reset_peak()
+		baseline = tracemalloc.get_traced_memory()[0]
+		fn()
+		peak += tracemalloc.get_traced_memory()[1] - baseline
+	retained = sys.getallocatedblocks() - before
+	tracemalloc.stop()
+
+	return {
+		'calls': len(timings),
+		'calls_per_sec': len(timings) / (sum(timings) / 1e9),
+		'p50_us': timings[len(timings) // 2] / 1000.0,
+		'p99_us': timings[min(len(timings) - 1, len(timings) * 99 // 100)] / 1000.0,
+		'peak_bytes': peak / allocationCalls,
+		'retained_blocks': retained / allocationCalls,
+	}
+
+
+def record(name, stats):
+	"""Prints one profile() result and keeps it for --json."""
+	results[name] = stats
+	print("    {:<40} {:>10.0f} calls/s {:>9.1f} us p50 {:>9.1f} us p99 {:>8.0f} B peak {:>6.1f} blocks".format(
+		name, stats['calls_per_sec'], stats['p50_us'], stats['p99_us'], stats['peak_bytes'], stats['retained_blocks']))
+
+
+def demoSweep(cards):
+	"""Reads every metric demo.py prints, on every card."""
+	for c in cards:
+		c.fanSpeed()
+		c.powerSettings()
+		c.utilizationRates()
+		c.temperature()
+		c.powerUsage()
+		c.gpuClock()
+		c.gpuMaxClock()
+		c.smClock()
+		c.smMaxClock()
+		c.memoryClock()
+		c.memoryMaxClock()
+		c.autoBoostedClocksEnabled()
+		c.supportedClocks()
+
+
+# VideoCard methods profile() skips, and arguments for those that need them
+skippedMethods = ('describe', 'refresh')
+methodArguments = {
+	'accountingStats': lambda card: (next(iter(card.runningProcesses() or {0: None})),),
+	'supports': lambda card: ('nvmlDeviceGetFanSpeed',),
+}
+
+
+@benchmark('snapshot')
+def benchSnapshot(cards, samples=1000):
+	"""Individual metric methods against one batched snapshot() of the same metrics."""
+	def individual():
+		return [(
+			c.temperature(),
+			c.fanSpeed(),
+			c.powerUsage(),
+			c.utilizationRates(),
+			c.gpuClock(),
+			c.smClock(),
+			c.memoryClock(),
+			c.memInfo(),
+			c.performanceState(),
+			c.computeMode(),
+			c.clocksThrottleReasons(),
+		) for c in cards]
+
+	def batched():
+		return [c.snapshot() for c in cards]
+
+	measure('individual methods', individual, samples)
+	measure('snapshot()', batched, samples)
+
+
+@benchmark('raw')
+def benchRaw(cards, samples=1000):
+	"""Formatting methods returning dicts of strings against raw mode."""
+	def methods(raw):
+		return lambda: [(
+			c.gpuClock(raw=raw),
+			c.smClock(raw=raw),
+			c.memoryClock(raw=raw),
+			c.powerUsage(raw=raw),
+			c.powerSettings(raw=raw),
+			c.memInfo(raw=raw),
+			c.bar1MemInfo(raw=raw),
+			c.utilizationRates(raw=raw),
+		) for c in cards]
+
+	measure('formatted strings', methods(False), samples)
+	measure('raw mode', methods(True), samples)
+
+
+@benchmark('sweep')
+def benchSweep(cards, seconds=2.0):
+	"""Throughput of a demo.py-style sweep reading every metric on every card."""
+	count = 0
+	start = time.perf_counter()
+	while time.perf_counter() - start < seconds:
+		demoSweep(cards)
+		count += 1
+	elapsed = time.perf_counter() - start
+	print("    {:.1f} sweeps/s, {:.1f} device samples/s".format(count / elapsed, count * len(cards) / elapsed))
+
+
+@benchmark('methods')
+def benchMethods(cards):
+	"""Calls/s, p50/p99 latency and allocations of every VideoCard method.
+
+	Memoized methods are measured warm, i.e. as cache hits. Run with
+	--simulate and --latency to see Python overhead against a given
+	driver cost, and with --json to keep the results."""
+	card = cards[0]
+	backend = card.nvml
+	for name in sorted(dir(VideoCard)):
+		method = getattr(VideoCard, name)
+		if name.startswith('_') or name in skippedMethods or not callable(method):
+			continue
+		args = methodArguments[name](card) if name in methodArguments else ()
+		record('VideoCard.' + name, profile(lambda: method(card, *args)))
+	record('VideoCard()', profile(lambda: VideoCard(card.index, backend=backend)))
+	record('getVideoCards()', profile(lambda: getVideoCards(backend)))
+	record('demo sweep', profile(lambda: demoSweep(cards)))
+
+
+@benchmark('fleet')
+def benchFleet(cards, sweeps=20, latency=0.001):
+	"""Sequential against pollAll() sweeps over simulated fleets with one slow device.
+
+	Always uses its own simulated devices: each NVML call sleeps latency, the
+	last device is 3x slower and pcie throughput blocks for 20 ms."""
+	fields = ('temperature', 'power_draw', 'gpu_util', 'mem_util', 'gpu_clock', 'pcie_tx_kb_sec')
+	for count in (1, 2, 4, 8, 16):
+		backend = SimulatedBackend(count, latency=latency,
+			latencies={'nvmlDeviceGetPcieThroughput': 0.02},
+			latencyScales=[1.0] * (count - 1) + [3.0])
+		nvmlInit(backend)
+		fleet = getVideoCards(backend)
+
+		start = time.perf_counter()
+		for i in range(sweeps):
+			[c.snapshot(fields) for c in fleet]
+		sequential = (time.perf_counter() - start) / sweeps
+
+		start = time.perf_counter()
+		for i in range(sweeps):
+			pollAll(fleet, fields)
+		parallel = (time.perf_counter() - start) / sweeps
+
+		nvmlShutdown(backend)
+		print("    {:>2} devices: sequential {:>7.1f} ms  pollAll {:>7.1f} ms".format(
+			count, sequential * 1000, parallel * 1000))
+
+
+@benchmark('exporter')
+def benchExporter(cards, sweeps=200):
+	"""Exporter sweep-and-render cost and scrape body size over simulated fleets."""
+	for count in (1, 4, 16):
+		backend = SimulatedBackend(count)
+		nvmlInit(backend)
+		exporter = Exporter(getVideoCards(backend))
+		exporter.sample()
+		start = time.perf_counter()
+		for i in range(sweeps):
+			exporter.sample()
+		elapsed = (time.perf_counter() - start) / sweeps
+		nvmlShutdown(backend)
+		print("    {:>2} devices: {:>7.1f} us per sweep, {:>6} byte body".format(
+			count, elapsed * 1e6, len(exporter.body)))
+
+
+@benchmark('columnar')
+def benchColumnar(cards, sweeps=1000, count=16):
+	"""Fleet aggregates over dicts from the metric methods against stacked FleetSnapshots."""
+	backend = SimulatedBackend(count)
+	nvmlInit(backend)
+	fleet = getVideoCards(backend)
+	fields = ('temperature', 'power_draw', 'gpu_util')
+	dicts = [[{'temperature': c.temperature(), 'power': c.powerUsage(), 'util': c.utilizationRates()} for c in fleet] for i in range(sweeps)]
+	snaps = [FleetSnapshot.capture(fleet, fields) for i in range(sweeps)]
+	nvmlShutdown(backend)
+
+	start = time.perf_counter()
+	totalPower = sum(d['power']['draw'] for sweep in dicts for d in sweep)
+	maxTemp = max(d['temperature'] for sweep in dicts for d in sweep)
+	meanUtil = sum(d['util']['gpu'] for sweep in dicts for d in sweep) / (sweeps * count)
+	loops = time.perf_counter() - start
+
+	start = time.perf_counter()
+	timestamps, values = FleetSnapshot.stack(snaps)
+	stacking = time.perf_counter() - start
+	totalPower = values[:, :, 1].sum()
+	maxTemp = values[:, :, 0].max()
+	meanUtil = values[:, :, 2].mean()
+	vectorized = time.perf_counter() - start
+
+	print("    {} sweeps x {} devices: dict loops {:.2f} ms, stack {:.2f} ms + aggregates = {:.2f} ms".format(
+		sweeps, count, loops * 1000, stacking * 1000, vectorized * 1000))
+
+
+@benchmark('telemetrylog')
+def benchTelemetryLog(cards, days=7, count=16):
+	"""A week of 1 Hz sweeps of 16 devices in a telemetry log: write, open and scan."""
+	backend = SimulatedBackend(count)
+	nvmlInit(backend)
+	fleet = getVideoCards(backend)
+	sweep = pollAll(fleet)
+	nvmlShutdown(backend)
+	(fd, path) = tempfile.mkstemp(suffix='.nvmllog')
+	os.close(fd)
+	os.remove(path)
+	hour = 3600
+	try:
+		# the first hour goes through the writer; the rest of the week is
+		# that hour's records copied with shifted timestamps
+		start = time.perf_counter()
+		with TelemetryWriter(path) as writer:
+			for i in range(hour):
+				writer.append(sweep._replace(samples=[s._replace(timestamp=float(i)) for s in sweep.samples]))
+		written = time.perf_counter() - start
+		with TelemetryLog(path) as log:
+			block = log.records.copy()
+		with open(path, 'ab') as f:
+			for h in range(1, days * 24):
+				block['timestamp'] += hour
+				f.write(block.tobytes())
+		del block
+
+		start = time.perf_counter()
+		with TelemetryLog(path) as log:
+			opened = time.perf_counter() - start
+			power = log['power_draw']
+			peak = power[power != log.missing['power_draw']].max()
+			mean = log.column('temperature').mean()
+			scanned = time.perf_counter() - start
+			records = len(log)
+			size = os.path.getsize(path)
+		print("    writer: {:.0f} records/s ({} bytes each)".format(hour * count / written, log.dtype.itemsize))
+		print("    {} days x {} devices ({} records, {:.0f} MB): open {:.3f} ms, scan 2 columns {:.0f} ms".format(
+			days, count, records, size / 1e6, opened * 1000, scanned * 1000))
+	finally:
+		os.remove(path)
+
+
+@benchmark('replay')
+def benchReplay(cards, sweeps=600, count=16):
+	"""Snapshots per second served by an as-fast-as-possible ReplayBackend."""
+	backend = SimulatedBackend(count)
+	nvmlInit(backend)
+	fleet = getVideoCards(backend)
+	(fd, path) = tempfile.mkstemp(suffix='.nvmllog')
+	os.close(fd)
+	os.remove(path)
+	try:
+		with TelemetryWriter(path) as writer:
+			for i in range(sweeps):
+				writer.append(pollAll(fleet))
+		nvmlShutdown(backend)
+
+		replay = ReplayBackend(path, speed=None)
+		nvmlInit(replay)
+		replayed = getVideoCards(replay)
+		start = time.perf_counter()
+		for position in replay.frames():
+			for c in replayed:
+				c.snapshot()
+		elapsed = time.perf_counter() - start
+		nvmlShutdown(replay)
+		replay.log.close()
+		print("    {} sweeps x {} devices: {:.0f} snapshots/s, {:.0f} NVML calls/s".format(
+			sweeps, count, sweeps * count / elapsed, replay.calls / elapsed))
+	finally:
+		os.remove(path)
+
+
+@benchmark('instrument')
+def benchInstrument(cards, count=4):
+	"""Snapshot latency without, with and with a disabled InstrumentedBackend."""
+	backend = SimulatedBackend(count)
+	instrumented = InstrumentedBackend(backend)
+	nvmlInit(backend)
+	plain = getVideoCards(backend)[0]
+	timed = getVideoCards(instrumented)[0]
+	record('snapshot, not instrumented', profile(plain.snapshot))
+	record('snapshot, instrumented', profile(timed.snapshot))
+	instrumented.enabled = False
+	record('snapshot, instrument disabled', profile(timed.snapshot))
+	nvmlShutdown(backend)
+
+
+@benchmark('remote')
+def benchRemote(cards, sweeps=600, count=16, batchSweeps=10):
+	"""Bytes and time per sweep of the agent's binary frames versus JSON, and over localhost."""
+	# one sweep a second of simulated time, so values move as they would
+	now = [0.0]
+	backend = SimulatedBackend(count, clock=lambda: now[0])
+	nvmlInit(backend)
+	fleet = getVideoCards(backend)
+	recorded = []
+	for i in range(sweeps):
+		now[0] = float(i)
+		sweep = pollAll(fleet)
+		recorded.append(sweep._replace(timestamp=now[0], samples=[s._replace(timestamp=now[0]) for s in sweep.samples]))
+	nvmlShutdown(backend)
+
+	start = time.perf_counter()
+	size = sum(len(json.dumps([s._asdict() for s in sweep.samples]).encode()) for sweep in recorded)
+	elapsed = time.perf_counter() - start
+	print("    JSON:   {:8.0f} bytes/sweep, encode {:7.1f} us/sweep".format(size / sweeps, elapsed / sweeps * 1e6))
+
+	encoder = BatchEncoder()
+	frames = []
+	start = time.perf_counter()
+	for (i, sweep) in enumerate(recorded):
+		encoder.add(sweep)
+		if (i + 1) % batchSweeps == 0:
+			frames.append(encoder.frame())
+	elapsed = time.perf_counter() - start
+	size = sum(len(f) for f in frames)
+	decoder = BatchDecoder('bench', encoder.fields, [c.index for c in fleet])
+	start = time.perf_counter()
+	for f in frames:
+		decoder.decode(memoryview(f)[5:])
+	decoded = time.perf_counter() - start
+	print("    binary: {:8.0f} bytes/sweep, encode {:7.1f} us/sweep, decode {:7.1f} us/sweep ({} sweeps a frame)".format(
+		size / sweeps, elapsed / sweeps * 1e6, decoded / sweeps * 1e6, batchSweeps))
+
+	received = threading.Semaphore(0)
+	with Collector(('127.0.0.1', 0), lambda batch: received.release()) as collector:
+		agent = Agent(collector.address, fleet, batchSweeps=batchSweeps, host='bench')
+		start = time.perf_counter()
+		for sweep in recorded:
+			agent.add(sweep)
+		for i in range(agent.framesSent):
+			received.acquire()
+		elapsed = time.perf_counter() - start
+		agent.close()
+	print("    localhost TCP: {:.0f} sweeps/s of {} devices, {:.0f} bytes/sweep".format(
+		sweeps / elapsed, count, agent.bytesSent / sweeps))
+
+
+# Cold start budget, in seconds, for a short-lived process that imports card
+# and reads one metric. Python's own startup and nvmlInit()'s time in the
+# driver are not counted; loading py3nvml and creating the card are.
+coldStartBudget = {
+	'import card': 0.015,
+	'read one metric': 0.060,
+}
+
+coldStartScript = """
+import sys, time
+start = time.perf_counter()
+from card import VideoCard, nvmlInit, setBackend
+imported = time.perf_counter()
+assert 'py3nvml' not in sys.modules, 'importing card imported py3nvml'
+from backend import py3nvml
+py3nvml.NVMLError
+loaded = time.perf_counter()
+if {simulate}:
+	from simulator import SimulatedBackend
+	setBackend(SimulatedBackend({simulate}, latency={latency}))
+initStart = time.perf_counter()
+nvmlInit()
+initEnd = time.perf_counter()
+VideoCard(0).temperature()
+end = time.perf_counter()
+print(imported - start, loaded - imported, initEnd - initStart, end - initEnd)
+"""
+
+
+@benchmark('coldstart')
+def benchColdStart(cards, runs=7):
+	"""Cold start of a fresh process reading one metric, against coldStartBudget."""
+	simulated = cards[0].nvml if isinstance(cards[0].nvml, SimulatedBackend) else None
+	script = coldStartScript.format(
+		simulate=len(cards) if simulated else 0,
+		latency=simulated.latency if simulated else 0)
+	timings = []
+	for i in range(runs):
+		output = subprocess.check_output([sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)))
+		timings.append([float(t) for t in output.split()])
+	(imported, loaded, init, read) = [sorted(column)[len(column) // 2] for column in zip(*timings)]
+	print("    median of {} runs: import card {:.1f} ms, load py3nvml {:.1f} ms, nvmlInit {:.1f} ms, first reading {:.1f} ms".format(
+		runs, imported * 1000, loaded * 1000, init * 1000, read * 1000))
+	for (name, elapsed) in (('import card', imported), ('read one metric', imported + loaded + read)):
+		budget = coldStartBudget[name]
+		verdict = 'ok' if elapsed <= budget else 'OVER BUDGET'
+		print("    {:<16} {:6.1f} ms (budget {:.0f} ms) {}".format(name, elapsed * 1000, budget * 1000, verdict))
+		results['cold start: ' + name] = {'p50_us': elapsed * 1e6, 'budget_us': budget * 1e6}
+		if elapsed > budget:
+			overBudget.append(name)
+
+
+def compare(previous, current, threshold, slack=0.5):
+	"""Prints entries whose p50 grew by more than threshold; returns how many did.
+
+	Changes below slack microseconds are timer noise and never count."""
+	regressions = 0
+	for (name, stats) in sorted(current.items()):
+		old = previous.get(name)
+		if old is None:
+			continue
+		change = stats['p50_us'] / old['p50_us'] - 1 if old['p50_us'] else 0.0
+		if change > threshold and stats['p50_us'] - old['p50_us'] > slack:
+			regressions += 1
+			print("    REGRESSION {:<40} p50 {:.1f} -> {:.1f} us ({:+.0%})".format(name, old['p50_us'], stats['p50_us'], change))
+	return regressions
+
+
+def run(names):
+	nvmlInit()
+	cards = getVideoCards()
+	print("{} device(s)".format(len(cards)))
+	for name in (names or benchmarks):
+		print("\n{}: {}".format(name, benchmarks[name].__doc__.splitlines()[0]))
+		benchmarks[name](cards)
+	nvmlShutdown()
+	return len(cards)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Measure polling overhead of card.py.")
+	parser.add_argument('names', nargs='*', help="benchmarks to run, from: {} (default: all)".format(", ".join(benchmarks)))
+	parser.add_argument('--simulate', type=int, metavar='N', help="use a simulated backend with N devices instead of NVML")
+	parser.add_argument('--latency', type=float, default=0.0, help="simulated per-call latency in seconds")
+	parser.add_argument('--json', metavar='PATH', help="write recorded results (e.g. of 'methods') to PATH")
+	parser.add_argument('--compare', metavar='PATH', help="compare recorded results with an earlier --json file")
+	parser.add_argument('--threshold', type=float, default=0.2, help="p50 slowdown counted as a regression by --compare (default 0.2)")
+	args = parser.parse_args()
+	for name in args.names:
+		if name not in benchmarks:
+			parser.error("unknown benchmark: {}".format(name))
+	if args.simulate:
+		setBackend(SimulatedBackend(args.simulate, latency=args.latency))
+	devices = run(args.names)
+
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump({
+				'python': platform.python_version(),
+				'simulated': bool(args.simulate),
+				'latency': args.latency,
+				'devices': devices,
+				'time': time.time(),
+				'results': results,
+			}, f, indent=1, sort_keys=True)
+	if args.compare:
+		with open(args.compare) as f:
+			previous = json.load(f)['results']
+		print("\ncompared with {}:".format(args.compare))
+		regressions = compare(previous, results, args.threshold)
+		print("    {} regression(s) over {:.0%}".format(regressions, args.threshold))
+		if regressions:
+			sys.exit(1)
+	if overBudget:
+		sys.exit(1)
@@ -1,6 +1,11 @@
-from py3nvml.py3nvml import *
-from py3nvml.nvidia_smi import StrGOM
-import datetime
+from nvmlconstants import *
+from collections import namedtuple
+from functools import wraps
+from operator import attrgetter, itemgetter
+from readings import *
+from clocks import ClockTable
+from backend import getBackend, setBackend, py3nvml
+import time
 
 brandNames = {
 	NVML_BRAND_UNKNOWN :  "Unknown",
@@ -13,118 +18,432 @@ brandNames = {
 
 
 
+# What every method returns in place of a value the device does not support.
+NOT_SUPPORTED = "NOT SUPPORTED"
+
+
+class CardError(Exception):
+	"""An NVML failure that a VideoCard method cannot turn into a value.
+	
+	code is the NVML_ERROR_* value; the original NVMLError is the __cause__."""
+	def __init__(self, message, code=None):
+		Exception.__init__(self, message)
+		self.code = code
+
+
+class NvmlUninitializedError(CardError):
+	"""NVML was used before nvmlInit() (or after nvmlShutdown())."""
+
+
+class DeviceLostError(CardError):
+	"""The GPU has fallen off the bus or otherwise become inaccessible."""
+
+
 def handleError(err):
-	if (err.value == NVML_ERROR_UNINITIALIZED):
-		print("\nERROR: Attempted to access NVML without first initializing.")
-		print("Be sure you call nvmlInit() prior to accessing NVML functions.")
-		quit()
-	elif (err.value == NVML_ERROR_NOT_SUPPORTED):
-		return("NOT SUPPORTED")
+	"""Returns NOT_SUPPORTED for unsupported calls and raises CardError for anything else.
+	
+	err is an NVMLError or a bare NVML_ERROR_* code. Never shuts NVML down or
+	exits, so a long-running caller can catch the error and carry on."""
+	code = getattr(err, 'value', err)
+	cause = err if isinstance(err, BaseException) else None
+	if (code == NVML_ERROR_NOT_SUPPORTED):
+		return NOT_SUPPORTED
+	elif (code == NVML_ERROR_UNINITIALIZED):
+		raise NvmlUninitializedError("Attempted to access NVML without first initializing. "
+			"Be sure you call nvmlInit() prior to accessing NVML functions.", code) from cause
+	elif (code == NVML_ERROR_GPU_IS_LOST):
+		raise DeviceLostError(str(err), code) from cause
 	else:
-		print(err.__str__())
-		nvmlShutdown()
-		quit()
+		raise CardError(str(err), code) from cause
+
+
+# Bumped on every init and shutdown so cards can tell their cached static
+# values may belong to a previous driver session.
+_initGeneration = 0
+
+def nvmlInit(backend=None):
+	global _initGeneration
+	(backend or getBackend()).nvmlInit()
+	_initGeneration += 1
+
+
+def nvmlShutdown(backend=None):
+	global _initGeneration
+	(backend or getBackend()).nvmlShutdown()
+	_initGeneration += 1
+
+
+def initGeneration():
+	"""Returns a number that changes whenever NVML is initialized or shut down."""
+	return _initGeneration
+
+
+def invalidateCards():
+	"""Makes every VideoCard refresh() before its next NVML call."""
+	global _initGeneration
+	_initGeneration += 1
+
+
+# Called with a card's backend when it refreshes, before the handle is
+# fetched again; session.py adds one that initializes NVML again in a
+# forked child.
+refreshHooks = []
+
+
+def requires(*calls):
+	"""Skips a VideoCard method on devices lacking any of the NVML calls it makes.
+	
+	Each call is a function name, or a (name, arg, ...) tuple for one that
+	takes arguments after the handle. The method reports a call the device
+	lacks through VideoCard._failed(); the result of that run is then
+	returned on every later call with the same arguments without reaching
+	the driver. Like memoize, the returned object is shared. Only for
+	methods whose whole result depends on those calls: a method that also
+	makes others must check _lacking() itself."""
+	calls = tuple((c, ()) if isinstance(c, str) else (c[0], tuple(c[1:])) for c in calls)
+	def decorate(method):
+		name = method.__name__
+		@wraps(method)
+		def guarded(self, *args, **kwargs):
+			lacking = self._lacking()
+			for call in calls:
+				if call in lacking:
+					key = ('unsupported', name, args, tuple(kwargs.items()))
+					try:
+						return self._static[key]
+					except KeyError:
+						break
+			value = method(self, *args, **kwargs)
+			for call in calls:
+				if call in lacking:
+					self._static[('unsupported', name, args, tuple(kwargs.items()))] = value
+					break
+			return value
+		return guarded
+	return decorate
+
+
+def memoize(method):
+	"""Caches a VideoCard method's result until refresh() or NVML re-init.
+	
+	Only for values that cannot change while the driver is loaded. Modes
+	that an admin or an attached display can switch at runtime (display,
+	persistence, accounting, driver model, GPU operation mode) are read on
+	every call instead. The cached object is shared between callers and
+	must not be modified."""
+	name = method.__name__
+	@wraps(method)
+	def cached(self, *args, **kwargs):
+		if self._generation != _initGeneration:
+			self.refresh()
+		key = (name, args, tuple(kwargs.items())) if (args or kwargs) else name
+		try:
+			return self._static[key]
+		except KeyError:
+			value = self._static[key] = method(self, *args, **kwargs)
+			return value
+	return cached
+
+
+# Throttle reason bits and the keys clocksThrottleReasons() reports them
+# under. UserDefinedClocks is the old name of the ApplicationsClocksSetting
+# bit, so it is not listed separately.
+throttleReasons = (
+	(nvmlClocksThrottleReasonGpuIdle,                   "clocks_throttle_reason_gpu_idle"),
+	(nvmlClocksThrottleReasonApplicationsClocksSetting, "clocks_throttle_reason_applications_clocks_setting"),
+	(nvmlClocksThrottleReasonSwPowerCap,                "clocks_throttle_reason_sw_power_cap"),
+	(nvmlClocksThrottleReasonHwSlowdown,                "clocks_throttle_reason_hw_slowdown"),
+	(nvmlClocksThrottleReasonUnknown,                   "clocks_throttle_reason_unknown"),
+)
+
+throttleReasonNames = dict(throttleReasons)
+
+_throttleDecodings = {}
+
+
+def decodeThrottleReasons(supported, current):
+	"""Returns the clocksThrottleReasons() dict for raw supported and current bitmasks.
+
+	Reasons outside supported are NOT_SUPPORTED. The masks take only a few
+	distinct values on a device, so each pair is decoded once and copied
+	after that."""
+	decoded = _throttleDecodings.get((supported, current))
+	if decoded is None:
+		decoded = {}
+		for (mask, name) in throttleReasons:
+			decoded[name] = (mask & current != 0) if mask & supported else NOT_SUPPORTED
+		_throttleDecodings[(supported, current)] = decoded
+	return dict(decoded)
+
+
+# Each source is one NVML call (by backend function name), its extra arguments
+# and an optional C-level extractor, paired with the snapshot field(s) it fills. Multi-field extractors
+# return a tuple in the same order as the field names.
+snapshotSources = (
+	(('temperature',),                'nvmlDeviceGetTemperature', (NVML_TEMPERATURE_GPU,), None),
+	(('fan_speed',),                  'nvmlDeviceGetFanSpeed', (), None),
+	(('power_draw',),                 'nvmlDeviceGetPowerUsage', (), None),
+	(('gpu_util', 'mem_util'),        'nvmlDeviceGetUtilizationRates', (), attrgetter('gpu', 'memory')),
+	(('encoder_util',),               'nvmlDeviceGetEncoderUtilization', (), itemgetter(0)),
+	(('decoder_util',),               'nvmlDeviceGetDecoderUtilization', (), itemgetter(0)),
+	(('gpu_clock',),                  'nvmlDeviceGetClockInfo', (NVML_CLOCK_GRAPHICS,), None),
+	(('sm_clock',),                   'nvmlDeviceGetClockInfo', (NVML_CLOCK_SM,), None),
+	(('memory_clock',),               'nvmlDeviceGetClockInfo', (NVML_CLOCK_MEM,), None),
+	(('mem_total', 'mem_used', 'mem_free'), 'nvmlDeviceGetMemoryInfo', (), attrgetter('total', 'used', 'free')),
+	(('performance_state',),          'nvmlDeviceGetPowerState', (), None),
+	(('power_limit',),                'nvmlDeviceGetPowerManagementLimit', (), None),
+	(('enforced_power_limit',),       'nvmlDeviceGetEnforcedPowerLimit', (), None),
+	(('throttle_reasons',),           'nvmlDeviceGetCurrentClocksThrottleReasons', (), None),
+	(('compute_mode',),               'nvmlDeviceGetComputeMode', (), None),
+	(('auto_boost',),                 'nvmlDeviceGetAutoBoostedClocksEnabled', (), itemgetter(0)),
+	(('pcie_tx_kb_sec',),             'nvmlDeviceGetPcieThroughput', (NVML_PCIE_UTIL_TX_BYTES,), None),
+	(('pcie_rx_kb_sec',),             'nvmlDeviceGetPcieThroughput', (NVML_PCIE_UTIL_RX_BYTES,), None),
+)
+
+snapshotFields = tuple(name for source in snapshotSources for name in source[0])
+
+# pcie throughput blocks for a sampling window, so it is only read when asked for
+defaultSnapshotFields = tuple(f for f in snapshotFields if not f.startswith('pcie_'))
+
+_snapshotPlans = {}
+_snapshotTypes = {}
+
+# the errors that mark a call as one the device (or driver) lacks
+unsupportedErrors = (NVML_ERROR_NOT_SUPPORTED, NVML_ERROR_FUNCTION_NOT_FOUND)
+
+
+def snapshotType(fields):
+	"""Returns the Snapshot namedtuple class for a tuple of field names."""
+	record = _snapshotTypes.get(fields)
+	if record is None:
+		record = _snapshotTypes[fields] = namedtuple('Snapshot', ('index', 'timestamp') + fields)
+	return record
+
+
+def snapshotPlan(fields, nvml):
+	"""Returns (record type, steps) for a tuple of field names on a backend.
+	
+	Plans are built once per distinct field tuple and backend and reused by
+	every card."""
+	plan = _snapshotPlans.get((fields, nvml))
+	if plan is not None:
+		return plan
+
+	unknown = [f for f in fields if f not in snapshotFields]
+	if unknown:
+		raise ValueError("Unknown snapshot field(s): {}".format(", ".join(unknown)))
+
+	steps = []
+	for (names, fn, args, extract) in snapshotSources:
+		slots = tuple(fields.index(n) + 2 if n in fields else None for n in names)
+		if all(s is None for s in slots):
+			continue
+		steps.append((fn, getattr(nvml, fn), args, extract, slots[0] if len(names) == 1 else slots))
+
+	plan = (snapshotType(fields), tuple(steps))
+	_snapshotPlans[(fields, nvml)] = plan
+	return plan
 
 class VideoCard:
-	"""Represents an OOP way to handle video cards returned from NVML."""
-	def __init__(self, i):
+	"""Represents an OOP way to handle video cards returned from NVML.
+	
+	Identity and configuration values (serial, UUID, VBIOS, max clocks,
+	thresholds, ...) are memoized per card; call refresh() to re-read them.
+	
+	With raw=True the formatting methods (clocks, power, memory, utilization)
+	return LazyReading dicts holding only the NVML integers; their display
+	strings are built only if read. Each of those methods also takes a raw
+	argument that overrides the card setting for one call.
+	
+	All NVML calls go through backend (see backend.py), which defaults to
+	the process-wide one from getBackend()."""
+	__slots__ = ('index', 'raw', 'nvml', '_handle', 'name', 'brand', 'pciInfo', 'busId', '_static', '_generation')
+	
+	def __init__(self, i, raw=False, backend=None):
 		self.index = i
-		self.handle = nvmlDeviceGetHandleByIndex(i)
-		self.name = str(nvmlDeviceGetName(self.handle))
+		self.raw = raw
+		self.nvml = backend or getBackend()
+		self._generation = _initGeneration
+		self._handle = self.nvml.nvmlDeviceGetHandleByIndex(i)
+		self.name = str(self.nvml.nvmlDeviceGetName(self._handle))
 		
 		try:
 			# if nvmlDeviceGetBrand() succeeds it is guaranteed to be in the dictionary
-			self.brand = brandNames[nvmlDeviceGetBrand(self.handle)]
-		except NVMLError as err:
+			self.brand = brandNames[self.nvml.nvmlDeviceGetBrand(self._handle)]
+		except py3nvml.NVMLError as err:
 			handleError(err)
 			
 		
 		
-		self.pciInfo = nvmlDeviceGetPciInfo(self.handle)
+		self.pciInfo = self.nvml.nvmlDeviceGetPciInfo(self._handle)
 		self.busId = self.pciInfo.busId
+		self._static = {}
 		
 	
+	@property
+	def handle(self):
+		"""The NVML device handle, fetched again first if NVML was re-initialized since."""
+		if self._generation != _initGeneration:
+			self.refresh()
+		return self._handle
+	
+	
+	def refresh(self):
+		"""Drops every memoized static value, capabilities included, so the next read goes to NVML.
+		
+		The device handle is fetched again too, since one from an earlier
+		NVML session (or a parent process) may no longer be valid."""
+		for hook in refreshHooks:
+			hook(self.nvml)
+		self._static = {}
+		self._generation = _initGeneration
+		try:
+			self._handle = self.nvml.nvmlDeviceGetHandleByIndex(self.index)
+		except py3nvml.NVMLError as err:
+			handleError(err)
+	
+	
+	def _lacking(self):
+		"""The set of (function, args) NVML calls found unsupported on this card so far.
+		
+		Nothing is probed up front: a call is added the first time it raises
+		NOT_SUPPORTED or FUNCTION_NOT_FOUND, and is not made again until
+		refresh()."""
+		if self._generation != _initGeneration:
+			self.refresh()
+		lacking = self._static.get('lacking')
+		if lacking is None:
+			lacking = self._static['lacking'] = set()
+		return lacking
+	
+	
+	def _failed(self, err, function, *args):
+		"""handleError() for err raised by function(handle, *args), remembering a call the device lacks."""
+		if err.value in unsupportedErrors:
+			self._lacking().add((function, args))
+			return NOT_SUPPORTED
+		return handleError(err)
+	
+	
+	def unsupported(self):
+		"""The frozenset of (function, args) NVML calls found unsupported on this card so far."""
+		return frozenset(self._lacking())
+	
+	
+	def supports(self, function, *args):
+		"""Whether the NVML device function (e.g. 'nvmlDeviceGetFanSpeed') works on this card.
+		
+		args are passed after the handle. The function is called once to
+		find out, unless a method already has."""
+		lacking = self._lacking()
+		if (function, args) in lacking:
+			return False
+		key = ('supports', function, args)
+		if key not in self._static:
+			try:
+				getattr(self.nvml, function)(self.handle, *args)
+			except py3nvml.NVMLError as err:
+				if err.value in unsupportedErrors:
+					lacking.add((function, args))
+					return False
+			self._static[key] = True
+		return True
+		
+	
+	@memoize
 	def serial(self):
 		try:
-			return nvmlDeviceGetSerial(self.handle)
-		except NVMLError as err:
+			return self.nvml.nvmlDeviceGetSerial(self.handle)
+		except py3nvml.NVMLError as err:
 			return handleError(err)
 	
 		
+	@memoize
 	def uuid(self):
 		try:
-			return nvmlDeviceGetUUID(self.handle)
-		except NVMLError as err:
+			return self.nvml.nvmlDeviceGetUUID(self.handle)
+		except py3nvml.NVMLError as err:
 			return handleError(err)	
 	
 	
+	@memoize
 	def minorNumber(self):
 		try:
-			return nvmlDeviceGetMinorNumber(self.handle)
-		except NVMLError as err:
+			return self.nvml.nvmlDeviceGetMinorNumber(self.handle)
+		except py3nvml.NVMLError as err:
 			return handleError(err)	
 
 
+	@memoize
 	def vBiosVersion(self):
 		try:
-			return nvmlDeviceGetVbiosVersion(self.handle)
-		except NVMLError as err:
+			return self.nvml.nvmlDeviceGetVbiosVersion(self.handle)
+		except py3nvml.NVMLError as err:
 			return handleError(err)	
 			
 	
+	@requires('nvmlDeviceGetDisplayMode')
 	def displayMode(self):
 		try:
-			return ('enabled' if (nvmlDeviceGetDisplayMode(self.handle) != 0) else 'disabled')
-		except NVMLError as err:
-			return handleError(err)
+			return ('enabled' if (self.nvml.nvmlDeviceGetDisplayMode(self.handle) != 0) else 'disabled')
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetDisplayMode')
 			
 			
+	@requires('nvmlDeviceGetDisplayActive')
 	def displayActive(self):
 		try:
-			return ('enabled' if (nvmlDeviceGetDisplayActive(self.handle) != 0) else 'disabled')
-		except NVMLError as err:
-			return handleError(err)		
+			return ('enabled' if (self.nvml.nvmlDeviceGetDisplayActive(self.handle) != 0) else 'disabled')
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetDisplayActive')		
 	
 	
+	@requires('nvmlDeviceGetPersistenceMode')
 	def persistenceMode(self):
 		try:
-			return ('enabled' if (nvmlDeviceGetPersistenceMode(self.handle) != 0) else 'disabled')
-		except NVMLError as err:
-			return handleError(err)
+			return ('enabled' if (self.nvml.nvmlDeviceGetPersistenceMode(self.handle) != 0) else 'disabled')
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetPersistenceMode')
 	
 	
+	@requires('nvmlDeviceGetAccountingMode')
 	def accountingMode(self):
 		try:
-			return ('enabled' if (nvmlDeviceGetAccountingMode(self.handle) != 0) else 'disabled')
-		except NVMLError as err:
-			return handleError(err)
+			return ('enabled' if (self.nvml.nvmlDeviceGetAccountingMode(self.handle) != 0) else 'disabled')
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetAccountingMode')
 			
 			
+	@memoize
+	@requires('nvmlDeviceGetAccountingBufferSize')
 	def accountingModeBufferSize(self):
 		try:
-			return nvmlDeviceGetAccountingBufferSize(self.handle)
-		except NVMLError as err:
-			return handleError(err)
+			return self.nvml.nvmlDeviceGetAccountingBufferSize(self.handle)
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetAccountingBufferSize')
 			
 			
+	@requires('nvmlDeviceGetCurrentDriverModel')
 	def currentDriverModel(self):
 		try:
-			return 'WDDM' if (nvmlDeviceGetCurrentDriverModel(self.handle) == NVML_DRIVER_WDDM) else 'TCC' 
-		except NVMLError as err:
-			return handleError(err)
+			return 'WDDM' if (self.nvml.nvmlDeviceGetCurrentDriverModel(self.handle) == NVML_DRIVER_WDDM) else 'TCC' 
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetCurrentDriverModel')
 
 
+	@requires('nvmlDeviceGetPendingDriverModel')
 	def pendingDriverModel(self):
 		try:
-			return 'WDDM' if (nvmlDeviceGetPendingDriverModel(self.handle) == NVML_DRIVER_WDDM) else 'TCC' 
-		except NVMLError as err:
-			return handleError(err)		
+			return 'WDDM' if (self.nvml.nvmlDeviceGetPendingDriverModel(self.handle) == NVML_DRIVER_WDDM) else 'TCC' 
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetPendingDriverModel')		
 
 
+	@memoize
 	def multiGpuBoard(self):
 		try:
-			multiGpuBool = nvmlDeviceGetMultiGpuBoard(self.handle)
-		except NVMLError as err:
+			multiGpuBool = self.nvml.nvmlDeviceGetMultiGpuBoard(self.handle)
+		except py3nvml.NVMLError as err:
 			return handleError(err);
 
 		if multiGpuBool:
@@ -133,10 +452,11 @@ class VideoCard:
 			return False
 
 	
+	@memoize
 	def boardId(self):
 		try:
-			boardId = nvmlDeviceGetBoardId(self.handle)
-		except NVMLError as err:
+			boardId = self.nvml.nvmlDeviceGetBoardId(self.handle)
+		except py3nvml.NVMLError as err:
 			boardId = handleError(err)
 
 		try:
@@ -147,45 +467,48 @@ class VideoCard:
 		return hexBID
 	
 	
+	@memoize
 	def infoRomVersion(self):
 		inforom = {}
 		
 		try:
-			inforom["img_version"] = nvmlDeviceGetInforomImageVersion(self.handle)
-		except NVMLError as err:
+			inforom["img_version"] = self.nvml.nvmlDeviceGetInforomImageVersion(self.handle)
+		except py3nvml.NVMLError as err:
 			inforom["img_version"] = handleError(err)
 		
 		try:
-			inforom["oem_object"] = nvmlDeviceGetInforomVersion(self.handle, NVML_INFOROM_OEM)
-		except NVMLError as err:
+			inforom["oem_object"] = self.nvml.nvmlDeviceGetInforomVersion(self.handle, NVML_INFOROM_OEM)
+		except py3nvml.NVMLError as err:
 			inforom["oem_object"] = handleError(err)
 	
 		try:
-			inforom["ecc_object"] = nvmlDeviceGetInforomVersion(self.handle, NVML_INFOROM_ECC)
-		except NVMLError as err:
+			inforom["ecc_object"] = self.nvml.nvmlDeviceGetInforomVersion(self.handle, NVML_INFOROM_ECC)
+		except py3nvml.NVMLError as err:
 			inforom["ecc_object"] = handleError(err)
 			
 		try:
-			inforom["pwr_object"] = nvmlDeviceGetInforomVersion(self.handle, NVML_INFOROM_POWER)
-		except NVMLError as err:
+			inforom["pwr_object"] = self.nvml.nvmlDeviceGetInforomVersion(self.handle, NVML_INFOROM_POWER)
+		except py3nvml.NVMLError as err:
 			inforom["pwr_object"] = handleError(err)
 			
 		return inforom
 		
 	
+	@requires('nvmlDeviceGetCurrentGpuOperationMode')
 	def currentGpuOperationMode(self):
 		try:
-			current = nvmlDeviceGetCurrentGpuOperationMode(self.handle)
-		except NVMLError as err:
-			current = handleError(err)
+			current = self.nvml.nvmlDeviceGetCurrentGpuOperationMode(self.handle)
+		except py3nvml.NVMLError as err:
+			current = self._failed(err, 'nvmlDeviceGetCurrentGpuOperationMode')
 		return current
 		
 	
+	@requires('nvmlDeviceGetPendingGpuOperationMode')
 	def pendingGpuOperationMode(self):
 		try:
-			pending = nvmlDeviceGetPendingGpuOperationMode(self.handle)
-		except NVMLError as err:
-			pending = handleError(err)
+			pending = self.nvml.nvmlDeviceGetPendingGpuOperationMode(self.handle)
+		except py3nvml.NVMLError as err:
+			pending = self._failed(err, 'nvmlDeviceGetPendingGpuOperationMode')
 		return pending
 		
 	
@@ -196,32 +519,33 @@ class VideoCard:
 		}
 		
 		try:
-			info["pcie_gen"]["max_link_gen"] = nvmlDeviceGetMaxPcieLinkGeneration(self.handle)
-		except NVMLError as err:
+			info["pcie_gen"]["max_link_gen"] = self.nvml.nvmlDeviceGetMaxPcieLinkGeneration(self.handle)
+		except py3nvml.NVMLError as err:
 			info["pcie_gen"]["max_link_gen"] = handleError(err)
 		try:
-			info["pcie_gen"]["current_link_gen"] = nvmlDeviceGetCurrPcieLinkGeneration(self.handle)
-		except NVMLError as err:
+			info["pcie_gen"]["current_link_gen"] = self.nvml.nvmlDeviceGetCurrPcieLinkGeneration(self.handle)
+		except py3nvml.NVMLError as err:
 			info["pcie_gen"]["current_link_gen"] = handleError(err)
 		try:
-			info["link_widths"]["max_link_width"] = nvmlDeviceGetMaxPcieLinkWidth(self.handle)
-		except NVMLError as err:
+			info["link_widths"]["max_link_width"] = self.nvml.nvmlDeviceGetMaxPcieLinkWidth(self.handle)
+		except py3nvml.NVMLError as err:
 			info["link_widths"]["max_link_width"] = handleError(err)
 		try:
-			info["link_widths"]["current_link_width"] = nvmlDeviceGetCurrPcieLinkWidth(self.handle)
-		except NVMLError as err:
+			info["link_widths"]["current_link_width"] = self.nvml.nvmlDeviceGetCurrPcieLinkWidth(self.handle)
+		except py3nvml.NVMLError as err:
 			info["link_widths"]["current_link_width"] = handleError(err)
 	
 		return info
 	
 	
+	@requires('nvmlDeviceGetBridgeChipInfo')
 	def pciBridgeChip(self):
 		chip = {
 			'bridge_chip_type': '',
 			'bridge_chip_fw': ''
 		}
 		try:
-			bridgeHierarchy = nvmlDeviceGetBridgeChipInfo(self.handle)
+			bridgeHierarchy = self.nvml.nvmlDeviceGetBridgeChipInfo(self.handle)
 			bridge_type = ''
 			if bridgeHierarchy.bridgeChipInfo[0].type == 0:
 				bridge_type += 'PLX'
@@ -234,35 +558,37 @@ class VideoCard:
 			else:
 				strFwVersion = '%08X' % (bridgeHierarchy.bridgeChipInfo[0].fwVersion)
 			chip['bridge_chip_fw'] = strFwVersion
-		except NVMLError as err:
-			chip['bridge_chip_type'] =  handleError(err)
-			chip['bridge_chip_fw'] = handleError(err)
+		except py3nvml.NVMLError as err:
+			chip['bridge_chip_type'] = chip['bridge_chip_fw'] = self._failed(err, 'nvmlDeviceGetBridgeChipInfo')
 
 		return chip
 		
 	
+	@requires('nvmlDeviceGetPcieReplayCounter')
 	def replayCounter(self):
 		try:
-			replay = nvmlDeviceGetPcieReplayCounter(self.handle)
-		except NVMLError as err:
-			replay = handleError(err)
+			replay = self.nvml.nvmlDeviceGetPcieReplayCounter(self.handle)
+		except py3nvml.NVMLError as err:
+			replay = self._failed(err, 'nvmlDeviceGetPcieReplayCounter')
 		return replay
 		
 		
+	@requires('nvmlDeviceGetFanSpeed')
 	def fanSpeed(self):
 		"""Number returned is fan speed % out of 100."""
 		try:
-			return nvmlDeviceGetFanSpeed(self.handle)
-		except NVMLError as err:
-			return handleError(err)
+			return self.nvml.nvmlDeviceGetFanSpeed(self.handle)
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetFanSpeed')
 		
 		
+	@requires('nvmlDeviceGetPowerState')
 	def performanceState(self):
 		"""Returns "power state" of device."""
 		try:
-			return nvmlDeviceGetPowerState(self.handle)
-		except NVMLError as err:
-			return handleError(err)
+			return self.nvml.nvmlDeviceGetPowerState(self.handle)
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetPowerState')
 		
 		
 	def pcieThroughput(self):
@@ -271,67 +597,60 @@ class VideoCard:
 			'rx_kb_sec': 0
 		}
 		try:
-			throughput['tx_kb_sec'] = nvmlDeviceGetPcieThroughput(self.handle, NVML_PCIE_UTIL_TX_BYTES)
-		except NVMLError as err:
+			throughput['tx_kb_sec'] = self.nvml.nvmlDeviceGetPcieThroughput(self.handle, NVML_PCIE_UTIL_TX_BYTES)
+		except py3nvml.NVMLError as err:
 			throughput['tx_kb_sec'] =  handleError(err)
 
 		try:
-			throughput['rx_kb_sec'] = nvmlDeviceGetPcieThroughput(self.handle, NVML_PCIE_UTIL_RX_BYTES)
-		except NVMLError as err:
+			throughput['rx_kb_sec'] = self.nvml.nvmlDeviceGetPcieThroughput(self.handle, NVML_PCIE_UTIL_RX_BYTES)
+		except py3nvml.NVMLError as err:
 			throughput['rx_kb_sec'] =  handleError(err)
 	
 		return throughput
 		
 	
-	def memInfo(self):
-		info = {}
-		try:
-			memInfo = nvmlDeviceGetMemoryInfo(self.handle)
-			mem_total = str(memInfo.total / 1024 / 1024) + ' MiB'
-			mem_used = str(memInfo.used / 1024 / 1024) + ' MiB'
-			mem_free = str(memInfo.total / 1024 / 1024 - memInfo.used / 1024 / 1024) + ' MiB'
-		except NVMLError as err:
-			error = handleError(err)
-			mem_total = error
-			mem_used = error
-			mem_free = error
-		info['memory'] = {}
-		info['memory']['total'] = memInfo.total
-		info['memory']['used'] = memInfo.used
-		info['memory']['free'] = memInfo.total - memInfo.used
-		info['total'] = mem_total
-		info['used'] = mem_used
-		info['free'] = mem_free
-		return info
+	@requires('nvmlDeviceGetMemoryInfo')
+	def memInfo(self, raw=None):
+		try:
+			memInfo = self.nvml.nvmlDeviceGetMemoryInfo(self.handle)
+		except py3nvml.NVMLError as err:
+			error = self._failed(err, 'nvmlDeviceGetMemoryInfo')
+			return {'memory': {}, 'total': error, 'used': error, 'free': error}
+		return self._memory(memInfo.total, memInfo.used, raw)
 		
 		
-	def bar1MemInfo(self):
-		info = {}
-		try:
-			memInfo = nvmlDeviceGetBAR1MemoryInfo(self.handle)
-			mem_total = str(memInfo.bar1Total  / 1024 / 1024) + ' MiB'
-			mem_used = str(memInfo.bar1Used  / 1024 / 1024) + ' MiB'
-			mem_free = str(memInfo.bar1Total  / 1024 / 1024 - memInfo.bar1Used  / 1024 / 1024) + ' MiB'
-		except NVMLError as err:
-			error = handleError(err)
-			mem_total = error
-			mem_used = error
-			mem_free = error
-		info['memory'] = {}
-		info['memory']['total'] = memInfo.bar1Total 
-		info['memory']['used'] = memInfo.bar1Used 
-		info['memory']['free'] = memInfo.bar1Total  - memInfo.bar1Used 
-		info['total'] = mem_total
-		info['used'] = mem_used
-		info['free'] = mem_free
-		return info
+	@requires('nvmlDeviceGetBAR1MemoryInfo')
+	def bar1MemInfo(self, raw=None):
+		try:
+			memInfo = self.nvml.nvmlDeviceGetBAR1MemoryInfo(self.handle)
+		except py3nvml.NVMLError as err:
+			error = self._failed(err, 'nvmlDeviceGetBAR1MemoryInfo')
+			return {'memory': {}, 'total': error, 'used': error, 'free': error}
+		return self._memory(memInfo.bar1Total, memInfo.bar1Used, raw)
+	
+	
+	def _memory(self, total, used, raw):
+		memory = {
+			'total': total,
+			'used': used,
+			'free': total - used
+		}
+		if (self.raw if raw is None else raw):
+			return MemoryReading(memory=memory)
+		return {
+			'memory': memory,
+			'total': str(total / 1024 / 1024) + ' MiB',
+			'used': str(used / 1024 / 1024) + ' MiB',
+			'free': str(total / 1024 / 1024 - used / 1024 / 1024) + ' MiB'
+		}
 		
 		
+	@requires('nvmlDeviceGetComputeMode')
 	def computeMode(self):
 		compute_mode = {}
 	
 		try:
-			mode = nvmlDeviceGetComputeMode(self.handle)
+			mode = self.nvml.nvmlDeviceGetComputeMode(self.handle)
 			if mode == NVML_COMPUTEMODE_DEFAULT:
 				modeStr = 'Default'
 			elif mode == NVML_COMPUTEMODE_EXCLUSIVE_THREAD:
@@ -342,338 +661,263 @@ class VideoCard:
 				modeStr = 'Exclusive_Process'
 			else:
 				modeStr = 'Unknown'
-		except NVMLError as err:
-			modeStr = handleError(err)
+		except py3nvml.NVMLError as err:
+			mode = None
+			modeStr = self._failed(err, 'nvmlDeviceGetComputeMode')
 			
 		compute_mode['mode'] = mode
 		compute_mode['mode_str'] = modeStr
 		return compute_mode
 		
-	def clocksThrottleReasons(self):
-		throttleReasons = [
-				[nvmlClocksThrottleReasonGpuIdle,           "clocks_throttle_reason_gpu_idle"],
-				[nvmlClocksThrottleReasonUserDefinedClocks, "clocks_throttle_reason_user_defined_clocks"],
-				[nvmlClocksThrottleReasonApplicationsClocksSetting, "clocks_throttle_reason_applications_clocks_setting"],
-				[nvmlClocksThrottleReasonSwPowerCap,        "clocks_throttle_reason_sw_power_cap"],
-				[nvmlClocksThrottleReasonHwSlowdown,        "clocks_throttle_reason_hw_slowdown"],
-				[nvmlClocksThrottleReasonUnknown,           "clocks_throttle_reason_unknown"]
-				];
-
-		reasons = {}
-
+	@memoize
+	def supportedThrottleReasons(self):
+		"""Bitmask of the clocks throttle reasons this device can report."""
 		try:
-			supportedClocksThrottleReasons = nvmlDeviceGetSupportedClocksThrottleReasons(self.handle)
-			clocksThrottleReasons = nvmlDeviceGetCurrentClocksThrottleReasons(self.handle)
-			
-			for (mask, name) in throttleReasons:
-				if (name != "clocks_throttle_reason_user_defined_clocks"):
-					if (mask & supportedClocksThrottleReasons):
-						val = True if mask & clocksThrottleReasons else False
-					else:
-						val = handleError(NVML_ERROR_NOT_SUPPORTED);
-					reasons[name] = val
-		except NVMLError as err:
-			return handleError(err)
-
-		return reasons
+			return self.nvml.nvmlDeviceGetSupportedClocksThrottleReasons(self.handle)
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetSupportedClocksThrottleReasons')
 	
 	
-	def utilizationRates(self):
-		rates = {
-			'gpu': 0,
-			'memory': 0,
-			'encoder': 0,
-			'decoder': 0
-		}
+	@requires('nvmlDeviceGetSupportedClocksThrottleReasons', 'nvmlDeviceGetCurrentClocksThrottleReasons')
+	def clocksThrottleReasons(self):
+		supported = self.supportedThrottleReasons()
+		if supported == NOT_SUPPORTED:
+			return NOT_SUPPORTED
 		try:
-			util = nvmlDeviceGetUtilizationRates(self.handle)
-			rates['gpu'] = util.gpu
-			rates['memory'] = util.memory
-			gpu_util = str(util.gpu) + '%'
-			mem_util = str(util.memory) + '%'
-		except NVMLError as err:
-			error = handleError(err)
-			gpu_util = error
-			mem_util = error
-		rates['gpu_util'] = gpu_util		
-		rates['mem_util'] = mem_util
+			current = self.nvml.nvmlDeviceGetCurrentClocksThrottleReasons(self.handle)
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetCurrentClocksThrottleReasons')
+		return decodeThrottleReasons(supported, current)
+	
+	
+	def utilizationRates(self, raw=None):
+		raw = self.raw if raw is None else raw
+		rates = UtilizationReading() if raw else {}
+		rates['gpu'] = 0
+		rates['memory'] = 0
+		rates['encoder'] = 0
+		rates['decoder'] = 0
+		lacking = self._lacking()
+		if ('nvmlDeviceGetUtilizationRates', ()) in lacking:
+			rates['gpu_util'] = NOT_SUPPORTED
+			rates['mem_util'] = NOT_SUPPORTED
+		else:
+			try:
+				util = self.nvml.nvmlDeviceGetUtilizationRates(self.handle)
+				rates['gpu'] = util.gpu
+				rates['memory'] = util.memory
+				if not raw:
+					rates['gpu_util'] = str(util.gpu) + '%'
+					rates['mem_util'] = str(util.memory) + '%'
+			except py3nvml.NVMLError as err:
+				error = self._failed(err, 'nvmlDeviceGetUtilizationRates')
+				rates['gpu_util'] = error
+				rates['mem_util'] = error
 		
-		try:
-			(util_int, ssize) = nvmlDeviceGetEncoderUtilization(self.handle)
-			rates['encoder'] = util_int
-			encoder_util = str(util_int) + '%'
-		except NVMLError as err:
-			error = handleError(err)
-			encoder_util = error
-
-		rates['encoder_util'] = encoder_util
-
-		try:
-			(util_int, ssize) = nvmlDeviceGetDecoderUtilization(self.handle)
-			rates['decoder'] = util_int
-			decoder_util = str(util_int) + '%'
-		except NVMLError as err:
-			error = handleError(err)
-			decoder_util = error
+		if ('nvmlDeviceGetEncoderUtilization', ()) in lacking:
+			rates['encoder_util'] = NOT_SUPPORTED
+		else:
+			try:
+				(util_int, ssize) = self.nvml.nvmlDeviceGetEncoderUtilization(self.handle)
+				rates['encoder'] = util_int
+				if not raw:
+					rates['encoder_util'] = str(util_int) + '%'
+			except py3nvml.NVMLError as err:
+				rates['encoder_util'] = self._failed(err, 'nvmlDeviceGetEncoderUtilization')
 
-		rates['decoder_util'] = decoder_util
+		if ('nvmlDeviceGetDecoderUtilization', ()) in lacking:
+			rates['decoder_util'] = NOT_SUPPORTED
+		else:
+			try:
+				(util_int, ssize) = self.nvml.nvmlDeviceGetDecoderUtilization(self.handle)
+				rates['decoder'] = util_int
+				if not raw:
+					rates['decoder_util'] = str(util_int) + '%'
+			except py3nvml.NVMLError as err:
+				rates['decoder_util'] = self._failed(err, 'nvmlDeviceGetDecoderUtilization')
 		
 		return rates
 		
 		
+	@memoize
 	def temperatureThresholds(self):
 		"""Returns temperature thresholds in degrees Celsius."""
 		current = {}
 		try:
-			current['shutdown_threshold'] = nvmlDeviceGetTemperatureThreshold(self.handle, NVML_TEMPERATURE_THRESHOLD_SHUTDOWN)
-		except NVMLError as err:
+			current['shutdown_threshold'] = self.nvml.nvmlDeviceGetTemperatureThreshold(self.handle, NVML_TEMPERATURE_THRESHOLD_SHUTDOWN)
+		except py3nvml.NVMLError as err:
 			current['shutdown_threshold'] = handleError(err)
 	
 		try:
-			current['slowdown_threshold'] = nvmlDeviceGetTemperatureThreshold(self.handle, NVML_TEMPERATURE_THRESHOLD_SLOWDOWN)
-		except NVMLError as err:
+			current['slowdown_threshold'] = self.nvml.nvmlDeviceGetTemperatureThreshold(self.handle, NVML_TEMPERATURE_THRESHOLD_SLOWDOWN)
+		except py3nvml.NVMLError as err:
 			current['slowdown_threshold'] = handleError(err)
 			
 		return current
 		
 		
+	@requires(('nvmlDeviceGetTemperature', NVML_TEMPERATURE_GPU))
 	def temperature(self):
 		"""Returns temperature in degrees Celsius."""
 		try:
-			return nvmlDeviceGetTemperature(self.handle, NVML_TEMPERATURE_GPU)
-		except NVMLError as err:
-			return handleError(err)
+			return self.nvml.nvmlDeviceGetTemperature(self.handle, NVML_TEMPERATURE_GPU)
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetTemperature', NVML_TEMPERATURE_GPU)
 
 			
-	def powerUsage(self):
-		current = {
-			'draw': None,
-			'usage': None
-		}
+	@requires('nvmlDeviceGetPowerUsage')
+	def powerUsage(self, raw=None):
 		try:
-			powDraw = nvmlDeviceGetPowerUsage(self.handle)
-			powDrawStr = '%.2f W' % (powDraw / 1000.0)
-			current['draw'] = powDraw
-			current['usage'] = powDrawStr
-		except NVMLError as err:
-			powDrawStr = handleError(err)
-			current['usage'] = powDrawStr
+			powDraw = self.nvml.nvmlDeviceGetPowerUsage(self.handle)
+		except py3nvml.NVMLError as err:
+			return {'draw': None, 'usage': self._failed(err, 'nvmlDeviceGetPowerUsage')}
 		
-		return current
+		if (self.raw if raw is None else raw):
+			return PowerUsageReading(draw=powDraw)
+		return {
+			'draw': powDraw,
+			'usage': '%.2f W' % (powDraw / 1000.0)
+		}
+		
+		
+	@requires('nvmlDeviceGetTotalEnergyConsumption')
+	def totalEnergyConsumption(self):
+		"""Returns energy used since the driver was last loaded, in millijoules."""
+		try:
+			return self.nvml.nvmlDeviceGetTotalEnergyConsumption(self.handle)
+		except py3nvml.NVMLError as err:
+			return self._failed(err, 'nvmlDeviceGetTotalEnergyConsumption')
 		
 		
-	def powerSettings(self):
+	def powerSettings(self, raw=None):
+		raw = self.raw if raw is None else raw
 		current = {
-			'power_state': {},
-			'power_management_mode': {},
-			'power_management_limit': {},
-			'power_management_default_limit': {},
-			'enforced_power_limit': {},
-			'power_management_limit_constraints': {}
+			'power_state': PowerStateReading() if raw else {},
+			'power_management_mode': PowerModeReading() if raw else {},
+			'power_management_limit': self._powerLimit('nvmlDeviceGetPowerManagementLimit', raw),
+			'power_management_default_limit': self._powerLimit('nvmlDeviceGetPowerManagementDefaultLimit', raw),
+			'enforced_power_limit': self._powerLimit('nvmlDeviceGetEnforcedPowerLimit', raw),
+			'power_management_limit_constraints': dict(self.powerLimitConstraints())
 		}
 		
 		try:
-			perfState = nvmlDeviceGetPowerState(self.handle)
+			perfState = self.nvml.nvmlDeviceGetPowerState(self.handle)
 			current['power_state']['state'] = perfState
-			current['power_state']['state_str'] = 'P' + str(perfState)
-		except NVMLError as err:
+			if not raw:
+				current['power_state']['state_str'] = 'P' + str(perfState)
+		except py3nvml.NVMLError as err:
 			current['power_state']['state_str'] = handleError(err)
 		
 		try:
-			powMan = nvmlDeviceGetPowerManagementMode(self.handle)
+			powMan = self.nvml.nvmlDeviceGetPowerManagementMode(self.handle)
 			current['power_management_mode']['mode'] = powMan
-			current['power_management_mode']['mode_str'] = 'Supported' if powMan != 0 else 'N/A'
-		except NVMLError as err:
+			if not raw:
+				current['power_management_mode']['mode_str'] = 'Supported' if powMan != 0 else 'N/A'
+		except py3nvml.NVMLError as err:
 			current['power_management_mode']['mode_str'] = handleError(err)
-			
-		try:
-			powLimit = nvmlDeviceGetPowerManagementLimit(self.handle)
-			powLimitStr  = '%.2f W' % (powLimit / 1000.0)
-			current['power_management_limit']['limit'] = powLimit
-			current['power_management_limit']['limit_str'] = powLimitStr
-		except NVMLError as err:
-			powLimitStr = handleError(err)
-			current['power_management_limit']['limit_str'] = powLimitStr
-			
-		try:
-			powLimit = nvmlDeviceGetPowerManagementDefaultLimit(self.handle)
-			powLimitStr  = '%.2f W' % (powLimit / 1000.0)
-			current['power_management_default_limit']['limit'] = powLimit
-			current['power_management_default_limit']['limit_str'] = powLimitStr
-		except NVMLError as err:
-			powLimitStr = handleError(err)
-			current['power_management_default_limit']['limit_str'] = powLimitStr
-			
+		
+		return current
+	
+	
+	def _powerLimit(self, function, raw):
+		if (function, ()) in self._lacking():
+			return {'limit_str': NOT_SUPPORTED}
 		try:
-			powLimit = nvmlDeviceGetEnforcedPowerLimit(self.handle)
-			powLimitStr  = '%.2f W' % (powLimit / 1000.0)
-			current['enforced_power_limit']['limit'] = powLimit
-			current['enforced_power_limit']['limit_str'] = powLimitStr
-		except NVMLError as err:
-			powLimitStr = handleError(err)
-			current['enforced_power_limit']['limit_str'] = powLimitStr
-			
+			powLimit = getattr(self.nvml, function)(self.handle)
+		except py3nvml.NVMLError as err:
+			return {'limit_str': self._failed(err, function)}
+		if raw:
+			return PowerLimitReading(limit=powLimit)
+		return {
+			'limit': powLimit,
+			'limit_str': '%.2f W' % (powLimit / 1000.0)
+		}
+	
+	
+	@memoize
+	def powerLimitConstraints(self):
+		constraints = {}
 		try:
-			powLimit = nvmlDeviceGetPowerManagementLimitConstraints(self.handle)
+			powLimit = self.nvml.nvmlDeviceGetPowerManagementLimitConstraints(self.handle)
 			powLimitMin = powLimit[0]
 			powLimitMax = powLimit[1]
 			powLimitStrMin = '%.2f W' % (powLimitMin / 1000.0)
 			powLimitStrMax = '%.2f W' % (powLimitMax / 1000.0)
-			current['power_management_limit_constraints']['limit_min'] = powLimitMin
-			current['power_management_limit_constraints']['limit_min_str'] = powLimitStrMin
-			current['power_management_limit_constraints']['limit_max'] = powLimitMax
-			current['power_management_limit_constraints']['limit_max_str'] = powLimitStrMax
-		except NVMLError as err:
+			constraints['limit_min'] = powLimitMin
+			constraints['limit_min_str'] = powLimitStrMin
+			constraints['limit_max'] = powLimitMax
+			constraints['limit_max_str'] = powLimitStrMax
+		except py3nvml.NVMLError as err:
 			powLimitStr = handleError(err)
-			current['power_management_limit_constraints']['limit_min_str'] = powLimitStr
-			current['power_management_limit_constraints']['limit_max_str'] = powLimitStr
-		
-		return current
+			constraints['limit_min_str'] = powLimitStr
+			constraints['limit_max_str'] = powLimitStr
+		return constraints
 			
 	
-	def gpuClock(self):
-		current = {
-			'rate': None
-		}
+	def _clock(self, function, clockType, raw):
+		if (function, (clockType,)) in self._lacking():
+			return {'rate': None, 'rate_str': NOT_SUPPORTED}
 		try:
-			clockRate = nvmlDeviceGetClockInfo(self.handle, NVML_CLOCK_GRAPHICS)
-			current['rate'] = clockRate
-			current['rate_str'] = str(clockRate) + ' MHz'
-		except NVMLError as err:
-			current['rate_str'] = handleError(err)
-	
-		return current
-	
-	
-	def gpuMaxClock(self):
-		current = {
-			'rate': None
+			clockRate = getattr(self.nvml, function)(self.handle, clockType)
+		except py3nvml.NVMLError as err:
+			return {'rate': None, 'rate_str': self._failed(err, function, clockType)}
+		if (self.raw if raw is None else raw):
+			return ClockReading(rate=clockRate)
+		return {
+			'rate': clockRate,
+			'rate_str': str(clockRate) + ' MHz'
 		}
-		try:
-			clockRate = nvmlDeviceGetMaxClockInfo(self.handle, NVML_CLOCK_GRAPHICS)
-			current['rate'] = clockRate
-			current['rate_str'] = str(clockRate) + ' MHz'
-		except NVMLError as err:
-			current['rate_str'] = handleError(err)
 	
-		return current
 	
+	def gpuClock(self, raw=None):
+		return self._clock('nvmlDeviceGetClockInfo', NVML_CLOCK_GRAPHICS, raw)
 	
-	def gpuApplicationsClock(self):
-		current = {
-			'rate': None
-		}
-		try:
-			clockRate = nvmlDeviceGetApplicationsClock(self.handle, NVML_CLOCK_GRAPHICS)
-			current['rate'] = clockRate
-			current['rate_str'] = str(clockRate) + ' MHz'
-		except NVMLError as err:
-			current['rate_str'] = handleError(err)
 	
-		return current
+	@memoize
+	def gpuMaxClock(self, raw=None):
+		return self._clock('nvmlDeviceGetMaxClockInfo', NVML_CLOCK_GRAPHICS, raw)
 	
 	
-	def gpuDefaultApplicationsClock(self):
-		current = {
-			'rate': None
-		}
-		try:
-			clockRate = nvmlDeviceGetDefaultApplicationsClock(self.handle, NVML_CLOCK_GRAPHICS)
-			current['rate'] = clockRate
-			current['rate_str'] = str(clockRate) + ' MHz'
-		except NVMLError as err:
-			current['rate_str'] = handleError(err)
+	def gpuApplicationsClock(self, raw=None):
+		return self._clock('nvmlDeviceGetApplicationsClock', NVML_CLOCK_GRAPHICS, raw)
 	
-		return current
 	
+	@memoize
+	def gpuDefaultApplicationsClock(self, raw=None):
+		return self._clock('nvmlDeviceGetDefaultApplicationsClock', NVML_CLOCK_GRAPHICS, raw)
 	
-	def memoryClock(self):
-		current = {
-			'rate': None
-		}
-		try:
-			clockRate = nvmlDeviceGetClockInfo(self.handle, NVML_CLOCK_MEM)
-			current['rate'] = clockRate
-			current['rate_str'] = str(clockRate) + ' MHz'
-		except NVMLError as err:
-			current['rate_str'] = handleError(err)
 	
-		return current
+	def memoryClock(self, raw=None):
+		return self._clock('nvmlDeviceGetClockInfo', NVML_CLOCK_MEM, raw)
 		
 	
-	def memoryMaxClock(self):
-		current = {
-			'rate': None
-		}
-		try:
-			clockRate = nvmlDeviceGetMaxClockInfo(self.handle, NVML_CLOCK_MEM)
-			current['rate'] = clockRate
-			current['rate_str'] = str(clockRate) + ' MHz'
-		except NVMLError as err:
-			current['rate_str'] = handleError(err)
-	
-		return current
+	@memoize
+	def memoryMaxClock(self, raw=None):
+		return self._clock('nvmlDeviceGetMaxClockInfo', NVML_CLOCK_MEM, raw)
 	
 	
-	def memoryApplicationsClock(self):
-		current = {
-			'rate': None
-		}
-		try:
-			clockRate = nvmlDeviceGetApplicationsClock(self.handle, NVML_CLOCK_MEM)
-			current['rate'] = clockRate
-			current['rate_str'] = str(clockRate) + ' MHz'
-		except NVMLError as err:
-			current['rate_str'] = handleError(err)
-	
-		return current
+	def memoryApplicationsClock(self, raw=None):
+		return self._clock('nvmlDeviceGetApplicationsClock', NVML_CLOCK_MEM, raw)
 		
 		
-	def memoryDefaultApplicationsClock(self):
-		current = {
-			'rate': None
-		}
-		try:
-			clockRate = nvmlDeviceGetDefaultApplicationsClock(self.handle, NVML_CLOCK_MEM)
-			current['rate'] = clockRate
-			current['rate_str'] = str(clockRate) + ' MHz'
-		except NVMLError as err:
-			current['rate_str'] = handleError(err)
-	
-		return current
+	@memoize
+	def memoryDefaultApplicationsClock(self, raw=None):
+		return self._clock('nvmlDeviceGetDefaultApplicationsClock', NVML_CLOCK_MEM, raw)
 	
 	
-	def smClock(self):
-		current = {
-			'rate': None
-		}
-		try:
-			clockRate = nvmlDeviceGetClockInfo(self.handle, NVML_CLOCK_SM)
-			current['rate'] = clockRate
-			current['rate_str'] = str(clockRate) + ' MHz'
-		except NVMLError as err:
-			current['rate_str'] = handleError(err)
-	
-		return current
+	def smClock(self, raw=None):
+		return self._clock('nvmlDeviceGetClockInfo', NVML_CLOCK_SM, raw)
 		
 		
-	def smMaxClock(self):
-		current = {
-			'rate': None
-		}
-		try:
-			clockRate = nvmlDeviceGetMaxClockInfo(self.handle, NVML_CLOCK_SM)
-			current['rate'] = clockRate
-			current['rate_str'] = str(clockRate) + ' MHz'
-		except NVMLError as err:
-			current['rate_str'] = handleError(err)
-	
-		return current
+	@memoize
+	def smMaxClock(self, raw=None):
+		return self._clock('nvmlDeviceGetMaxClockInfo', NVML_CLOCK_SM, raw)
 		
 		
+	@requires('nvmlDeviceGetAutoBoostedClocksEnabled')
 	def autoBoostedClocksEnabled(self):
 		try:
-			boostedState, boostedDefaultState = nvmlDeviceGetAutoBoostedClocksEnabled(self.handle)
+			boostedState, boostedDefaultState = self.nvml.nvmlDeviceGetAutoBoostedClocksEnabled(self.handle)
 			if boostedState == NVML_FEATURE_DISABLED:
 				autoBoostStr = "Off"
 			else:
@@ -684,12 +928,10 @@ class VideoCard:
 			else:
 				autoBoostDefaultStr = "On"
 			
-		except NVMLError_NotSupported:
-			autoBoostStr = "N/A"
-			autoBoostDefaultStr = "N/A"
-		except NVMLError as err:
-			autoBoostStr = handleError(err)
-			autoBoostDefaultStr = handleError(err)
+		except py3nvml.NVMLError as err:
+			# raises unless the device lacks it
+			self._failed(err, 'nvmlDeviceGetAutoBoostedClocksEnabled')
+			autoBoostStr = autoBoostDefaultStr = "N/A"
 		
 		return {
 			'auto_boost': autoBoostStr,
@@ -697,27 +939,159 @@ class VideoCard:
 		}
 	
 	
+	@memoize
 	def supportedClocks(self):
 		final = []
 		try:
-			memClocks = nvmlDeviceGetSupportedMemoryClocks(self.handle)
+			memClocks = self.nvml.nvmlDeviceGetSupportedMemoryClocks(self.handle)
 			for m in memClocks:
 				clobj = {
 					'mem_clock': m,
 					'gpu_clocks': []
 				}
 				try:
-					clocks = nvmlDeviceGetSupportedGraphicsClocks(self.handle, m)
+					clocks = self.nvml.nvmlDeviceGetSupportedGraphicsClocks(self.handle, m)
 					for c in clocks:
 						clobj['gpu_clocks'].append(c)
-				except NVMLError as err:
+				except py3nvml.NVMLError as err:
 					clobj['gpu_clocks'] = handleError(err)
 				final.append(clobj)
 
-		except NVMLError as err:
+		except py3nvml.NVMLError as err:
 			final = handleError(err)
 
 		return final
+
+
+	@memoize
+	def clockTable(self):
+		"""Returns the supported clocks as a ClockTable for fast nearest-clock queries.
+		
+		Built once from supportedClocks(), so it costs no further NVML calls."""
+		supported = self.supportedClocks()
+		if supported == NOT_SUPPORTED:
+			return NOT_SUPPORTED
+		return ClockTable.fromSupportedClocks(supported)
+
+
+	def _processes(self, function):
+		try:
+			procs = getattr(self.nvml, function)(self.handle)
+		except py3nvml.NVMLError as err:
+			return self._failed(err, function)
+		return [{'pid': p.pid, 'used_memory': p.usedGpuMemory} for p in procs]
+
+
+	@requires('nvmlDeviceGetComputeRunningProcesses')
+	def computeProcesses(self):
+		"""Processes with a compute (CUDA) context, as dicts of pid and used_memory in bytes.
+
+		used_memory is None where the driver cannot tell (WDDM)."""
+		return self._processes('nvmlDeviceGetComputeRunningProcesses')
+
+
+	@requires('nvmlDeviceGetGraphicsRunningProcesses')
+	def graphicsProcesses(self):
+		"""Processes with a graphics context, as dicts of pid and used_memory in bytes."""
+		return self._processes('nvmlDeviceGetGraphicsRunningProcesses')
+
+
+	def runningProcesses(self):
+		"""Compute and graphics processes together, keyed by pid.
+
+		Each value holds used_memory and type: 'C', 'G' or 'C+G' as in
+		nvidia-smi. A process in both lists is counted once, with the larger
+		memory figure. NOT_SUPPORTED if neither list can be read."""
+		compute = self.computeProcesses()
+		graphics = self.graphicsProcesses()
+		if compute == NOT_SUPPORTED and graphics == NOT_SUPPORTED:
+			return NOT_SUPPORTED
+		procs = {}
+		for (kind, found) in (('C', compute), ('G', graphics)):
+			if found == NOT_SUPPORTED:
+				continue
+			for p in found:
+				known = procs.get(p['pid'])
+				if known is None:
+					procs[p['pid']] = {'used_memory': p['used_memory'], 'type': kind}
+				else:
+					known['type'] = 'C+G'
+					if (p['used_memory'] or 0) > (known['used_memory'] or 0):
+						known['used_memory'] = p['used_memory']
+		return procs
+
+
+	def accountingPids(self):
+		"""PIDs, running or finished, that accountingStats() can report on.
+
+		NOT_SUPPORTED when accounting mode is off."""
+		try:
+			return self.nvml.nvmlDeviceGetAccountingPids(self.handle)
+		except py3nvml.NVMLError as err:
+			return handleError(err)
+
+
+	def accountingStats(self, pid):
+		"""Returns a process's accounting stats, or None once it has left the accounting buffer.
+
+		gpu_util and mem_util are percentages over the process lifetime,
+		max_memory_usage is in bytes, time is the run time in ms (0 while
+		running) and start_time is in microseconds since the epoch."""
+		try:
+			stats = self.nvml.nvmlDeviceGetAccountingStats(self.handle, pid)
+		except py3nvml.NVMLError as err:
+			if err.value == NVML_ERROR_NOT_FOUND:
+				return None
+			return handleError(err)
+		return {
+			'gpu_util': stats.gpuUtilization,
+			'mem_util': stats.memoryUtilization,
+			'max_memory_usage': stats.maxMemoryUsage,
+			'time': stats.time,
+			'start_time': stats.startTime,
+			'is_running': bool(stats.isRunning)
+		}
+
+
+	def snapshot(self, fields=defaultSnapshotFields):
+		"""Reads the requested metrics in one pass and returns a Snapshot namedtuple.
+		
+		Values are the raw NVML numbers (MHz, mW, bytes, %, bitmasks); fields the
+		device does not support are None and, after the first call, are not
+		read at all."""
+		if not isinstance(fields, tuple):
+			fields = tuple(fields)
+		if self._generation != _initGeneration:
+			self.refresh()
+		plan = self._static.get(('snapshot', fields))
+		if plan is None:
+			record, steps = snapshotPlan(fields, self.nvml)
+			lacking = self._lacking()
+			plan = self._static[('snapshot', fields)] = (record, tuple(s for s in steps if (s[0], s[2]) not in lacking))
+		record, steps = plan
+		handle = self.handle
+		values = [None] * (len(fields) + 2)
+		values[0] = self.index
+		values[1] = time.time()
+
+		for (name, fn, args, extract, slot) in steps:
+			try:
+				result = fn(handle, *args)
+			except py3nvml.NVMLError as err:
+				self._failed(err, name, *args)
+				# plan the next snapshot without it
+				self._static.pop(('snapshot', fields), None)
+				continue
+			if extract is not None:
+				result = extract(result)
+			if slot.__class__ is int:
+				values[slot] = result
+			else:
+				for (s, v) in zip(slot, result):
+					if s is not None:
+						values[s] = v
+
+		return record._make(values)
 	
 	
 	def describe(self):
@@ -744,6 +1118,8 @@ class VideoCard:
 		print("            \t\tOEM: \t{}".format(infoRom["oem_object"]))
 		print("            \t\tECC: \t{}".format(infoRom["ecc_object"]))
 		print("            \t\tPWR: \t{}".format(infoRom["pwr_object"]))
+		# nvidia_smi is slow to import and only needed here
+		from py3nvml.nvidia_smi import StrGOM
 		print("    Current GPU Operation Mode: {}".format(StrGOM(self.currentGpuOperationMode())))
 		print("    Pending GPU Operation Mode: {}".format(StrGOM(self.pendingGpuOperationMode())))
 		print("    \tPCI:")
@@ -754,15 +1130,16 @@ class VideoCard:
 		print("            \t\tDeviceId: \t{}".format('%02X' % self.pciInfo.pciDeviceId))
 		print("            \t\tSubsystemId: \t{}".format('%02X' % self.pciInfo.pciSubSystemId))
 		
-def getVideoCards():
+def getVideoCards(backend=None):
+	backend = backend or getBackend()
 	cards = []
 	try:
-		deviceCount = nvmlDeviceGetCount()
+		deviceCount = backend.nvmlDeviceGetCount()
 		for i in range(deviceCount):
-			c = VideoCard(i)
+			c = VideoCard(i, backend=backend)
 			cards.append(c)
 		return cards
-	except NVMLError as err:
+	except py3nvml.NVMLError as err:
 		handleError(err)
 		return None
 
@@ -0,0 +1,114 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class ClockTable:
+	"""A device's supported (memory clock, graphics clock) pairs in flat arrays.
+
+	memoryClocks holds the memory clocks in ascending order. The graphics
+	clocks of all of them sit in one array, each memory clock's run sorted
+	ascending, and offsets[i]:offsets[i + 1] is the run of memoryClocks[i].
+	Queries are binary searches over those runs, so nothing is copied or
+	read from NVML. All clocks are in MHz; queries return None when nothing
+	matches or the memory clock is not supported."""
+
+	__slots__ = ('memoryClocks', 'graphicsClocks', 'offsets')
+
+	def __init__(self, clocks):
+		"""clocks maps each memory clock to an iterable of its graphics clocks."""
+		self.memoryClocks = array('I', sorted(clocks))
+		self.graphicsClocks = array('I')
+		self.offsets = array('I', [0])
+		for m in self.memoryClocks:
+			self.graphicsClocks.extend(sorted(set(clocks[m])))
+			self.offsets.append(len(self.graphicsClocks))
+
+	@classmethod
+	def fromSupportedClocks(cls, supported):
+		"""Builds a table from VideoCard.supportedClocks() output."""
+		return cls(dict(
+			(entry['mem_clock'], entry['gpu_clocks'] if isinstance(entry['gpu_clocks'], list) else ())
+			for entry in supported
+		))
+
+	def __len__(self):
+		return len(self.graphicsClocks)
+
+	def __repr__(self):
+		return 'ClockTable({} memory clocks, {} pairs)'.format(len(self.memoryClocks), len(self.graphicsClocks))
+
+	def __contains__(self, pair):
+		(memory, graphics) = pair
+		run = self._run(memory)
+		if run is None:
+			return False
+		i = bisect_left(self.graphicsClocks, graphics, *run)
+		return i < run[1] and self.graphicsClocks[i] == graphics
+
+	def _run(self, memory):
+		i = bisect_left(self.memoryClocks, memory)
+		if i == len(self.memoryClocks) or self.memoryClocks[i] != memory:
+			return None
+		return (self.offsets[i], self.offsets[i + 1])
+
+	def graphics(self, memory):
+		"""Ascending graphics clocks supported with a memory clock (a copy), or None."""
+		run = self._run(memory)
+		return None if run is None else self.graphicsClocks[run[0]:run[1]]
+
+	def highestGraphics(self, memory, atMost=None):
+		"""Highest graphics clock <= atMost (default: no limit) with the memory clock."""
+		run = self._run(memory)
+		if run is None or run[0] == run[1]:
+			return None
+		if atMost is None:
+			return self.graphicsClocks[run[1] - 1]
+		i = bisect_right(self.graphicsClocks, atMost, *run)
+		return self.graphicsClocks[i - 1] if i > run[0] else None
+
+	def lowestGraphics(self, memory, atLeast=None):
+		"""Lowest graphics clock >= atLeast (default: no limit) with the memory clock."""
+		run = self._run(memory)
+		if run is None or run[0] == run[1]:
+			return None
+		if atLeast is None:
+			return self.graphicsClocks[run[0]]
+		i = bisect_left(self.graphicsClocks, atLeast, *run)
+		return self.graphicsClocks[i] if i < run[1] else None
+
+	def nearestGraphics(self, memory, target):
+		"""Supported graphics clock closest to target with the memory clock (the lower on a tie)."""
+		below = self.highestGraphics(memory, target)
+		above = self.lowestGraphics(memory, target)
+		if below is None or above is None:
+			return above if below is None else below
+		return below if target - below <= above - target else above
+
+	def nearestMemory(self, target):
+		"""Supported memory clock closest to target (the lower on a tie)."""
+		clocks = self.memoryClocks
+		if not clocks:
+			return None
+		i = bisect_left(clocks, target)
+		if i == 0:
+			return clocks[0]
+		if i == len(clocks):
+			return clocks[-1]
+		return clocks[i - 1] if target - clocks[i - 1] <= clocks[i] - target else clocks[i]
+
+	def pairs(self, memoryRange=None, graphicsRange=None):
+		"""All supported (memory, graphics) pairs with both clocks inside the
+		inclusive (low, high) ranges; None means no limit. Ascending order."""
+		(memLow, memHigh) = memoryRange or (0, 0xffffffff)
+		(gfxLow, gfxHigh) = graphicsRange or (0, 0xffffffff)
+		clocks = self.graphicsClocks
+		offsets = self.offsets
+		found = []
+		first = bisect_left(self.memoryClocks, memLow)
+		last = bisect_right(self.memoryClocks, memHigh)
+		for i in range(first, last):
+			memory = self.memoryClocks[i]
+			start = bisect_left(clocks, gfxLow, offsets[i], offsets[i + 1])
+			end = bisect_right(clocks, gfxHigh, start, offsets[i + 1])
+			found.extend((memory, g) for g in clocks[start:end])
+		return found
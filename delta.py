@@ -0,0 +1,111 @@
+from card import defaultSnapshotFields
+from fleet import pollAll
+from registry import getRegistry
+from collections import namedtuple
+import time
+
+Delta = namedtuple('Delta', ('index', 'timestamp', 'keyframe', 'changes'))
+Delta.__doc__ = """What changed on one device since the last Delta emitted for it.
+
+changes maps field name to the new raw value. In a keyframe it holds every
+field, so a reader can start from it or resync with it."""
+
+# Changes no larger than these are not reported; fields not listed report
+# any change. Units are the raw snapshot units.
+defaultDeadbands = {
+	'temperature': 1,
+	'fan_speed': 2,
+	'power_draw': 5000,
+	'gpu_util': 5,
+	'mem_util': 5,
+	'encoder_util': 5,
+	'decoder_util': 5,
+	'mem_used': 64 * 1024 * 1024,
+	'mem_free': 64 * 1024 * 1024,
+	'pcie_tx_kb_sec': 10240,
+	'pcie_rx_kb_sec': 10240,
+}
+
+
+class DeltaEncoder:
+	"""Turns a stream of Snapshots into change-only Deltas per device.
+
+	A field is reported when it moves more than its deadband away from the
+	value last reported, or when it starts or stops being supported. Every
+	keyframeInterval seconds of sample time (per device) a full keyframe is
+	sent. keyframeInterval=None sends keyframes only for a device's first
+	sample or after requestKeyframe()."""
+
+	def __init__(self, deadbands=defaultDeadbands, keyframeInterval=60.0):
+		self.deadbands = dict(deadbands)
+		self.keyframeInterval = keyframeInterval
+		self._last = {}
+		self._lastKeyframe = {}
+
+	def requestKeyframe(self, index=None):
+		"""Makes the next sample of a device (or of every device) a keyframe."""
+		if index is None:
+			self._last.clear()
+		else:
+			self._last.pop(index, None)
+
+	def encode(self, snapshot):
+		"""Returns the Delta for snapshot, or None if nothing changed enough."""
+		index = snapshot[0]
+		timestamp = snapshot[1]
+		fields = snapshot._fields
+		last = self._last.get(index)
+
+		if (last is None or last[0] != fields or (self.keyframeInterval is not None
+				and timestamp - self._lastKeyframe[index] >= self.keyframeInterval)):
+			values = list(snapshot[2:])
+			self._last[index] = (fields, values)
+			self._lastKeyframe[index] = timestamp
+			return Delta(index, timestamp, True, dict(zip(fields[2:], values)))
+
+		values = last[1]
+		deadbands = self.deadbands
+		changes = {}
+		for (i, value) in enumerate(snapshot[2:]):
+			previous = values[i]
+			if value == previous:
+				continue
+			if value is not None and previous is not None:
+				deadband = deadbands.get(fields[i + 2])
+				if deadband is not None and abs(value - previous) <= deadband:
+					continue
+			values[i] = value
+			changes[fields[i + 2]] = value
+		if not changes:
+			return None
+		return Delta(index, timestamp, False, changes)
+
+
+def deltas(snapshots, deadbands=defaultDeadbands, keyframeInterval=60.0):
+	"""Generator of Deltas for an iterable of Snapshots or Sweeps."""
+	encoder = DeltaEncoder(deadbands, keyframeInterval)
+	for item in snapshots:
+		for snapshot in getattr(item, 'samples', (item,)):
+			delta = encoder.encode(snapshot)
+			if delta is not None:
+				yield delta
+
+
+def pollDeltas(cards=None, interval=1.0, fields=defaultSnapshotFields,
+		deadbands=defaultDeadbands, keyframeInterval=60.0):
+	"""Endless generator polling cards every interval seconds, yielding only changes.
+
+	cards defaults to the default backend's registry, looked up once when
+	the stream starts."""
+	def sweeps():
+		polled = getRegistry().cards if cards is None else list(cards)
+		nextTick = time.monotonic()
+		while True:
+			yield pollAll(polled, fields)
+			nextTick += interval
+			delay = nextTick - time.monotonic()
+			if delay > 0:
+				time.sleep(delay)
+			else:
+				nextTick = time.monotonic()
+	return deltas(sweeps(), deadbands, keyframeInterval)
@@ -1,9 +1,10 @@
 from py3nvml.py3nvml import *
-from card import VideoCard, getVideoCards
+from card import VideoCard, getVideoCards, getBackend
+from session import getSession
 import datetime
 
 def mainWork():
-	print("\n{}: Driver Version: {}".format(datetime.date.today(), str(nvmlSystemGetDriverVersion())))
+	print("\n{}: Driver Version: {}".format(datetime.date.today(), str(getBackend().nvmlSystemGetDriverVersion())))
 	
 	vcs = getVideoCards()
 	for c in vcs:
@@ -22,12 +23,9 @@ def mainWork():
 		print(c.supportedClocks())
 
 def run():
-	# run function created to make organization easy
-	# and so as not to forget to init and shutdown nvml 
-	nvmlInit()
-	
-	mainWork()
-	
-	nvmlShutdown()
+	# run function created to make organization easy; the session
+	# initializes nvml once per process and shuts it down at exit
+	with getSession():
+		mainWork()
 
 run()
\ No newline at end of file
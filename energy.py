@@ -0,0 +1,126 @@
+from card import getVideoCards, NOT_SUPPORTED
+from fleet import pollAll
+from polling import PollingThread
+from functools import wraps
+import threading
+
+# how each card's energy is measured
+COUNTER = 'counter'
+INTEGRATED = 'integrated'
+
+
+class EnergyMeter(PollingThread):
+	"""Measures the energy each card uses between start() and stop(), in joules.
+
+	Cards with the driver's total energy counter are read twice, at start and
+	at stop (or whenever joules() is asked while running). Cards without it
+	have their power draw sampled every interval seconds on a background
+	thread and integrated with the trapezoidal rule; cards with neither
+	report None. methods maps card index to COUNTER, INTEGRATED or None.
+
+	Use it as a context manager around a block of work, or see metered()."""
+
+	threadName = 'nvml-energy'
+
+	def __init__(self, cards=None, interval=0.05):
+		PollingThread.__init__(self, interval)
+		self.cards = getVideoCards() if cards is None else list(cards)
+		self.methods = {}
+		for c in self.cards:
+			if c.supports('nvmlDeviceGetTotalEnergyConsumption'):
+				self.methods[c.index] = COUNTER
+			elif c.supports('nvmlDeviceGetPowerUsage'):
+				self.methods[c.index] = INTEGRATED
+			else:
+				self.methods[c.index] = None
+		self._counted = dict((c.index, c) for c in self.cards if self.methods[c.index] == COUNTER)
+		self._integrated = [c for c in self.cards if self.methods[c.index] == INTEGRATED]
+		self._lock = threading.Lock()
+		self._reset()
+
+	def _reset(self):
+		self.running = False
+		# counter cards: (reading at start, reading at stop or None)
+		self._counters = {}
+		# integrated cards: [millijoules so far, last timestamp, last power in mW]
+		self._integrals = {}
+
+	def start(self):
+		"""Starts metering, discarding any earlier measurement."""
+		self._reset()
+		for (index, c) in self._counted.items():
+			self._counters[index] = (self._counter(c), None)
+		for c in self._integrated:
+			self._integrals[c.index] = [0.0, None, None]
+		if self._integrated:
+			self.sample()
+			PollingThread.start(self)
+		self.running = True
+		return self
+
+	def stop(self):
+		"""Stops metering; joules() keeps returning the final figures."""
+		if not self.running:
+			return
+		if self._integrated:
+			PollingThread.stop(self)
+			self.sample()
+		for (index, c) in self._counted.items():
+			self._counters[index] = (self._counters[index][0], self._counter(c))
+		self.running = False
+
+	def _counter(self, card):
+		value = card.totalEnergyConsumption()
+		return None if value == NOT_SUPPORTED else value
+
+	def sample(self):
+		"""Reads the power of the integrated cards once and adds the last interval."""
+		sweep = pollAll(self._integrated, ('power_draw',))
+		with self._lock:
+			for s in sweep.samples:
+				if s.power_draw is None:
+					continue
+				integral = self._integrals[s.index]
+				if integral[1] is not None and s.timestamp > integral[1]:
+					integral[0] += (integral[2] + s.power_draw) / 2.0 * (s.timestamp - integral[1])
+				integral[1] = s.timestamp
+				integral[2] = s.power_draw
+		return sweep
+
+	def joules(self):
+		"""{card index: joules used so far}, None for cards that cannot be metered."""
+		result = dict((index, None) for index in self.methods)
+		for (index, (begin, end)) in self._counters.items():
+			if end is None and self.running:
+				end = self._counter(self._counted[index])
+			if begin is not None and end is not None:
+				result[index] = (end - begin) / 1000.0
+		with self._lock:
+			for (index, integral) in self._integrals.items():
+				result[index] = integral[0] / 1000.0
+		return result
+
+	def total(self):
+		"""Joules used by all metered cards together."""
+		return sum(j for j in self.joules().values() if j is not None)
+
+
+def metered(cards=None, interval=0.05, report=None):
+	"""Decorator metering the energy each call of a function uses.
+
+	After every call the wrapper's joules attribute holds the joules() dict
+	of that call, and report, if given, is called with the function name
+	and that dict."""
+	def decorate(fn):
+		@wraps(fn)
+		def wrapper(*args, **kwargs):
+			meter = EnergyMeter(cards, interval)
+			with meter:
+				result = fn(*args, **kwargs)
+			wrapper.joules = meter.joules()
+			if report is not None:
+				report(fn.__name__, wrapper.joules)
+			return result
+		wrapper.joules = None
+		return wrapper
+	return decorate
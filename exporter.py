@@ -0,0 +1,156 @@
+from card import getVideoCards, snapshotFields
+from fleet import pollAll
+from polling import PollingThread
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+contentType = 'text/plain; version=0.0.4; charset=utf-8'
+
+# snapshot field: (metric name, help text, scale from the NVML unit)
+exportedMetrics = {
+	'temperature':          ('nvml_temperature_celsius', 'GPU die temperature in degrees Celsius.', None),
+	'fan_speed':            ('nvml_fan_speed_percent', 'Fan speed as a percentage of maximum.', None),
+	'power_draw':           ('nvml_power_draw_watts', 'Power draw of the board in watts.', 0.001),
+	'gpu_util':             ('nvml_gpu_utilization_percent', 'Percent of time a kernel was executing.', None),
+	'mem_util':             ('nvml_memory_utilization_percent', 'Percent of time device memory was read or written.', None),
+	'encoder_util':         ('nvml_encoder_utilization_percent', 'Video encoder utilization.', None),
+	'decoder_util':         ('nvml_decoder_utilization_percent', 'Video decoder utilization.', None),
+	'gpu_clock':            ('nvml_graphics_clock_hertz', 'Current graphics clock.', 1000000),
+	'sm_clock':             ('nvml_sm_clock_hertz', 'Current SM clock.', 1000000),
+	'memory_clock':         ('nvml_memory_clock_hertz', 'Current memory clock.', 1000000),
+	'mem_total':            ('nvml_memory_total_bytes', 'Total device memory.', None),
+	'mem_used':             ('nvml_memory_used_bytes', 'Allocated device memory.', None),
+	'mem_free':             ('nvml_memory_free_bytes', 'Unallocated device memory.', None),
+	'performance_state':    ('nvml_performance_state', 'Performance state, 0 (P0, max) to 15 (P15, min).', None),
+	'power_limit':          ('nvml_power_limit_watts', 'Power management limit.', 0.001),
+	'enforced_power_limit': ('nvml_enforced_power_limit_watts', 'Power limit enforced by the driver.', 0.001),
+	'throttle_reasons':     ('nvml_clocks_throttle_reasons', 'Bitmask of current clocks throttle reasons.', None),
+	'compute_mode':         ('nvml_compute_mode', 'Compute mode (0 default, 1 exclusive thread, 2 prohibited, 3 exclusive process).', None),
+	'pcie_tx_kb_sec':       ('nvml_pcie_tx_bytes_per_second', 'PCIe transmit throughput.', 1024),
+	'pcie_rx_kb_sec':       ('nvml_pcie_rx_bytes_per_second', 'PCIe receive throughput.', 1024),
+}
+
+
+def _labelValue(value):
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Exporter(PollingThread):
+	"""Serves Prometheus text exposition rendered from the latest sweep.
+
+	The sampling thread polls the cards every interval seconds, whatever the
+	scrape rate. Each sample line is kept pre-rendered and only lines whose
+	value changed are formatted again. The joined body is then swapped in
+	as one bytes object, so a scrape just writes out the current body. Its
+	cost does not depend on how many scrapers there are, and scrapes never
+	reach NVML."""
+
+	threadName = 'nvml-exporter'
+
+	def __init__(self, cards=None, interval=5.0, fields=None):
+		PollingThread.__init__(self, interval)
+		self.cards = getVideoCards() if cards is None else list(cards)
+		if fields is None:
+			fields = [f for f in snapshotFields if not f.startswith('pcie_')]
+		self.fields = tuple(f for f in fields if f in exportedMetrics)
+		self.body = b''
+		self.server = None
+		self._serverThread = None
+
+		# one block per metric: HELP and TYPE lines then one line per card
+		self._lines = []
+		self._prefixes = []
+		self._values = []
+		for field in self.fields:
+			(name, text, scale) = exportedMetrics[field]
+			self._lines.append('# HELP {} {}\n# TYPE {} gauge\n'.format(name, text, name))
+			for c in self.cards:
+				labels = 'gpu="{}",uuid="{}",name="{}"'.format(c.index, _labelValue(c.uuid()), _labelValue(c.name))
+				self._prefixes.append(('{}{{{}}} '.format(name, labels), len(self._lines), scale))
+				self._lines.append('')
+				self._values.append(None)
+		self._lines.append('')
+
+	def sample(self):
+		sweep = pollAll(self.cards, self.fields)
+		lines = self._lines
+		values = self._values
+		prefixes = self._prefixes
+		i = 0
+		for column in range(2, len(self.fields) + 2):
+			for s in sweep.samples:
+				value = s[column]
+				if value != values[i]:
+					values[i] = value
+					(prefix, line, scale) = prefixes[i]
+					if value is None:
+						lines[line] = ''
+					elif scale is None:
+						lines[line] = '{}{}\n'.format(prefix, value)
+					else:
+						lines[line] = '{}{!r}\n'.format(prefix, value * scale)
+				i += 1
+		lines[-1] = ('# HELP nvml_exporter_sweep_duration_seconds Time taken by the last sweep.\n'
+			'# TYPE nvml_exporter_sweep_duration_seconds gauge\n'
+			'nvml_exporter_sweep_duration_seconds {!r}\n'
+			'# HELP nvml_exporter_last_sweep_timestamp_seconds Start of the last sweep.\n'
+			'# TYPE nvml_exporter_last_sweep_timestamp_seconds gauge\n'
+			'nvml_exporter_last_sweep_timestamp_seconds {!r}\n').format(sweep.duration, sweep.timestamp)
+		self.body = ''.join(lines).encode()
+		return sweep
+
+	def serve(self, port=9445, address=''):
+		"""Samples once, starts the sampling thread and serves /metrics on a daemon thread."""
+		if not self.body:
+			self.sample()
+		self.start()
+		exporter = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				if self.path.split('?')[0] != '/metrics':
+					self.send_error(404)
+					return
+				body = exporter.body
+				self.send_response(200)
+				self.send_header('Content-Type', contentType)
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, format, *args):
+				pass
+
+		self.server = ThreadingHTTPServer((address, port), Handler)
+		self.server.daemon_threads = True
+		self._serverThread = threading.Thread(target=self.server.serve_forever, name='nvml-exporter-http', daemon=True)
+		self._serverThread.start()
+		return self.server
+
+	def shutdown(self):
+		"""Stops serving and sampling."""
+		if self.server is not None:
+			self.server.shutdown()
+			self.server.server_close()
+			self.server = None
+		self.stop()
+
+
+if __name__ == '__main__':
+	import argparse
+	import time
+	from card import nvmlInit, nvmlShutdown
+	parser = argparse.ArgumentParser(description="Prometheus exporter for NVML metrics.")
+	parser.add_argument('--port', type=int, default=9445)
+	parser.add_argument('--interval', type=float, default=5.0, help="seconds between sweeps")
+	args = parser.parse_args()
+	nvmlInit()
+	exporter = Exporter(interval=args.interval)
+	exporter.serve(args.port)
+	try:
+		while True:
+			time.sleep(3600)
+	except KeyboardInterrupt:
+		pass
+	exporter.shutdown()
+	nvmlShutdown()
@@ -0,0 +1,56 @@
+from card import defaultSnapshotFields
+from registry import getRegistry
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+Sweep = namedtuple('Sweep', ('timestamp', 'duration', 'samples'))
+Sweep.__doc__ = """One pass over a set of cards.
+
+timestamp is when the sweep started, duration how long it took in seconds
+and samples holds one Snapshot per card, in the order the cards were given."""
+
+defaultWorkers = 16
+
+_executor = None
+_executorWorkers = 0
+_executorLock = threading.Lock()
+
+
+def _getExecutor(workers):
+	"""Returns the shared polling pool, growing it if more workers are needed.
+
+	A smaller pool being replaced is not shut down: another thread may be
+	about to map onto it. Its threads exit once the last sweep holding it
+	is done and it is garbage collected."""
+	global _executor, _executorWorkers
+	with _executorLock:
+		if _executor is None or _executorWorkers < workers:
+			_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nvml-poll')
+			_executorWorkers = workers
+		return _executor
+
+
+def pollAll(cards=None, fields=defaultSnapshotFields, workers=defaultWorkers):
+	"""Takes a snapshot of every card in parallel and returns them as one Sweep.
+
+	cards defaults to the default backend's registry, so every sweep reuses
+	the same cards with their handles and capabilities instead of looking
+	them up again. Each card is read on its own thread of a shared pool
+	bounded by workers, so a sweep takes about as long as the slowest device
+	rather than the sum of all of them; NVML calls release the GIL while
+	they wait on the driver."""
+	if cards is None:
+		cards = getRegistry().cards
+	if not isinstance(fields, tuple):
+		fields = tuple(fields)
+
+	start = time.time()
+	began = time.perf_counter()
+	if len(cards) < 2:
+		samples = [c.snapshot(fields) for c in cards]
+	else:
+		executor = _getExecutor(min(workers, len(cards)))
+		samples = list(executor.map(lambda c: c.snapshot(fields), cards))
+	return Sweep(start, time.perf_counter() - began, samples)
@@ -0,0 +1,114 @@
+from card import defaultSnapshotFields
+from fleet import pollAll
+from numpy.lib import recfunctions
+import numpy as np
+import warnings
+
+# Snapshot fields that keep an exact integer column; every other metric is
+# float64 with NaN for devices that do not support it.
+integerFields = {
+	'throttle_reasons': (np.uint64, 0),
+}
+
+
+def fleetDtype(fields):
+	"""Structured dtype for one row per device: index, timestamp, then fields."""
+	return np.dtype([('index', np.int32), ('timestamp', np.float64)] +
+		[(f, integerFields[f][0] if f in integerFields else np.float64) for f in fields])
+
+
+class FleetSnapshot:
+	"""One sweep of many devices as a NumPy structured array.
+
+	data has one row per device and one column per metric. snap['power_draw']
+	is a column; snap[mask] (a boolean array or field comparison) is a
+	filtered FleetSnapshot. Aggregates skip NaN, i.e. unsupported devices.
+	stack() turns many sweeps into a time x device x metric array."""
+
+	__slots__ = ('data', 'fields')
+
+	def __init__(self, data):
+		self.data = data
+		self.fields = data.dtype.names[2:]
+
+	@classmethod
+	def fromSweep(cls, sweep, fields=None):
+		"""Builds a FleetSnapshot from a fleet.Sweep (or any list of Snapshots)."""
+		samples = getattr(sweep, 'samples', sweep)
+		if fields is None:
+			fields = samples[0]._fields[2:] if samples else defaultSnapshotFields
+		fields = tuple(fields)
+		fills = [integerFields[f][1] if f in integerFields else np.nan for f in fields]
+		rows = [
+			(s[0], s[1]) + tuple(fill if v is None else v for (v, fill) in zip(s[2:], fills))
+			for s in samples
+		]
+		return cls(np.array(rows, dtype=fleetDtype(fields)))
+
+	@classmethod
+	def capture(cls, cards=None, fields=defaultSnapshotFields):
+		"""Polls cards (default the registry's) with pollAll() into a FleetSnapshot."""
+		fields = tuple(fields)
+		return cls.fromSweep(pollAll(cards, fields), fields)
+
+	def __len__(self):
+		return len(self.data)
+
+	def __getitem__(self, key):
+		if isinstance(key, str):
+			return self.data[key]
+		return FleetSnapshot(np.atleast_1d(self.data[key]))
+
+	def __repr__(self):
+		return 'FleetSnapshot({} devices, fields={})'.format(len(self.data), self.fields)
+
+	def where(self, mask):
+		return FleetSnapshot(self.data[mask])
+
+	def _reduce(self, reducer, field):
+		column = self.data[field]
+		if not len(column):
+			return np.nan
+		with warnings.catch_warnings():
+			warnings.simplefilter('ignore', RuntimeWarning)
+			return reducer(column).item()
+
+	def sum(self, field):
+		return self._reduce(np.nansum, field)
+
+	def min(self, field):
+		return self._reduce(np.nanmin, field)
+
+	def max(self, field):
+		return self._reduce(np.nanmax, field)
+
+	def mean(self, field):
+		return self._reduce(np.nanmean, field)
+
+	def array(self, fields=None):
+		"""Returns the metric columns as a devices x metrics float64 array (a copy)."""
+		return recfunctions.structured_to_unstructured(self.data[list(fields or self.fields)], dtype=np.float64)
+
+	@staticmethod
+	def stackRecords(snapshots):
+		"""Stacks sweeps of the same devices into a time x device structured array."""
+		dtype = snapshots[0].data.dtype
+		if all(s.data.dtype == dtype for s in snapshots):
+			# joining the raw row bytes is far cheaper than np.stack on many
+			# small structured arrays
+			joined = bytearray().join([s.data.tobytes() for s in snapshots])
+			return np.frombuffer(joined, dtype).reshape(len(snapshots), -1)
+		return np.stack([s.data for s in snapshots])
+
+	@staticmethod
+	def stack(snapshots, fields=None):
+		"""Stacks sweeps into a time x device x metric float64 array.
+
+		Done as one copy of the records and one structured-to-float
+		conversion. Returns (timestamps, array), where timestamps is time x
+		device. Integer columns are converted to float64, and bitmasks with
+		bits above 2**53 lose precision; use stackRecords() to keep them exact."""
+		records = FleetSnapshot.stackRecords(snapshots)
+		fields = list(fields or snapshots[0].fields)
+		values = recfunctions.structured_to_unstructured(records[fields], dtype=np.float64)
+		return records['timestamp'], values
@@ -0,0 +1,278 @@
+from backend import Backend, getBackend, setBackend, py3nvml
+from polling import PollingThread
+import ctypes
+import sys
+import threading
+import time
+
+# latency histogram: 4 buckets per power of two of nanoseconds, so a bucket
+# is at most 25% wide; the last bucket also takes anything slower
+bucketCount = 160
+
+
+def _bucket(ns):
+	bits = ns.bit_length()
+	if bits <= 3:
+		return ns
+	return min(4 * (bits - 3) + (ns >> (bits - 3)), bucketCount - 1)
+
+
+def bucketBounds(k):
+	"""(lowest, highest + 1) nanoseconds counted in histogram bucket k."""
+	if k < 8:
+		return (k, k + 1)
+	shift = k // 4 - 1
+	m = k % 4 + 4
+	return (m << shift, (m + 1) << shift)
+
+
+def _handleKey(handle):
+	"""A hashable key for a device handle.
+
+	py3nvml hands out ctypes pointers, which cannot be hashed and compare by
+	identity anyway, so they are keyed by the address they point to."""
+	if isinstance(handle, ctypes._Pointer):
+		return ctypes.cast(handle, ctypes.c_void_p).value
+	return handle
+
+
+class CallStats:
+	"""Counts, errors and the latency histogram of one NVML function on one device.
+
+	errors maps the NVML_ERROR_* code (or, for other exceptions, the
+	exception class name) to how many calls failed with it; failed calls
+	are counted in calls and timed like any other."""
+
+	__slots__ = ('calls', 'errors', 'totalNs', 'maxNs', 'buckets')
+
+	def __init__(self):
+		self.calls = 0
+		self.errors = {}
+		self.totalNs = 0
+		self.maxNs = 0
+		self.buckets = [0] * bucketCount
+
+	def __repr__(self):
+		return 'CallStats({} calls, {} errors, p50 {:.1f} us, p99 {:.1f} us, max {:.1f} us)'.format(
+			self.calls, self.errorCount, self.percentile(0.5), self.percentile(0.99), self.maxNs / 1000.0)
+
+	def copy(self):
+		other = CallStats()
+		other.merge(self)
+		return other
+
+	def merge(self, other):
+		"""Adds another CallStats' counts to this one."""
+		self.calls += other.calls
+		for (code, count) in other.errors.items():
+			self.errors[code] = self.errors.get(code, 0) + count
+		self.totalNs += other.totalNs
+		self.maxNs = max(self.maxNs, other.maxNs)
+		self.buckets = [a + b for (a, b) in zip(self.buckets, other.buckets)]
+		return self
+
+	@property
+	def errorCount(self):
+		return sum(self.errors.values())
+
+	def mean(self):
+		"""Mean latency in microseconds."""
+		return self.totalNs / self.calls / 1000.0 if self.calls else 0.0
+
+	def percentile(self, q):
+		"""Latency in microseconds that a fraction q of calls did not exceed.
+
+		Read from the histogram, so it is the upper edge of a bucket and
+		overestimates by at most 25%; never more than the slowest call."""
+		if not self.calls:
+			return 0.0
+		rank = q * self.calls
+		seen = 0
+		for (k, count) in enumerate(self.buckets):
+			seen += count
+			if seen >= rank and count:
+				return min(bucketBounds(k)[1], self.maxNs) / 1000.0
+		return self.maxNs / 1000.0
+
+	def histogram(self):
+		"""[(lowest us, highest us, calls)] of the non-empty buckets, fastest first."""
+		return [
+			(bucketBounds(k)[0] / 1000.0, bucketBounds(k)[1] / 1000.0, count)
+			for (k, count) in enumerate(self.buckets) if count
+		]
+
+
+class InstrumentedBackend(Backend):
+	"""Wraps another backend and times every nvml* call made through it.
+
+	Statistics are kept per (function name, device index); calls that take
+	no device handle, such as nvmlInit, are filed under device None. Handles
+	are matched to indexes as nvmlDeviceGetHandleByIndex hands them out, so
+	cards must be created through this backend (see instrument()); fetching
+	an index's handle again replaces the one it had before.
+
+	Setting enabled to False makes every wrapper call straight through
+	after one flag check, so a disabled instrument costs next to nothing
+	per call and can be left installed. The wrappers are handed out
+	whatever the flag, so functions held while disabled (such as in a
+	card's snapshot plan) are timed again once it is re-enabled. The
+	statistics gathered so far are kept."""
+
+	def __init__(self, inner=None, enabled=True):
+		self.__dict__['inner'] = inner or getBackend()
+		self._stats = {}
+		self._devices = {}
+		self._handles = {}
+		self._lock = threading.Lock()
+		self._enabled = enabled
+		self.since = time.time()
+
+	def __getattr__(self, name):
+		fn = getattr(self.inner, name)
+		if not name.startswith('nvml'):
+			return fn
+		fn = self._wrap(name, fn)
+		# later lookups find the function directly on the instance
+		self.__dict__[name] = fn
+		return fn
+
+	def __repr__(self):
+		return 'InstrumentedBackend({!r}, enabled={})'.format(self.inner, self._enabled)
+
+	@property
+	def enabled(self):
+		return self._enabled
+
+	@enabled.setter
+	def enabled(self, enabled):
+		self._enabled = enabled
+
+	def _wrap(self, name, fn):
+		clock = time.perf_counter_ns
+		record = self._record
+		devices = self._devices
+		byIndex = name == 'nvmlDeviceGetHandleByIndex'
+
+		def instrumented(*args):
+			if not self._enabled:
+				return fn(*args)
+			device = args[0] if byIndex else devices.get(_handleKey(args[0])) if args else None
+			start = clock()
+			try:
+				result = fn(*args)
+			except py3nvml.NVMLError as err:
+				record(name, device, clock() - start, err.value)
+				raise
+			except Exception as err:
+				record(name, device, clock() - start, type(err).__name__)
+				raise
+			record(name, device, clock() - start, None)
+			if byIndex:
+				self._addHandle(device, result)
+			return result
+
+		instrumented.__name__ = name
+		instrumented.__wrapped__ = fn
+		return instrumented
+
+	def _addHandle(self, index, handle):
+		key = _handleKey(handle)
+		with self._lock:
+			old = self._handles.get(index)
+			if old is not None and old != key and self._devices.get(old) == index:
+				del self._devices[old]
+			self._handles[index] = key
+			self._devices[key] = index
+
+	def _record(self, name, device, elapsed, error):
+		bucket = _bucket(elapsed)
+		with self._lock:
+			stats = self._stats.get((name, device))
+			if stats is None:
+				stats = self._stats[(name, device)] = CallStats()
+			stats.calls += 1
+			stats.totalNs += elapsed
+			if elapsed > stats.maxNs:
+				stats.maxNs = elapsed
+			stats.buckets[bucket] += 1
+			if error is not None:
+				stats.errors[error] = stats.errors.get(error, 0) + 1
+
+	def table(self):
+		"""{(function, device index): CallStats} of everything recorded (copies)."""
+		with self._lock:
+			return dict((key, stats.copy()) for (key, stats) in self._stats.items())
+
+	def stats(self, function=None, device=None):
+		"""One CallStats merging every entry that matches function and device.
+
+		None matches anything, so stats() covers all calls and
+		stats(device=0) all calls on device 0."""
+		merged = CallStats()
+		with self._lock:
+			for ((name, index), stats) in self._stats.items():
+				if (function is None or name == function) and (device is None or index == device):
+					merged.merge(stats)
+		return merged
+
+	def slowest(self, count=10, q=0.99):
+		"""The count (function, device, CallStats) entries with the highest q latency."""
+		entries = [(name, device, stats) for ((name, device), stats) in self.table().items()]
+		entries.sort(key=lambda entry: entry[2].percentile(q), reverse=True)
+		return entries[:count]
+
+	def reset(self):
+		"""Drops everything recorded so far."""
+		with self._lock:
+			self._stats = {}
+			self.since = time.time()
+
+	def report(self):
+		"""A plain text table of every entry, slowest p99 first."""
+		lines = ["NVML calls since {}".format(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.since)))]
+		lines.append("{:<44} {:>6} {:>10} {:>8} {:>10} {:>10} {:>10}".format(
+			'function', 'device', 'calls', 'errors', 'p50 us', 'p99 us', 'max us'))
+		for (name, device, stats) in self.slowest(None):
+			lines.append("{:<44} {:>6} {:>10} {:>8} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+				name, '-' if device is None else device, stats.calls, stats.errorCount,
+				stats.percentile(0.5), stats.percentile(0.99), stats.maxNs / 1000.0))
+		return "\n".join(lines) + "\n"
+
+
+def instrument(enabled=True):
+	"""Wraps the default backend in an InstrumentedBackend and makes that the default.
+
+	Cards created afterwards are instrumented; existing VideoCards keep the
+	backend they were created with. Calling it again returns the installed
+	instrument, switched to enabled."""
+	backend = getBackend()
+	if not isinstance(backend, InstrumentedBackend):
+		backend = InstrumentedBackend(backend, enabled)
+		setBackend(backend)
+	backend.enabled = enabled
+	return backend
+
+
+class StatsDumper(PollingThread):
+	"""Writes an InstrumentedBackend's report() every interval seconds.
+
+	write receives the report text (default: sys.stderr.write). With
+	reset=True each dump covers only the calls since the previous one."""
+
+	threadName = 'nvml-stats-dump'
+
+	def __init__(self, backend, interval=60.0, write=None, reset=False):
+		PollingThread.__init__(self, interval)
+		self.backend = backend
+		self.write = write or sys.stderr.write
+		self.reset = reset
+		self._first = True
+
+	def sample(self):
+		# PollingThread samples once on start; there is nothing to report yet
+		if self._first:
+			self._first = False
+			return
+		self.write(self.backend.report())
+		if self.reset:
+			self.backend.reset()
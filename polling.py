@@ -0,0 +1,59 @@
+from abc import ABC, abstractmethod
+import threading
+import time
+
+
+class PollingThread(ABC):
+	"""Runs sample() every interval seconds on a daemon thread.
+
+	Ticks are laid on a fixed grid, so a slow sample does not push later ones
+	back and missed ticks are skipped. An exception from sample() is counted
+	in errors and kept in lastError, and the thread keeps going. Subclasses
+	implement sample(); this module needs nothing but the standard library,
+	so they do not pull in NumPy through it."""
+
+	threadName = 'nvml-poll'
+
+	def __init__(self, interval=1.0):
+		self.interval = interval
+		self.errors = 0
+		self.lastError = None
+		self._stop = threading.Event()
+		self._thread = None
+
+	@abstractmethod
+	def sample(self):
+		"""Takes one sample; called on the polling thread every interval seconds."""
+
+	def start(self):
+		if self._thread is None:
+			self._stop.clear()
+			self._thread = threading.Thread(target=self._run, name=self.threadName, daemon=True)
+			self._thread.start()
+		return self
+
+	def stop(self):
+		self._stop.set()
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+	def _run(self):
+		nextTick = time.monotonic()
+		while not self._stop.is_set():
+			try:
+				self.sample()
+			except Exception as err:
+				self.errors += 1
+				self.lastError = err
+			nextTick += self.interval
+			now = time.monotonic()
+			if nextTick < now:
+				nextTick += ((now - nextTick) // self.interval + 1) * self.interval
+			self._stop.wait(nextTick - now)
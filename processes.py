@@ -0,0 +1,122 @@
+from card import getVideoCards, NOT_SUPPORTED
+from collections import deque
+import threading
+import time
+
+
+class ProcessUsage:
+	"""What one process is using across every card it runs on.
+
+	memory maps card index to used bytes (None where the driver cannot tell)
+	and stats maps card index to the accountingStats() dict, when accounting
+	mode is enabled. firstSeen and exited are time.time() seconds; exited is
+	None while the process still runs."""
+
+	__slots__ = ('pid', 'memory', 'types', 'stats', 'firstSeen', 'exited')
+
+	def __init__(self, pid, firstSeen):
+		self.pid = pid
+		self.memory = {}
+		self.types = {}
+		self.stats = {}
+		self.firstSeen = firstSeen
+		self.exited = None
+
+	@property
+	def usedMemory(self):
+		"""Bytes used on all cards together."""
+		return sum(m for m in self.memory.values() if m is not None)
+
+	@property
+	def devices(self):
+		return sorted(self.memory)
+
+	def __repr__(self):
+		return 'ProcessUsage(pid={}, memory={}, exited={})'.format(self.pid, self.memory, self.exited)
+
+
+class ProcessTracker:
+	"""PID-indexed view of GPU processes on many cards, updated incrementally.
+
+	Each poll() reads runningProcesses() on every card and compares it with
+	the previous result for that card, so only processes that started,
+	exited or changed memory touch the index. Processes that left every
+	card move to exited, which keeps the last maxExited of them along with
+	their final accounting stats. With accounting=True, cards in accounting
+	mode also have each running process's accountingStats() refreshed."""
+
+	def __init__(self, cards=None, accounting=True, maxExited=1024):
+		self.cards = getVideoCards() if cards is None else list(cards)
+		self.accounting = accounting
+		self.processes = {}
+		self.exited = deque(maxlen=maxExited)
+		self.polls = 0
+		# card index: {pid: (used memory, type)} as of the last poll
+		self._seen = dict((c.index, {}) for c in self.cards)
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.processes)
+
+	def __contains__(self, pid):
+		return pid in self.processes
+
+	def __getitem__(self, pid):
+		return self.processes[pid]
+
+	def get(self, pid):
+		return self.processes.get(pid)
+
+	def onDevice(self, index):
+		"""PIDs running on one card as of the last poll."""
+		return list(self._seen[index])
+
+	def poll(self):
+		"""Reads every card once; returns (started, exited) lists of ProcessUsage."""
+		now = time.time()
+		started = []
+		exited = []
+		with self._lock:
+			for card in self.cards:
+				found = card.runningProcesses()
+				if found == NOT_SUPPORTED:
+					continue
+				current = dict((pid, (p['used_memory'], p['type'])) for (pid, p) in found.items())
+				seen = self._seen[card.index]
+				index = card.index
+				accounting = self.accounting and card.accountingMode() == 'enabled'
+
+				for (pid, entry) in current.items():
+					if seen.get(pid) == entry:
+						continue
+					usage = self.processes.get(pid)
+					if usage is None:
+						usage = self.processes[pid] = ProcessUsage(pid, now)
+						started.append(usage)
+					(usage.memory[index], usage.types[index]) = entry
+
+				for pid in seen:
+					if pid not in current:
+						usage = self.processes[pid]
+						del usage.memory[index]
+						del usage.types[index]
+						if accounting:
+							self._readStats(card, usage)
+						if not usage.memory:
+							usage.exited = now
+							del self.processes[pid]
+							self.exited.append(usage)
+							exited.append(usage)
+
+				if accounting:
+					for pid in current:
+						self._readStats(card, self.processes[pid])
+
+				self._seen[index] = current
+			self.polls += 1
+		return started, exited
+
+	def _readStats(self, card, usage):
+		stats = card.accountingStats(usage.pid)
+		if stats is not None and stats != NOT_SUPPORTED:
+			usage.stats[card.index] = stats
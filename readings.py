@@ -0,0 +1,89 @@
+class LazyReading(dict):
+	"""A dict of raw NVML values whose display strings are built on first read.
+
+	Returned by VideoCard methods in raw mode. Only the native numbers are
+	stored up front; looking up one of the keys in `formats` formats it once
+	and stores the result. Iterating or printing shows only what has been
+	stored so far."""
+	__slots__ = ()
+	formats = {}
+
+	def __missing__(self, key):
+		try:
+			fmt = self.formats[key]
+		except KeyError:
+			raise KeyError(key)
+		value = self[key] = fmt(self)
+		return value
+
+	def get(self, key, default=None):
+		try:
+			return self[key]
+		except KeyError:
+			return default
+
+
+def _mib(value):
+	return str(value / 1024 / 1024) + ' MiB'
+
+
+def _watts(value):
+	return '%.2f W' % (value / 1000.0)
+
+
+def _percent(value):
+	return str(value) + '%'
+
+
+class ClockReading(LazyReading):
+	__slots__ = ()
+	formats = {
+		'rate_str': lambda r: str(r['rate']) + ' MHz',
+	}
+
+
+class PowerUsageReading(LazyReading):
+	__slots__ = ()
+	formats = {
+		'usage': lambda r: _watts(r['draw']),
+	}
+
+
+class PowerLimitReading(LazyReading):
+	__slots__ = ()
+	formats = {
+		'limit_str': lambda r: _watts(r['limit']),
+	}
+
+
+class PowerStateReading(LazyReading):
+	__slots__ = ()
+	formats = {
+		'state_str': lambda r: 'P' + str(r['state']),
+	}
+
+
+class PowerModeReading(LazyReading):
+	__slots__ = ()
+	formats = {
+		'mode_str': lambda r: 'Supported' if r['mode'] != 0 else 'N/A',
+	}
+
+
+class MemoryReading(LazyReading):
+	__slots__ = ()
+	formats = {
+		'total': lambda r: _mib(r['memory']['total']),
+		'used': lambda r: _mib(r['memory']['used']),
+		'free': lambda r: _mib(r['memory']['free']),
+	}
+
+
+class UtilizationReading(LazyReading):
+	__slots__ = ()
+	formats = {
+		'gpu_util': lambda r: _percent(r['gpu']),
+		'mem_util': lambda r: _percent(r['memory']),
+		'encoder_util': lambda r: _percent(r['encoder']),
+		'decoder_util': lambda r: _percent(r['decoder']),
+	}
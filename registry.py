@@ -0,0 +1,101 @@
+from card import VideoCard, initGeneration, handleError
+from backend import getBackend, py3nvml
+import threading
+
+
+def normalizeBusId(busId):
+	"""Returns (domain, bus, device, function) for any PCI bus ID spelling.
+
+	Accepts bytes or str, 4- or 8-digit domains and any letter case, so
+	'0000:3B:00.0', b'00000000:3b:00.0' and '3b:00.0' all match."""
+	if isinstance(busId, bytes):
+		busId = busId.decode()
+	parts = busId.strip().split(':')
+	if len(parts) == 2:
+		parts.insert(0, '0')
+	(device, function) = parts[2].split('.')
+	return (int(parts[0], 16), int(parts[1], 16), int(device, 16), int(function, 16))
+
+
+class DeviceRegistry:
+	"""Long-lived VideoCard objects indexed by index, UUID, PCI bus ID and minor number.
+
+	Cards are built once and looked up in constant time. sync() checks the
+	device count and rebuilds only if it changed or NVML was re-initialized
+	since the last build. Lookups return None for unknown keys."""
+
+	def __init__(self, backend=None):
+		self.backend = backend or getBackend()
+		# (cards, by UUID, by bus ID, by minor) replaced as one object on rebuild
+		self._indexes = ([], {}, {}, {})
+		self._generation = None
+		self._lock = threading.Lock()
+
+	@property
+	def cards(self):
+		return self._indexes[0]
+
+	def __len__(self):
+		return len(self.cards)
+
+	def __iter__(self):
+		return iter(self.cards)
+
+	def sync(self):
+		"""Rebuilds the registry if the device count or NVML session changed."""
+		with self._lock:
+			try:
+				count = self.backend.nvmlDeviceGetCount()
+			except py3nvml.NVMLError as err:
+				handleError(err)
+				return self
+			if count != len(self.cards) or self._generation != initGeneration():
+				self._build(count)
+		return self
+
+	def _build(self, count):
+		cards = [VideoCard(i, backend=self.backend) for i in range(count)]
+		byUuid = {}
+		byBusId = {}
+		byMinor = {}
+		for c in cards:
+			byUuid[c.uuid()] = c
+			byBusId[normalizeBusId(c.busId)] = c
+			minor = c.minorNumber()
+			if isinstance(minor, int):
+				byMinor[minor] = c
+		self._indexes = (cards, byUuid, byBusId, byMinor)
+		self._generation = initGeneration()
+
+	def byIndex(self, index):
+		cards = self.cards
+		return cards[index] if 0 <= index < len(cards) else None
+
+	def byUuid(self, uuid):
+		return self._indexes[1].get(uuid)
+
+	def byBusId(self, busId):
+		try:
+			return self._indexes[2].get(normalizeBusId(busId))
+		except (ValueError, IndexError):
+			return None
+
+	def byMinor(self, minor):
+		return self._indexes[3].get(minor)
+
+
+_registries = {}
+_registriesLock = threading.Lock()
+
+
+def getRegistry(backend=None):
+	"""Returns the process-wide registry for a backend, synced with the current devices.
+
+	Costs one nvmlDeviceGetCount() call. Hold on to the registry and look
+	cards up directly to skip even that."""
+	backend = backend or getBackend()
+	with _registriesLock:
+		registry = _registries.get(backend)
+		if registry is None:
+			registry = _registries[backend] = DeviceRegistry(backend)
+	return registry.sync()
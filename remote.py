@@ -0,0 +1,451 @@
+from card import defaultSnapshotFields, getVideoCards
+from delta import DeltaEncoder, defaultDeadbands
+from fleet import pollAll
+from fleetsnapshot import FleetSnapshot, fleetDtype, integerFields
+from polling import PollingThread
+from collections import namedtuple
+import json
+import numpy as np
+import os
+import select
+import socket
+import socketserver
+import struct
+import threading
+
+# Wire format, all little-endian. Every frame is a 4-byte payload length and
+# a 1-byte frame type, then the payload. An agent opens a connection with a
+# HELLO frame (JSON: version, host, fields, device indexes) and then sends
+# BATCH frames:
+#
+#   batch:  sweep count (H), then per sweep
+#   sweep:  start (d), duration (f), entry count (H), then per changed device
+#   entry:  index (H), keyframe (B), timestamp - start (f), changed mask,
+#           null mask, then one Q per changed field that is not null
+#
+# Bit i of a mask is field i of the HELLO; masks are I for up to 32 fields
+# and Q for up to 64. Devices with no entry kept all their values.
+protocolVersion = 1
+defaultPort = 9446
+frameHeader = struct.Struct('<IB')
+HELLO = 1
+BATCH = 2
+batchHeader = struct.Struct('<H')
+sweepHeader = struct.Struct('<dfH')
+# a frame longer than this is taken as a corrupt stream
+maxFrameSize = 16 * 1024 * 1024
+
+Batch = namedtuple('Batch', ('host', 'sweeps', 'records'))
+Batch.__doc__ = """The sweeps of one BATCH frame, decoded.
+
+sweeps is a (sweep count, 2) float64 array of each sweep's start and
+duration. records is a (sweep count, device count) fleetDtype array holding
+every device's values after each sweep, devices in HELLO order."""
+
+
+def entryStruct(fieldCount):
+	"""The struct of an entry header for a batch of fieldCount fields."""
+	if fieldCount > 64:
+		raise ValueError("at most 64 fields fit in a frame's change masks")
+	mask = 'I' if fieldCount <= 32 else 'Q'
+	return struct.Struct('<HBf' + mask + mask)
+
+
+_valueStructs = {}
+
+def _values(count):
+	try:
+		return _valueStructs[count]
+	except KeyError:
+		value = _valueStructs[count] = struct.Struct('<{}Q'.format(count))
+		return value
+
+
+def helloFrame(host, fields, devices):
+	"""The HELLO frame announcing an agent, its fields and its device indexes."""
+	payload = json.dumps({
+		'version': protocolVersion,
+		'host': host,
+		'fields': list(fields),
+		'devices': list(devices),
+	}).encode()
+	return frameHeader.pack(len(payload), HELLO) + payload
+
+
+class BatchEncoder:
+	"""Packs Sweeps into BATCH frames holding only what changed on each device.
+
+	Changes are found by a delta.DeltaEncoder, so deadbands and
+	keyframeInterval mean the same as there; call deltas.requestKeyframe()
+	when the receiver may have lost state, e.g. after a reconnect."""
+
+	def __init__(self, fields=defaultSnapshotFields, deadbands=defaultDeadbands, keyframeInterval=60.0):
+		self.fields = tuple(fields)
+		self.deltas = DeltaEncoder(deadbands, keyframeInterval)
+		self._entry = entryStruct(len(self.fields))
+		self._bits = dict((f, 1 << i) for (i, f) in enumerate(self.fields))
+		self._parts = []
+		self.sweeps = 0
+
+	def add(self, sweep):
+		"""Appends one fleet.Sweep (taken with this encoder's fields) to the batch."""
+		encode = self.deltas.encode
+		bits = self._bits
+		pack = self._entry.pack
+		start = sweep.timestamp
+		entries = []
+		count = 0
+		for snapshot in sweep.samples:
+			delta = encode(snapshot)
+			if delta is None:
+				continue
+			changed = nulls = 0
+			values = []
+			# changes come in field order, which is the order of the bits
+			for (field, value) in delta.changes.items():
+				bit = bits[field]
+				changed |= bit
+				if value is None:
+					nulls |= bit
+				else:
+					values.append(value)
+			entries.append(pack(delta.index, delta.keyframe, delta.timestamp - start, changed, nulls))
+			if values:
+				entries.append(_values(len(values)).pack(*values))
+			count += 1
+		self._parts.append(sweepHeader.pack(start, sweep.duration, count))
+		self._parts.extend(entries)
+		self.sweeps += 1
+
+	def frame(self):
+		"""Returns the pending sweeps as one BATCH frame, or None if there are none."""
+		if not self.sweeps:
+			return None
+		payload = batchHeader.pack(self.sweeps) + b''.join(self._parts)
+		self._parts = []
+		self.sweeps = 0
+		return frameHeader.pack(len(payload), BATCH) + payload
+
+
+class BatchDecoder:
+	"""Applies one agent's BATCH frames to its devices' last known values.
+
+	Fields that are not supported hold NaN (or the integerFields fill),
+	and devices not yet heard from hold them everywhere."""
+
+	def __init__(self, host, fields, devices):
+		self.host = host
+		self.fields = tuple(fields)
+		self.devices = list(devices)
+		self.dtype = fleetDtype(self.fields)
+		self.slots = dict((index, slot) for (slot, index) in enumerate(self.devices))
+		self._fills = [integerFields[f][1] if f in integerFields else np.nan for f in self.fields]
+		self._entry = entryStruct(len(self.fields))
+		self.state = [[index, np.nan] + self._fills for index in self.devices]
+
+	def decode(self, payload):
+		"""Decodes a BATCH payload (the frame without its header) into a Batch."""
+		entry = self._entry
+		entrySize = entry.size
+		fills = self._fills
+		slots = self.slots
+		state = self.state
+		(count,) = batchHeader.unpack_from(payload, 0)
+		position = batchHeader.size
+		sweeps = np.empty((count, 2))
+		rows = []
+		for s in range(count):
+			(start, duration, entries) = sweepHeader.unpack_from(payload, position)
+			position += sweepHeader.size
+			sweeps[s] = (start, duration)
+			for row in state:
+				row[1] = start
+			for e in range(entries):
+				(index, keyframe, offset, changed, nulls) = entry.unpack_from(payload, position)
+				position += entrySize
+				try:
+					row = state[slots[index]]
+				except KeyError:
+					raise ValueError("batch entry for device {}, which was not announced".format(index))
+				row[1] = start + offset
+				present = changed & ~nulls
+				if present:
+					values = _values(bin(present).count('1'))
+					valueIter = iter(values.unpack_from(payload, position))
+					position += values.size
+				while changed:
+					low = changed & -changed
+					i = low.bit_length() + 1
+					row[i] = fills[i - 2] if nulls & low else next(valueIter)
+					changed ^= low
+			rows.extend(tuple(row) for row in state)
+		records = np.array(rows, self.dtype).reshape(count, len(state))
+		return Batch(self.host, sweeps, records)
+
+
+class Agent(PollingThread):
+	"""Sweeps the local cards and streams them to a Collector in BATCH frames.
+
+	Every interval seconds the cards are swept with pollAll(); after
+	batchSweeps sweeps the batch goes out over one persistent connection to
+	address, a (host, port) pair for TCP or a path for a Unix socket. If
+	sending fails, or the collector has hung up since the last batch, the
+	batch is dropped (and counted in droppedSweeps), and the next flush
+	reconnects and starts from a keyframe. close() sends what is pending
+	and disconnects."""
+
+	threadName = 'nvml-agent'
+
+	def __init__(self, address, cards=None, interval=1.0, batchSweeps=10, fields=defaultSnapshotFields,
+			deadbands=defaultDeadbands, keyframeInterval=60.0, host=None, timeout=10.0):
+		PollingThread.__init__(self, interval)
+		self.address = address
+		self.cards = getVideoCards() if cards is None else list(cards)
+		self.batchSweeps = batchSweeps
+		self.fields = tuple(fields)
+		self.host = host or socket.gethostname()
+		self.timeout = timeout
+		self.encoder = BatchEncoder(self.fields, deadbands, keyframeInterval)
+		self.framesSent = 0
+		self.bytesSent = 0
+		self.droppedSweeps = 0
+		self._socket = None
+		self._lock = threading.Lock()
+
+	def sample(self):
+		sweep = pollAll(self.cards, self.fields)
+		self.add(sweep)
+		return sweep
+
+	def add(self, sweep):
+		"""Queues a sweep taken with this agent's fields, flushing once batchSweeps are pending."""
+		with self._lock:
+			self.encoder.add(sweep)
+			full = self.encoder.sweeps >= self.batchSweeps
+		if full:
+			self.flush()
+
+	def flush(self):
+		"""Sends the pending sweeps now. Raises OSError if that fails."""
+		with self._lock:
+			sweeps = self.encoder.sweeps
+			frame = self.encoder.frame()
+			if frame is None:
+				return
+			try:
+				if self._socket is not None and self._hungUp():
+					# batches sent since then are lost, and this one builds on them
+					raise ConnectionResetError("collector closed the connection")
+				if self._socket is None:
+					self._connect()
+				self._socket.sendall(frame)
+			except OSError:
+				self._disconnect()
+				self.encoder.deltas.requestKeyframe()
+				self.droppedSweeps += sweeps
+				raise
+			self.framesSent += 1
+			self.bytesSent += len(frame)
+
+	def _connect(self):
+		if isinstance(self.address, str):
+			sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			sock.settimeout(self.timeout)
+			try:
+				sock.connect(self.address)
+			except OSError:
+				sock.close()
+				raise
+		else:
+			sock = socket.create_connection(self.address, self.timeout)
+			sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		self._socket = sock
+		hello = helloFrame(self.host, self.fields, [c.index for c in self.cards])
+		sock.sendall(hello)
+		self.bytesSent += len(hello)
+
+	def _hungUp(self):
+		# the collector never writes, so a readable socket means EOF or an error
+		(readable, writable, failed) = select.select([self._socket], [], [], 0)
+		return bool(readable)
+
+	def _disconnect(self):
+		if self._socket is not None:
+			self._socket.close()
+			self._socket = None
+
+	def close(self):
+		self.stop()
+		try:
+			self.flush()
+		except OSError:
+			pass
+		with self._lock:
+			self._disconnect()
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+class Collector:
+	"""Receives agents' frames and decodes them into arrays.
+
+	Listens on address, a (host, port) pair for TCP or a path for a Unix
+	socket, with a thread per connected agent. Every decoded Batch is passed
+	to onBatch (from that agent's thread), and latest(host) returns the
+	newest values of each agent's devices as a FleetSnapshot."""
+
+	def __init__(self, address=('127.0.0.1', defaultPort), onBatch=None):
+		self.requestedAddress = address
+		self.onBatch = onBatch
+		self.batches = 0
+		self.bytesReceived = 0
+		self.server = None
+		self._latest = {}
+		self._connections = set()
+		self._thread = None
+		self._lock = threading.Lock()
+
+	@property
+	def address(self):
+		"""Where the collector listens (with the actual port if 0 was asked for)."""
+		return self.server.server_address if self.server is not None else self.requestedAddress
+
+	def start(self):
+		if self.server is not None:
+			return self
+		collector = self
+
+		class Handler(socketserver.StreamRequestHandler):
+			def handle(self):
+				with collector._lock:
+					collector._connections.add(self.connection)
+				try:
+					collector._serve(self.rfile)
+				finally:
+					with collector._lock:
+						collector._connections.discard(self.connection)
+
+		if isinstance(self.requestedAddress, str):
+			if os.path.exists(self.requestedAddress):
+				# left behind by a collector that did not stop
+				os.remove(self.requestedAddress)
+			server = socketserver.ThreadingUnixStreamServer(self.requestedAddress, Handler, bind_and_activate=False)
+		else:
+			server = socketserver.ThreadingTCPServer(self.requestedAddress, Handler, bind_and_activate=False)
+			server.allow_reuse_address = True
+		server.daemon_threads = True
+		try:
+			server.server_bind()
+			server.server_activate()
+		except OSError:
+			server.server_close()
+			raise
+		self.server = server
+		self._thread = threading.Thread(target=server.serve_forever, name='nvml-collector', daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self):
+		if self.server is None:
+			return
+		self.server.shutdown()
+		self.server.server_close()
+		# hang up on the agents, so they reconnect to whoever listens next
+		with self._lock:
+			connections = list(self._connections)
+		for connection in connections:
+			try:
+				connection.shutdown(socket.SHUT_RDWR)
+			except OSError:
+				pass
+		self._thread.join()
+		if isinstance(self.requestedAddress, str) and os.path.exists(self.requestedAddress):
+			os.remove(self.requestedAddress)
+		self.server = None
+		self._thread = None
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+	def _serve(self, stream):
+		decoder = None
+		while True:
+			header = stream.read(frameHeader.size)
+			if len(header) < frameHeader.size:
+				return
+			(length, kind) = frameHeader.unpack(header)
+			if length > maxFrameSize:
+				return
+			payload = stream.read(length)
+			if len(payload) < length:
+				return
+			if kind == HELLO:
+				hello = json.loads(payload.decode())
+				if hello.get('version') != protocolVersion:
+					return
+				decoder = BatchDecoder(hello['host'], hello['fields'], hello['devices'])
+			elif kind == BATCH and decoder is not None:
+				batch = decoder.decode(payload)
+				with self._lock:
+					self._latest[batch.host] = batch.records[-1]
+					self.batches += 1
+					self.bytesReceived += frameHeader.size + length
+				if self.onBatch is not None:
+					self.onBatch(batch)
+			else:
+				return
+
+	def hosts(self):
+		"""The hosts that have sent at least one batch."""
+		with self._lock:
+			return sorted(self._latest)
+
+	def latest(self, host):
+		"""The newest values of a host's devices as a FleetSnapshot (a copy)."""
+		with self._lock:
+			records = self._latest[host]
+		return FleetSnapshot(records.copy())
+
+
+if __name__ == '__main__':
+	import argparse
+	import time
+	from card import nvmlInit, nvmlShutdown
+
+	def parseAddress(text):
+		if ':' not in text:
+			return text
+		(host, port) = text.rsplit(':', 1)
+		return (host, int(port))
+
+	parser = argparse.ArgumentParser(description="Stream NVML sweeps from an agent to a collector.")
+	parser.add_argument('role', choices=('agent', 'collector'))
+	parser.add_argument('address', type=parseAddress, help="host:port, or a Unix socket path")
+	parser.add_argument('--interval', type=float, default=1.0, help="seconds between sweeps (agent)")
+	parser.add_argument('--batch', type=int, default=10, help="sweeps per frame (agent)")
+	args = parser.parse_args()
+
+	if args.role == 'collector':
+		def report(batch):
+			print("{}: {} sweeps, {} devices".format(batch.host, len(batch.sweeps), batch.records.shape[1]))
+		collector = Collector(args.address, report).start()
+		try:
+			while True:
+				time.sleep(3600)
+		except KeyboardInterrupt:
+			pass
+		collector.stop()
+	else:
+		nvmlInit()
+		agent = Agent(args.address, interval=args.interval, batchSweeps=args.batch).start()
+		try:
+			while True:
+				time.sleep(3600)
+		except KeyboardInterrupt:
+			pass
+		agent.close()
+		nvmlShutdown()
@@ -0,0 +1,271 @@
+from py3nvml.py3nvml import *
+from backend import Backend
+from telemetrylog import TelemetryLog
+from functools import wraps
+import threading
+import time
+
+# (backend function, argument): recorded field, for calls whose argument picks the metric
+replayedFields = {
+	('nvmlDeviceGetTemperature', NVML_TEMPERATURE_GPU): 'temperature',
+	('nvmlDeviceGetClockInfo', NVML_CLOCK_GRAPHICS): 'gpu_clock',
+	('nvmlDeviceGetClockInfo', NVML_CLOCK_SM): 'sm_clock',
+	('nvmlDeviceGetClockInfo', NVML_CLOCK_MEM): 'memory_clock',
+	('nvmlDeviceGetPcieThroughput', NVML_PCIE_UTIL_TX_BYTES): 'pcie_tx_kb_sec',
+	('nvmlDeviceGetPcieThroughput', NVML_PCIE_UTIL_RX_BYTES): 'pcie_rx_kb_sec',
+}
+
+
+def replayed(method):
+	"""Wraps a ReplayBackend device call with the init check and call counting."""
+	@wraps(method)
+	def call(self, handle, *args):
+		if not self.initialized:
+			raise NVMLError(NVML_ERROR_UNINITIALIZED)
+		self.calls += 1
+		return method(self, handle, *args)
+	return call
+
+
+class ReplayDevice:
+	"""The handle ReplayBackend hands out for one recorded GPU."""
+
+	def __init__(self, index, rows, timestamps):
+		self.index = index
+		# positions of this device's records in the log, in time order
+		self.rows = rows
+		self.timestamps = timestamps
+		self.cursor = 0
+		self.name = 'Replayed GPU'
+		self.uuid = 'GPU-4e504c59-%04d-0000-0000-%012d' % (index, index)
+		self.busId = '00000000:%02X:00.0' % (index + 1)
+
+
+class ReplayBackend(Backend):
+	"""Serves VideoCard calls from a telemetry log instead of the driver.
+
+	Every device index found in log (a TelemetryLog or a path) becomes a
+	device, and each call answers with the value recorded for it at the
+	current playback position. Values recorded as unsupported, and metrics
+	the log does not hold, raise NVML_ERROR_NOT_SUPPORTED.
+
+	speed sets the playback rate against clock: 1.0 is real time and 60.0
+	plays a minute of recording per second. Playback starts at the first
+	record when the backend is made, or wherever seek() puts it, and holds
+	the last record once it runs past the end. speed=None plays as fast as
+	possible: the position only moves on advance(), one record per device
+	at a time. frames() steps through the recording in either mode."""
+
+	def __init__(self, log, speed=1.0, clock=time.monotonic):
+		self.log = log if isinstance(log, TelemetryLog) else TelemetryLog(log)
+		self.speed = speed
+		self.clock = clock
+		self.initCount = 0
+		self.calls = 0
+		self._lock = threading.Lock()
+
+		records = self.log.records
+		self.columns = dict((f, records[f]) for f in self.log.fields)
+		indexes = records['index']
+		self.devices = []
+		for index in self.log.devices().tolist():
+			rows = (indexes == index).nonzero()[0]
+			self.devices.append(ReplayDevice(index, rows, records['timestamp'][rows]))
+		self.start = min(d.timestamps[0] for d in self.devices) if self.devices else 0.0
+		self.end = max(d.timestamps[-1] for d in self.devices) if self.devices else 0.0
+		self.seek(self.start)
+
+	@property
+	def initialized(self):
+		return self.initCount > 0
+
+	def seek(self, timestamp):
+		"""Moves playback to a recorded timestamp (as time.time() seconds)."""
+		self._origin = timestamp
+		self._started = self.clock()
+		for d in self.devices:
+			d.cursor = max(0, int(d.timestamps.searchsorted(timestamp, 'right')) - 1)
+
+	def position(self):
+		"""The recorded time being played back."""
+		if self.speed is None:
+			return max(d.timestamps[d.cursor] for d in self.devices) if self.devices else self._origin
+		return self._origin + (self.clock() - self._started) * self.speed
+
+	@property
+	def finished(self):
+		if self.speed is None:
+			return all(d.cursor == len(d.rows) - 1 for d in self.devices)
+		return self.position() >= self.end
+
+	def advance(self, records=1):
+		"""Moves every device on by records samples (speed=None); returns False at the end."""
+		for d in self.devices:
+			d.cursor = min(d.cursor + records, len(d.rows) - 1)
+		return not self.finished
+
+	def frames(self):
+		"""Generator stepping playback through the recording; yields each position.
+
+		As fast as possible with speed=None, otherwise it sleeps until the
+		next record of the busiest device is due at the playback speed."""
+		if not self.devices:
+			return
+		reference = max(self.devices, key=lambda d: len(d.rows))
+		if self.speed is None:
+			while True:
+				yield self.position()
+				if not self.advance():
+					return
+		for timestamp in reference.timestamps[reference.cursor:].tolist():
+			delay = (timestamp - self._origin) / self.speed - (self.clock() - self._started)
+			if delay > 0:
+				time.sleep(delay)
+			yield timestamp
+
+	def _row(self, handle):
+		if self.speed is None:
+			cursor = handle.cursor
+		else:
+			cursor = max(0, int(handle.timestamps.searchsorted(self.position(), 'right')) - 1)
+		return handle.rows[cursor]
+
+	def _value(self, handle, field):
+		column = self.columns.get(field)
+		if column is None:
+			raise NVMLError(NVML_ERROR_NOT_SUPPORTED)
+		value = column[self._row(handle)]
+		if value != value or value == self.log.missing.get(field):
+			raise NVMLError(NVML_ERROR_NOT_SUPPORTED)
+		return int(value)
+
+	def _values(self, handle, fields):
+		row = self._row(handle)
+		values = []
+		for f in fields:
+			column = self.columns.get(f)
+			if column is None:
+				raise NVMLError(NVML_ERROR_NOT_SUPPORTED)
+			value = column[row]
+			if value != value or value == self.log.missing.get(f):
+				raise NVMLError(NVML_ERROR_NOT_SUPPORTED)
+			values.append(int(value))
+		return values
+
+	def nvmlInit(self):
+		with self._lock:
+			self.initCount += 1
+
+	def nvmlShutdown(self):
+		with self._lock:
+			if self.initCount == 0:
+				raise NVMLError(NVML_ERROR_UNINITIALIZED)
+			self.initCount -= 1
+
+	def nvmlSystemGetDriverVersion(self):
+		return '0.0.replay'
+
+	def nvmlDeviceGetCount(self):
+		if not self.initialized:
+			raise NVMLError(NVML_ERROR_UNINITIALIZED)
+		return len(self.devices)
+
+	def nvmlDeviceGetHandleByIndex(self, index):
+		if not self.initialized:
+			raise NVMLError(NVML_ERROR_UNINITIALIZED)
+		if not 0 <= index < len(self.devices):
+			raise NVMLError(NVML_ERROR_INVALID_ARGUMENT)
+		return self.devices[index]
+
+	# identity, which the log does not record
+
+	@replayed
+	def nvmlDeviceGetName(self, handle):
+		return handle.name
+
+	@replayed
+	def nvmlDeviceGetBrand(self, handle):
+		return NVML_BRAND_UNKNOWN
+
+	@replayed
+	def nvmlDeviceGetPciInfo(self, handle):
+		return nvmlPciInfo_t(busId=handle.busId.encode(), domain=0, bus=handle.index + 1, device=0)
+
+	@replayed
+	def nvmlDeviceGetUUID(self, handle):
+		return handle.uuid
+
+	@replayed
+	def nvmlDeviceGetMinorNumber(self, handle):
+		return handle.index
+
+	# recorded metrics
+
+	@replayed
+	def nvmlDeviceGetTemperature(self, handle, sensor):
+		return self._value(handle, replayedFields.get(('nvmlDeviceGetTemperature', sensor)))
+
+	@replayed
+	def nvmlDeviceGetFanSpeed(self, handle):
+		return self._value(handle, 'fan_speed')
+
+	@replayed
+	def nvmlDeviceGetPowerUsage(self, handle):
+		return self._value(handle, 'power_draw')
+
+	@replayed
+	def nvmlDeviceGetUtilizationRates(self, handle):
+		(gpu, memory) = self._values(handle, ('gpu_util', 'mem_util'))
+		return c_nvmlUtilization_t(gpu=gpu, memory=memory)
+
+	@replayed
+	def nvmlDeviceGetEncoderUtilization(self, handle):
+		return [self._value(handle, 'encoder_util'), 0]
+
+	@replayed
+	def nvmlDeviceGetDecoderUtilization(self, handle):
+		return [self._value(handle, 'decoder_util'), 0]
+
+	@replayed
+	def nvmlDeviceGetClockInfo(self, handle, clockType):
+		return self._value(handle, replayedFields.get(('nvmlDeviceGetClockInfo', clockType)))
+
+	@replayed
+	def nvmlDeviceGetMemoryInfo(self, handle):
+		(total, used, free) = self._values(handle, ('mem_total', 'mem_used', 'mem_free'))
+		return c_nvmlMemory_t(total=total, used=used, free=free)
+
+	@replayed
+	def nvmlDeviceGetPowerState(self, handle):
+		return self._value(handle, 'performance_state')
+
+	@replayed
+	def nvmlDeviceGetPowerManagementLimit(self, handle):
+		return self._value(handle, 'power_limit')
+
+	@replayed
+	def nvmlDeviceGetEnforcedPowerLimit(self, handle):
+		return self._value(handle, 'enforced_power_limit')
+
+	@replayed
+	def nvmlDeviceGetSupportedClocksThrottleReasons(self, handle):
+		if 'throttle_reasons' not in self.columns:
+			raise NVMLError(NVML_ERROR_NOT_SUPPORTED)
+		return nvmlClocksThrottleReasonAll
+
+	@replayed
+	def nvmlDeviceGetCurrentClocksThrottleReasons(self, handle):
+		return self._value(handle, 'throttle_reasons')
+
+	@replayed
+	def nvmlDeviceGetComputeMode(self, handle):
+		return self._value(handle, 'compute_mode')
+
+	@replayed
+	def nvmlDeviceGetAutoBoostedClocksEnabled(self, handle):
+		enabled = self._value(handle, 'auto_boost')
+		return [enabled, enabled]
+
+	@replayed
+	def nvmlDeviceGetPcieThroughput(self, handle, counter):
+		return self._value(handle, replayedFields.get(('nvmlDeviceGetPcieThroughput', counter)))
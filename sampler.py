@@ -0,0 +1,168 @@
+from card import defaultSnapshotFields
+from fleet import pollAll
+from polling import PollingThread
+import numpy as np
+import threading
+import warnings
+
+
+class History:
+	"""Fixed-size ring of one card's snapshots, preallocated as a NumPy array.
+
+	Column 0 holds the sample timestamp and column i + 1 the i-th field; fields
+	the device does not support are NaN. Once capacity rows have been written
+	the oldest are overwritten, so memory stays flat however long it runs.
+	Writes and window reads are serialized by a lock, and window queries copy
+	only the rows inside the window."""
+
+	def __init__(self, fields=defaultSnapshotFields, capacity=3600):
+		self.fields = tuple(fields)
+		self.columns = dict((f, i + 1) for (i, f) in enumerate(self.fields))
+		self.capacity = capacity
+		self.data = np.full((capacity, len(self.fields) + 1), np.nan)
+		self.head = 0
+		self.count = 0
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return self.count
+
+	def append(self, snapshot):
+		"""Stores a Snapshot (or any (index, timestamp, *fields) sequence)."""
+		row = [np.nan if v is None else v for v in snapshot[1:]]
+		with self._lock:
+			self.data[self.head] = row
+			self.head = (self.head + 1) % self.capacity
+			if self.count < self.capacity:
+				self.count += 1
+
+	def window(self, seconds=None, now=None):
+		"""Returns a copy of the rows from the last seconds, oldest first.
+
+		seconds=None returns everything held. now defaults to the newest sample;
+		when given, rows newer than it are left out."""
+		with self._lock:
+			if self.count < self.capacity:
+				older = self.data[:0]
+				newer = self.data[:self.count]
+			elif self.head == 0:
+				# full with the write position wrapped: the array is in order
+				older = self.data[:0]
+				newer = self.data
+			else:
+				older = self.data[self.head:]
+				newer = self.data[:self.head]
+			if self.count == 0 or seconds is None:
+				return np.concatenate((older, newer))
+
+			if now is None:
+				latest = (newer if len(newer) else older)[-1, 0]
+				cutoff = latest - seconds
+			else:
+				cutoff = now - seconds
+			if len(newer) and newer[0, 0] >= cutoff:
+				start = np.searchsorted(older[:, 0], cutoff)
+				rows = np.concatenate((older[start:], newer))
+			else:
+				start = np.searchsorted(newer[:, 0], cutoff)
+				rows = newer[start:].copy()
+		if now is not None:
+			rows = rows[:np.searchsorted(rows[:, 0], now, 'right')]
+		return rows
+
+	def series(self, field, seconds=None, now=None):
+		"""Returns (timestamps, values) arrays of one field over the window."""
+		rows = self.window(seconds, now)
+		return rows[:, 0], rows[:, self.columns[field]]
+
+	def _values(self, field, seconds, now):
+		rows = self.window(seconds, now)
+		if field is None:
+			return rows[:, 1:]
+		return rows[:, self.columns[field]]
+
+	def _reduce(self, reducer, field, seconds, now, *args):
+		values = self._values(field, seconds, now)
+		if not len(values):
+			result = np.full(values.shape[1:], np.nan)
+		else:
+			with warnings.catch_warnings():
+				# all-NaN columns (unsupported fields) reduce to NaN quietly
+				warnings.simplefilter('ignore', RuntimeWarning)
+				result = reducer(values, *args, axis=0)
+		if field is None:
+			return dict(zip(self.fields, result.tolist()))
+		return float(result)
+
+	def min(self, field=None, seconds=None, now=None):
+		"""Minimum over the window; with field=None, a dict of every field's minimum."""
+		return self._reduce(np.nanmin, field, seconds, now)
+
+	def max(self, field=None, seconds=None, now=None):
+		return self._reduce(np.nanmax, field, seconds, now)
+
+	def mean(self, field=None, seconds=None, now=None):
+		return self._reduce(np.nanmean, field, seconds, now)
+
+	def percentile(self, q, field=None, seconds=None, now=None):
+		"""q-th percentile (0-100) over the window."""
+		return self._reduce(np.nanpercentile, field, seconds, now, q)
+
+	def rate(self, field=None, seconds=None, now=None):
+		"""Least-squares slope per second over the window (e.g. degrees C/s)."""
+		rows = self.window(seconds, now)
+		times = rows[:, :1] - (rows[0, 0] if len(rows) else 0)
+		values = rows[:, 1:] if field is None else rows[:, self.columns[field]:self.columns[field] + 1]
+		valid = ~np.isnan(values)
+		n = valid.sum(axis=0)
+		with np.errstate(all='ignore'):
+			t = np.where(valid, times, 0.0)
+			v = np.where(valid, values, 0.0)
+			tMean = t.sum(axis=0) / n
+			vMean = v.sum(axis=0) / n
+			cov = (np.where(valid, (times - tMean) * (values - vMean), 0.0)).sum(axis=0)
+			var = (np.where(valid, (times - tMean) ** 2, 0.0)).sum(axis=0)
+			slope = np.where(n > 1, cov / var, np.nan)
+		if field is None:
+			return dict(zip(self.fields, slope.tolist()))
+		return float(slope[0])
+
+
+class Sampler(PollingThread):
+	"""Background thread that polls cards into per-card History rings.
+
+	Readers query sampler.history[card.index] (or the shortcut methods)
+	instead of calling NVML. Sweeps run through pollAll() every interval
+	seconds (see PollingThread)."""
+
+	threadName = 'nvml-sampler'
+
+	def __init__(self, cards, interval=1.0, fields=defaultSnapshotFields, capacity=3600):
+		PollingThread.__init__(self, interval)
+		self.cards = list(cards)
+		self.fields = tuple(fields)
+		self.history = dict((c.index, History(self.fields, capacity)) for c in self.cards)
+		self.sweeps = 0
+
+	def sample(self):
+		"""Takes one sweep now and records it; returns the Sweep."""
+		sweep = pollAll(self.cards, self.fields)
+		for s in sweep.samples:
+			self.history[s.index].append(s)
+		self.sweeps += 1
+		return sweep
+
+	def min(self, index, field=None, seconds=None):
+		return self.history[index].min(field, seconds)
+
+	def max(self, index, field=None, seconds=None):
+		return self.history[index].max(field, seconds)
+
+	def mean(self, index, field=None, seconds=None):
+		return self.history[index].mean(field, seconds)
+
+	def percentile(self, index, q, field=None, seconds=None):
+		return self.history[index].percentile(q, field, seconds)
+
+	def rate(self, index, field=None, seconds=None):
+		return self.history[index].rate(field, seconds)
@@ -0,0 +1,176 @@
+from nvmlconstants import nvmlClocksThrottleReasonGpuIdle
+import heapq
+import threading
+import time
+
+# metric: rate of change (raw units per second) treated as "changing fast"
+defaultPolicies = {
+	'gpu_util': 10,
+	'power_draw': 20000,
+	'temperature': 1,
+}
+
+# metrics that are pinned to the fastest rate near the thermal slowdown limit
+thermalMetrics = ('temperature', 'power_draw')
+
+
+class AdaptiveScheduler:
+	"""Samples each device's metrics at a rate that follows their activity.
+
+	Each (device, metric) pair has its own interval between minInterval and
+	maxInterval. When a metric changes faster than its threshold in policies,
+	its interval is halved. When it changes at under a quarter of the
+	threshold, the interval grows by backoff. Temperature and power go to
+	minInterval once the temperature is within slowdownMargin degrees of the
+	device's slowdown threshold. While the clocks_throttle_reason_gpu_idle
+	flag is set, every metric of that device is read only every idleInterval;
+	the first read after the flag clears drops them back to minInterval.
+
+	Metrics due together on one device are read in one snapshot, along with
+	throttle_reasons. Each snapshot goes to callback and is kept in latest.
+	Call step() from your own loop, or start() a background thread. A
+	device whose snapshot fails keeps its intervals and is tried again
+	when next due; step() raises the first such error after reading the
+	other devices, and the background thread counts it in errors and keeps
+	it in lastError, as PollingThread does."""
+
+	def __init__(self, cards, policies=defaultPolicies, minInterval=0.1, maxInterval=10.0,
+			idleInterval=None, backoff=1.5, slowdownMargin=5, callback=None, clock=time.monotonic):
+		self.cards = dict((c.index, c) for c in cards)
+		self.policies = dict(policies)
+		self.minInterval = minInterval
+		self.maxInterval = maxInterval
+		self.idleInterval = maxInterval if idleInterval is None else idleInterval
+		self.backoff = backoff
+		self.slowdownMargin = slowdownMargin
+		self.callback = callback
+		self.clock = clock
+		self.latest = {}
+		self.reads = 0
+		self.errors = 0
+		self.lastError = None
+
+		# (device, metric): [interval, last value, last read time]
+		self._state = {}
+		# device: whether its last snapshot had the idle flag set
+		self._idle = {}
+		self._queue = []
+		now = clock()
+		for index in self.cards:
+			for metric in self.policies:
+				self._state[(index, metric)] = [minInterval, None, None]
+				heapq.heappush(self._queue, (now, index, metric))
+
+		self._stop = threading.Event()
+		self._thread = None
+
+	def interval(self, index, metric):
+		"""Current sampling interval in seconds for one device and metric."""
+		return self._state[(index, metric)][0]
+
+	def nextDue(self):
+		return self._queue[0][0] if self._queue else None
+
+	def _slowdown(self, card):
+		threshold = card.temperatureThresholds().get('slowdown_threshold')
+		return threshold if isinstance(threshold, int) else None
+
+	def step(self):
+		"""Reads every metric that is due and reschedules it; returns the snapshots taken."""
+		now = self.clock()
+		due = {}
+		while self._queue and self._queue[0][0] <= now:
+			(when, index, metric) = heapq.heappop(self._queue)
+			due.setdefault(index, []).append(metric)
+
+		taken = []
+		error = None
+		for (index, metrics) in due.items():
+			try:
+				snapshot = self._read(index, metrics)
+			except Exception as err:
+				# try again when next due rather than dropping the metrics
+				retry = self.clock()
+				for metric in metrics:
+					heapq.heappush(self._queue, (retry + self._state[(index, metric)][0], index, metric))
+				if error is None:
+					error = err
+				continue
+			taken.append(snapshot)
+			if self.callback is not None:
+				self.callback(snapshot)
+		if error is not None:
+			raise error
+		return taken
+
+	def _read(self, index, metrics):
+		card = self.cards[index]
+		snapshot = card.snapshot(tuple(metrics) + ('throttle_reasons',))
+		self.reads += 1
+		read = self.clock()
+		idle = bool((snapshot.throttle_reasons or 0) & nvmlClocksThrottleReasonGpuIdle)
+		woke = self._idle.get(index, False) and not idle
+		self._idle[index] = idle
+		temperature = getattr(snapshot, 'temperature', None)
+		if temperature is None:
+			temperature = self.latest.get(index, {}).get('temperature')
+		slowdown = self._slowdown(card)
+		hot = (temperature is not None and slowdown is not None
+			and temperature >= slowdown - self.slowdownMargin)
+
+		for metric in metrics:
+			self._adjust(self._state[(index, metric)], metric, getattr(snapshot, metric), read, idle, woke, hot)
+			heapq.heappush(self._queue, (read + self._state[(index, metric)][0], index, metric))
+
+		values = self.latest.setdefault(index, {})
+		values.update(snapshot._asdict())
+		return snapshot
+
+	def _adjust(self, state, metric, value, now, idle, woke, hot):
+		(interval, lastValue, lastTime) = state
+		if idle:
+			interval = self.idleInterval
+		elif woke:
+			# a burst is starting; halving down from idleInterval would miss it
+			interval = self.minInterval
+		elif hot and metric in thermalMetrics:
+			interval = self.minInterval
+		elif value is not None and lastValue is not None and now > lastTime:
+			rate = abs(value - lastValue) / (now - lastTime)
+			fast = self.policies[metric]
+			if rate >= fast:
+				interval = max(self.minInterval, interval / 2)
+			elif rate < fast / 4:
+				interval = min(self.maxInterval, interval * self.backoff)
+		state[0] = interval
+		state[1] = value
+		state[2] = now
+
+	def start(self):
+		if self._thread is None:
+			self._stop.clear()
+			self._thread = threading.Thread(target=self._run, name='nvml-scheduler', daemon=True)
+			self._thread.start()
+		return self
+
+	def stop(self):
+		self._stop.set()
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+	def _run(self):
+		while not self._stop.is_set():
+			try:
+				self.step()
+			except Exception as err:
+				self.errors += 1
+				self.lastError = err
+			due = self.nextDue()
+			self._stop.wait(max(0.0, due - self.clock()) if due is not None else self.maxInterval)
@@ -0,0 +1,132 @@
+from card import invalidateCards, nvmlInit, nvmlShutdown, refreshHooks
+from backend import getBackend
+import atexit
+import os
+import threading
+
+
+class Session:
+	"""Reference-counted NVML initialization shared by everything in a process.
+
+	acquire() initializes NVML through the backend only if it is not
+	already up, and release() gives the reference back. With linger=True
+	(the default) NVML stays initialized when the count drops to zero, so
+	the next acquire() is free, and is shut down at interpreter exit;
+	linger=False shuts it down as soon as the last user releases it.
+	Sessions nest, and can be used as context managers:
+
+		with getSession():
+			cards = getVideoCards()
+
+	After fork() the parent's NVML state is no good in the child, so every
+	session is marked uninitialized there and every VideoCard is told to
+	refresh. The child's first NVML use, whether an acquire() or a call on
+	a card inherited from the parent, initializes NVML again; the card then
+	fetches a fresh handle and re-reads its static values. Children that
+	never use NVML, such as most multiprocessing workers, pay nothing."""
+
+	def __init__(self, backend=None, linger=True):
+		self.backend = backend or getBackend()
+		self.linger = linger
+		self.count = 0
+		self.initialized = False
+		# initialized in the parent before a fork, but not yet in this process
+		self.stale = False
+		self.pid = os.getpid()
+		self._lock = threading.Lock()
+
+	def acquire(self):
+		with self._lock:
+			self._initialize()
+			self.count += 1
+		return self
+
+	def _initialize(self):
+		if not self.initialized:
+			nvmlInit(self.backend)
+			self.initialized = True
+		self.stale = False
+
+	def _revive(self):
+		"""Initializes NVML again in a forked child, keeping the inherited count."""
+		with self._lock:
+			if self.stale:
+				self._initialize()
+
+	def release(self):
+		with self._lock:
+			if self.count == 0:
+				raise RuntimeError("session released more times than it was acquired")
+			self.count -= 1
+			if self.count == 0 and not self.linger:
+				self._shutdown()
+
+	def close(self):
+		"""Shuts NVML down now, whatever the count."""
+		with self._lock:
+			self.count = 0
+			self._shutdown()
+
+	def _shutdown(self):
+		if self.initialized:
+			self.initialized = False
+			nvmlShutdown(self.backend)
+
+	def _afterFork(self):
+		# another thread may have held the lock at fork time; it will never
+		# release it in this process
+		self._lock = threading.Lock()
+		self.pid = os.getpid()
+		# nothing the parent initialized is valid here, and shutting it
+		# down from the child would be wrong too
+		self.stale = self.initialized
+		self.initialized = False
+
+	def __enter__(self):
+		return self.acquire()
+
+	def __exit__(self, *exc):
+		self.release()
+
+
+_sessions = {}
+_sessionsLock = threading.Lock()
+
+
+def getSession(backend=None):
+	"""Returns the process-wide Session for a backend (default getBackend())."""
+	backend = backend or getBackend()
+	with _sessionsLock:
+		session = _sessions.get(backend)
+		if session is None:
+			session = _sessions[backend] = Session(backend)
+		return session
+
+
+def _afterFork():
+	global _sessionsLock
+	_sessionsLock = threading.Lock()
+	for session in list(_sessions.values()):
+		session._afterFork()
+	invalidateCards()
+
+
+def _beforeRefresh(backend):
+	session = _sessions.get(backend)
+	if session is not None and session.stale:
+		session._revive()
+
+
+def _shutdownAll():
+	for session in list(_sessions.values()):
+		try:
+			session.close()
+		except Exception:
+			# the driver may already be gone at interpreter exit
+			pass
+
+
+atexit.register(_shutdownAll)
+refreshHooks.append(_beforeRefresh)
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child=_afterFork)
@@ -0,0 +1,239 @@
+from card import defaultSnapshotFields, getVideoCards, snapshotType
+from fleet import pollAll
+from fleetsnapshot import FleetSnapshot, fleetDtype, integerFields
+from polling import PollingThread
+from multiprocessing import resource_tracker, shared_memory
+import json
+import numpy as np
+import os
+import struct
+import time
+
+defaultName = 'nvml-telemetry'
+
+# magic, version, header size, device count, record size, then at offset 24
+# the sequence number, at 32 and 40 the last sweep's start and duration and
+# at 48 the publisher's pid
+headerFormat = struct.Struct('<8sIIII')
+magic = b'NVMLSHM1'
+formatVersion = 1
+fixedHeaderSize = 64
+sequenceOffset = 24
+sweepOffset = 32
+ownerFormat = struct.Struct('<Q')
+ownerOffset = 48
+
+
+# segments published by this process
+_published = set()
+
+# struct codes for the column types fleetDtype() uses
+_structCodes = {('i', 4): 'i', ('i', 8): 'q', ('u', 8): 'Q', ('f', 8): 'd'}
+
+
+def _attach(name):
+	try:
+		return shared_memory.SharedMemory(name, track=False)
+	except TypeError:
+		segment = shared_memory.SharedMemory(name)
+		if name not in _published:
+			# before Python 3.13 attaching also registers the segment with
+			# the resource tracker, which would unlink it when we exit
+			resource_tracker.unregister(segment._name, 'shared_memory')
+		return segment
+
+
+def _alive(pid):
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		# exists, but belongs to another user
+		return True
+	return True
+
+
+def _owner(segment):
+	"""The pid of the publisher that created a segment, or None if it is not ours."""
+	buf = segment.buf
+	if len(buf) < fixedHeaderSize or bytes(buf[:len(magic)]) != magic:
+		return None
+	return ownerFormat.unpack_from(buf, ownerOffset)[0]
+
+
+def recordStruct(dtype):
+	"""A struct.Struct unpacking one record of a packed structured dtype."""
+	return struct.Struct('<' + ''.join(_structCodes[(dtype[i].kind, dtype[i].itemsize)] for i in range(len(dtype))))
+
+
+class SharedPublisher(PollingThread):
+	"""Publishes the latest sweep of every card to a shared memory segment.
+
+	The segment holds a fixed header, the schema as JSON and one
+	fleetDtype(fields) record per card, in card order. Every interval
+	seconds the cards are swept once with pollAll() and the records are
+	overwritten under a seqlock: the sequence number is odd while a write is
+	in progress and moves on by two per sweep. SharedReader in any process
+	on the host then reads the records without calling NVML. close() stops
+	publishing and removes the segment.
+
+	A segment left behind by a publisher that died is replaced; if the
+	publisher that created it is still running, FileExistsError is raised."""
+
+	threadName = 'nvml-shm-publisher'
+
+	def __init__(self, cards=None, interval=1.0, fields=defaultSnapshotFields, name=defaultName):
+		PollingThread.__init__(self, interval)
+		self.cards = getVideoCards() if cards is None else list(cards)
+		self.fields = tuple(fields)
+		self.dtype = fleetDtype(self.fields)
+		schema = json.dumps({'fields': list(self.fields), 'dtype': self.dtype.descr}).encode()
+		headerSize = fixedHeaderSize + len(schema)
+		headerSize += -headerSize % fixedHeaderSize
+		size = headerSize + self.dtype.itemsize * len(self.cards)
+		try:
+			self.segment = shared_memory.SharedMemory(name, create=True, size=size)
+		except FileExistsError:
+			existing = _attach(name)
+			owner = _owner(existing)
+			existing.close()
+			if owner is None or _alive(owner):
+				raise FileExistsError("shared memory segment {} is in use{}".format(
+					name, "" if owner is None else " by publisher pid {}".format(owner)))
+			# left behind by a publisher that died without closing
+			stale = shared_memory.SharedMemory(name)
+			stale.close()
+			stale.unlink()
+			self.segment = shared_memory.SharedMemory(name, create=True, size=size)
+		self.name = name
+		_published.add(name)
+
+		buf = self.segment.buf
+		headerFormat.pack_into(buf, 0, magic, formatVersion, headerSize, len(self.cards), self.dtype.itemsize)
+		ownerFormat.pack_into(buf, ownerOffset, os.getpid())
+		buf[fixedHeaderSize:fixedHeaderSize + len(schema)] = schema
+		self._sequence = np.ndarray(1, np.uint64, buf, sequenceOffset)
+		self._sweep = np.ndarray(2, np.float64, buf, sweepOffset)
+		self.records = np.ndarray(len(self.cards), self.dtype, buf, headerSize)
+		for f in self.fields:
+			self.records[f] = integerFields[f][1] if f in integerFields else np.nan
+		self.records['index'] = [c.index for c in self.cards]
+		self.records['timestamp'] = np.nan
+
+	def publish(self, sweep):
+		"""Writes a fleet.Sweep of this publisher's cards and fields into the segment."""
+		data = FleetSnapshot.fromSweep(sweep, self.fields).data
+		self._sequence[0] += 1
+		self.records[:] = data
+		self._sweep[:] = (sweep.timestamp, sweep.duration)
+		self._sequence[0] += 1
+
+	def sample(self):
+		sweep = pollAll(self.cards, self.fields)
+		self.publish(sweep)
+		return sweep
+
+	def close(self):
+		self.stop()
+		if self.segment is None:
+			return
+		# the views must go before the buffer they point into can be released
+		self._sequence = self._sweep = self.records = None
+		self.segment.close()
+		try:
+			self.segment.unlink()
+		except FileNotFoundError:
+			pass
+		self.segment = None
+		_published.discard(self.name)
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+class SharedReader:
+	"""Reads what a SharedPublisher put in shared memory, without calling NVML.
+
+	read() copies the records and retries if a write overlapped, so each
+	result is one consistent sweep, in about a microsecond for 16 devices.
+	snapshot() reads a single card the same way. live is the zero-copy view
+	of the records, for callers that can accept a torn read. If a write
+	stays in progress for timeout seconds, the publisher is taken to have
+	died mid-write and reads raise TimeoutError."""
+
+	def __init__(self, name=defaultName, timeout=1.0):
+		self.timeout = timeout
+		self.segment = _attach(name)
+		buf = self.segment.buf
+		(tag, version, headerSize, count, itemsize) = headerFormat.unpack_from(buf, 0)
+		if tag != magic:
+			self.segment.close()
+			raise ValueError("{} is not an NVML telemetry segment".format(name))
+		if version != formatVersion:
+			self.segment.close()
+			raise ValueError("unsupported telemetry segment version {}".format(version))
+		schema = json.loads(bytes(buf[fixedHeaderSize:headerSize]).decode().rstrip('\0 '))
+		self.fields = tuple(schema['fields'])
+		self.dtype = np.dtype([tuple(column) for column in schema['dtype']])
+		# a memoryview reads the sequence several times faster than a NumPy scalar
+		self._sequence = buf[sequenceOffset:sequenceOffset + 8].cast('Q')
+		self._sweep = np.ndarray(2, np.float64, buf, sweepOffset)
+		self.live = np.ndarray(count, self.dtype, buf, headerSize)
+		self._record = recordStruct(self.dtype)
+		self._offsets = [headerSize + slot * itemsize for slot in range(count)]
+		self.slots = dict((index, slot) for (slot, index) in enumerate(self.live['index'].tolist()))
+		self._Snapshot = snapshotType(self.fields)
+		self._integers = [f in integerFields for f in self.fields]
+
+	@property
+	def sequence(self):
+		"""How many sweeps have been published (a changed value means new data)."""
+		return self._sequence[0] // 2
+
+	def _consistent(self, copy):
+		sequence = self._sequence
+		deadline = None
+		while True:
+			begin = sequence[0]
+			if not begin & 1:
+				result = copy()
+				if sequence[0] == begin:
+					return result
+			if deadline is None:
+				deadline = time.monotonic() + self.timeout
+			elif time.monotonic() > deadline:
+				raise TimeoutError("shared memory segment {} has been mid-write for {} s".format(self.segment.name, self.timeout))
+			# let the publisher finish
+			time.sleep(0)
+
+	def read(self):
+		"""Returns the latest sweep as a FleetSnapshot (a consistent, read-only copy)."""
+		# copying the raw bytes is many times faster than copying a packed
+		# structured array field by field
+		return FleetSnapshot(np.frombuffer(self._consistent(self.live.tobytes), self.dtype))
+
+	def sweepTime(self):
+		"""(start, duration) of the latest published sweep."""
+		return tuple(self._consistent(self._sweep.tolist))
+
+	def snapshot(self, index):
+		"""Returns one card's latest Snapshot namedtuple, with None for unsupported fields."""
+		unpack = self._record.unpack_from
+		buf = self.segment.buf
+		offset = self._offsets[self.slots[index]]
+		row = self._consistent(lambda: unpack(buf, offset))
+		return self._Snapshot(row[0], row[1], *[
+			v if isInt else (int(v) if v == v else None) for (v, isInt) in zip(row[2:], self._integers)
+		])
+
+	def close(self):
+		self._sequence.release()
+		self._sequence = self._sweep = self.live = None
+		self.segment.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
@@ -0,0 +1,416 @@
+from py3nvml.py3nvml import *
+from backend import Backend
+from functools import wraps
+import math
+import threading
+import time
+
+MiB = 1024 * 1024
+
+gpuIdleThreshold = 0.05
+
+
+def simulated(method):
+	"""Wraps a SimulatedBackend device call with the init check, holes and latency."""
+	name = method.__name__
+	@wraps(method)
+	def call(self, handle, *args):
+		if not self.initialized:
+			raise NVMLError(NVML_ERROR_UNINITIALIZED)
+		if name in handle.notSupported:
+			raise NVMLError(NVML_ERROR_NOT_SUPPORTED)
+		delay = self.latencies.get(name, self.latency) * handle.latencyScale
+		if delay:
+			# time.sleep releases the GIL just like a real driver call
+			time.sleep(delay)
+		self.calls += 1
+		return method(self, handle, *args)
+	return call
+
+
+class SimulatedDevice:
+	"""The handle SimulatedBackend hands out for one fake GPU."""
+
+	def __init__(self, index, notSupported=(), latencyScale=1.0, period=60.0):
+		self.index = index
+		self.notSupported = frozenset(notSupported)
+		self.latencyScale = latencyScale
+		self.period = period
+		# spread devices out so they are not all busy at once
+		self.phase = index * 0.9
+		self.name = 'Simulated GPU'
+		self.uuid = 'GPU-5151%04d-0000-0000-0000-%012d' % (index, index)
+		self.serial = '%013d' % (1320000000000 + index)
+		self.busId = '00000000:%02X:00.0' % (index + 1)
+		self.memTotal = 16384 * MiB
+		self.bar1Total = 256 * MiB
+		self.maxGraphicsClock = 1530
+		self.maxMemoryClock = 877
+		self.powerLimit = 250000
+		self.slowdownTemp = 90
+		self.shutdownTemp = 95
+
+
+class SimulatedBackend(Backend):
+	"""A deterministic stand-in for NVML that needs no GPU or driver.
+
+	Models deviceCount devices whose load follows a sine wave over each
+	device's period, so utilization, clocks, power, temperature, memory
+	and throttle reasons vary with time. Half of each period is idle, and
+	each busy half is one job: a compute process with its own pid and
+	accounting stats. With the same clock readings the same values come
+	back every run.
+
+	latency is slept on every device call, latencies overrides it per
+	function name, and latencyScales multiplies both per device. notSupported
+	names functions that raise NVML_ERROR_NOT_SUPPORTED, either for every
+	device (a set of names) or per device (a dict of index to names). clock
+	supplies the time in seconds and defaults to time.monotonic."""
+
+	def __init__(self, deviceCount=1, latency=0.0, latencies=None, latencyScales=None,
+			notSupported=(), period=60.0, clock=time.monotonic):
+		self.latency = latency
+		self.latencies = dict(latencies or {})
+		self.clock = clock
+		self.start = clock()
+		self.initCount = 0
+		self.calls = 0
+		self._lock = threading.Lock()
+
+		self.devices = []
+		for i in range(deviceCount):
+			if isinstance(notSupported, dict):
+				holes = notSupported.get(i, ())
+			else:
+				holes = notSupported
+			scale = latencyScales[i] if latencyScales else 1.0
+			self.devices.append(SimulatedDevice(i, holes, scale, period))
+
+	@property
+	def initialized(self):
+		return self.initCount > 0
+
+	def load(self, device):
+		"""Returns the device's load between 0 and 1 at the current clock."""
+		t = self.clock() - self.start
+		return max(0.0, math.sin(2 * math.pi * t / device.period + device.phase))
+
+	def job(self, device):
+		"""Returns (job number, busy) at the current clock.
+
+		Each busy half of a device's period is one job, run by its own
+		process; the job number counts periods since the simulation began."""
+		cycles = (self.clock() - self.start) / device.period + device.phase / (2 * math.pi)
+		job = int(math.floor(cycles))
+		return job, cycles - job < 0.5
+
+	def jobPid(self, device, job):
+		return 4000 + device.index * 1000 + job % 1000
+
+	def nvmlInit(self):
+		with self._lock:
+			self.initCount += 1
+
+	def nvmlShutdown(self):
+		with self._lock:
+			if self.initCount == 0:
+				raise NVMLError(NVML_ERROR_UNINITIALIZED)
+			self.initCount -= 1
+
+	def nvmlSystemGetDriverVersion(self):
+		return '0.0.sim'
+
+	def nvmlDeviceGetCount(self):
+		if not self.initialized:
+			raise NVMLError(NVML_ERROR_UNINITIALIZED)
+		return len(self.devices)
+
+	def nvmlDeviceGetHandleByIndex(self, index):
+		if not self.initialized:
+			raise NVMLError(NVML_ERROR_UNINITIALIZED)
+		if not 0 <= index < len(self.devices):
+			raise NVMLError(NVML_ERROR_INVALID_ARGUMENT)
+		return self.devices[index]
+
+	# static identity
+
+	@simulated
+	def nvmlDeviceGetName(self, handle):
+		return handle.name
+
+	@simulated
+	def nvmlDeviceGetBrand(self, handle):
+		return NVML_BRAND_TESLA
+
+	@simulated
+	def nvmlDeviceGetPciInfo(self, handle):
+		return nvmlPciInfo_t(busId=handle.busId.encode(), domain=0, bus=handle.index + 1,
+			device=0, pciDeviceId=0x1db410de, pciSubSystemId=0x121210de)
+
+	@simulated
+	def nvmlDeviceGetSerial(self, handle):
+		return handle.serial
+
+	@simulated
+	def nvmlDeviceGetUUID(self, handle):
+		return handle.uuid
+
+	@simulated
+	def nvmlDeviceGetMinorNumber(self, handle):
+		return handle.index
+
+	@simulated
+	def nvmlDeviceGetVbiosVersion(self, handle):
+		return '88.00.4F.00.09'
+
+	@simulated
+	def nvmlDeviceGetBoardId(self, handle):
+		return 0x100 + handle.index
+
+	@simulated
+	def nvmlDeviceGetMultiGpuBoard(self, handle):
+		return 0
+
+	@simulated
+	def nvmlDeviceGetInforomImageVersion(self, handle):
+		return 'G500.0200.00.03'
+
+	@simulated
+	def nvmlDeviceGetInforomVersion(self, handle, infoRomObject):
+		return {NVML_INFOROM_OEM: '1.1', NVML_INFOROM_ECC: '5.0', NVML_INFOROM_POWER: 'N/A'}[infoRomObject]
+
+	# configuration
+
+	@simulated
+	def nvmlDeviceGetDisplayMode(self, handle):
+		return NVML_FEATURE_DISABLED
+
+	@simulated
+	def nvmlDeviceGetDisplayActive(self, handle):
+		return NVML_FEATURE_DISABLED
+
+	@simulated
+	def nvmlDeviceGetPersistenceMode(self, handle):
+		return NVML_FEATURE_ENABLED
+
+	@simulated
+	def nvmlDeviceGetAccountingMode(self, handle):
+		return NVML_FEATURE_ENABLED
+
+	@simulated
+	def nvmlDeviceGetAccountingBufferSize(self, handle):
+		return 4000
+
+	@simulated
+	def nvmlDeviceGetCurrentGpuOperationMode(self, handle):
+		return NVML_GOM_ALL_ON
+
+	@simulated
+	def nvmlDeviceGetPendingGpuOperationMode(self, handle):
+		return NVML_GOM_ALL_ON
+
+	@simulated
+	def nvmlDeviceGetComputeMode(self, handle):
+		return NVML_COMPUTEMODE_DEFAULT
+
+	@simulated
+	def nvmlDeviceGetAutoBoostedClocksEnabled(self, handle):
+		return [NVML_FEATURE_ENABLED, NVML_FEATURE_ENABLED]
+
+	# processes
+
+	@simulated
+	def nvmlDeviceGetComputeRunningProcesses(self, handle):
+		(job, busy) = self.job(handle)
+		if not busy:
+			return []
+		used = int(self.load(handle) * (handle.memTotal - 1024 * MiB))
+		return [nvmlStructToFriendlyObject(c_nvmlProcessInfo_t(pid=self.jobPid(handle, job), usedGpuMemory=used))]
+
+	@simulated
+	def nvmlDeviceGetGraphicsRunningProcesses(self, handle):
+		return []
+
+	@simulated
+	def nvmlDeviceGetAccountingPids(self, handle):
+		(job, busy) = self.job(handle)
+		first = int(math.floor(handle.phase / (2 * math.pi)))
+		return [self.jobPid(handle, j) for j in range(max(first, job - 9), job + 1)]
+
+	@simulated
+	def nvmlDeviceGetAccountingStats(self, handle, pid):
+		(job, busy) = self.job(handle)
+		first = int(math.floor(handle.phase / (2 * math.pi)))
+		for j in range(job, max(first, job - 9) - 1, -1):
+			if self.jobPid(handle, j) == pid:
+				break
+		else:
+			raise NVMLError(NVML_ERROR_NOT_FOUND)
+		running = j == job and busy
+		# on the simulation clock; the first job may have started before it
+		startTime = max(0.0, self.start + (j - handle.phase / (2 * math.pi)) * handle.period)
+		return c_nvmlAccountingStats_t(gpuUtilization=int(self.load(handle) * 100) if running else 63,
+			memoryUtilization=int(self.load(handle) * 60) if running else 38,
+			maxMemoryUsage=handle.memTotal - 1024 * MiB, time=0 if running else int(handle.period * 500),
+			startTime=int(startTime * 1000000), isRunning=1 if running else 0)
+
+	# pcie
+
+	@simulated
+	def nvmlDeviceGetMaxPcieLinkGeneration(self, handle):
+		return 3
+
+	@simulated
+	def nvmlDeviceGetCurrPcieLinkGeneration(self, handle):
+		return 3 if self.load(handle) > gpuIdleThreshold else 1
+
+	@simulated
+	def nvmlDeviceGetMaxPcieLinkWidth(self, handle):
+		return 16
+
+	@simulated
+	def nvmlDeviceGetCurrPcieLinkWidth(self, handle):
+		return 16
+
+	@simulated
+	def nvmlDeviceGetPcieReplayCounter(self, handle):
+		return 0
+
+	@simulated
+	def nvmlDeviceGetPcieThroughput(self, handle, counter):
+		kb = int(self.load(handle) * 12000000)
+		return kb if counter == NVML_PCIE_UTIL_TX_BYTES else kb // 4
+
+	# time-varying metrics
+
+	@simulated
+	def nvmlDeviceGetUtilizationRates(self, handle):
+		load = self.load(handle)
+		return c_nvmlUtilization_t(gpu=int(load * 100), memory=int(load * 60))
+
+	@simulated
+	def nvmlDeviceGetEncoderUtilization(self, handle):
+		return [0, 167000]
+
+	@simulated
+	def nvmlDeviceGetDecoderUtilization(self, handle):
+		return [0, 167000]
+
+	@simulated
+	def nvmlDeviceGetTemperature(self, handle, sensor):
+		return int(32 + 50 * self.load(handle))
+
+	@simulated
+	def nvmlDeviceGetTemperatureThreshold(self, handle, threshold):
+		if threshold == NVML_TEMPERATURE_THRESHOLD_SHUTDOWN:
+			return handle.shutdownTemp
+		return handle.slowdownTemp
+
+	@simulated
+	def nvmlDeviceGetFanSpeed(self, handle):
+		return int(30 + 60 * self.load(handle))
+
+	@simulated
+	def nvmlDeviceGetPowerState(self, handle):
+		return NVML_PSTATE_0 if self.load(handle) > gpuIdleThreshold else NVML_PSTATE_8
+
+	@simulated
+	def nvmlDeviceGetPowerUsage(self, handle):
+		return int(35000 + self.load(handle) * (handle.powerLimit - 35000))
+
+	@simulated
+	def nvmlDeviceGetTotalEnergyConsumption(self, handle):
+		# the exact integral of nvmlDeviceGetPowerUsage() since the simulation began
+		def positiveSine(x):
+			(cycles, rest) = divmod(x, 2 * math.pi)
+			return 2 * cycles + (1 - math.cos(rest) if rest < math.pi else 2)
+		t = self.clock() - self.start
+		omega = 2 * math.pi / handle.period
+		load = (positiveSine(omega * t + handle.phase) - positiveSine(handle.phase)) / omega
+		return int(35000 * t + (handle.powerLimit - 35000) * load)
+
+	@simulated
+	def nvmlDeviceGetPowerManagementMode(self, handle):
+		return NVML_FEATURE_ENABLED
+
+	@simulated
+	def nvmlDeviceGetPowerManagementLimit(self, handle):
+		return handle.powerLimit
+
+	@simulated
+	def nvmlDeviceGetPowerManagementDefaultLimit(self, handle):
+		return handle.powerLimit
+
+	@simulated
+	def nvmlDeviceGetEnforcedPowerLimit(self, handle):
+		return handle.powerLimit
+
+	@simulated
+	def nvmlDeviceGetPowerManagementLimitConstraints(self, handle):
+		return [150000, handle.powerLimit]
+
+	@simulated
+	def nvmlDeviceGetMemoryInfo(self, handle):
+		used = int(512 * MiB + self.load(handle) * (handle.memTotal - 1024 * MiB))
+		return c_nvmlMemory_t(total=handle.memTotal, used=used, free=handle.memTotal - used)
+
+	@simulated
+	def nvmlDeviceGetBAR1MemoryInfo(self, handle):
+		used = 2 * MiB
+		return c_nvmlBAR1Memory_t(bar1Total=handle.bar1Total, bar1Used=used, bar1Free=handle.bar1Total - used)
+
+	@simulated
+	def nvmlDeviceGetSupportedClocksThrottleReasons(self, handle):
+		return nvmlClocksThrottleReasonAll
+
+	@simulated
+	def nvmlDeviceGetCurrentClocksThrottleReasons(self, handle):
+		load = self.load(handle)
+		if load <= gpuIdleThreshold:
+			return nvmlClocksThrottleReasonGpuIdle
+		if load > 0.95:
+			return nvmlClocksThrottleReasonSwPowerCap
+		return nvmlClocksThrottleReasonNone
+
+	# clocks
+
+	def _graphicsClock(self, handle):
+		load = self.load(handle)
+		if load <= gpuIdleThreshold:
+			return 135
+		# snap to the 15 MHz steps real boards report
+		return 15 * int((900 + load * (handle.maxGraphicsClock - 900)) / 15)
+
+	@simulated
+	def nvmlDeviceGetClockInfo(self, handle, clockType):
+		if clockType == NVML_CLOCK_MEM:
+			return handle.maxMemoryClock if self.load(handle) > gpuIdleThreshold else 405
+		return self._graphicsClock(handle)
+
+	@simulated
+	def nvmlDeviceGetMaxClockInfo(self, handle, clockType):
+		if clockType == NVML_CLOCK_MEM:
+			return handle.maxMemoryClock
+		return handle.maxGraphicsClock
+
+	@simulated
+	def nvmlDeviceGetApplicationsClock(self, handle, clockType):
+		if clockType == NVML_CLOCK_MEM:
+			return handle.maxMemoryClock
+		return 1245
+
+	@simulated
+	def nvmlDeviceGetDefaultApplicationsClock(self, handle, clockType):
+		if clockType == NVML_CLOCK_MEM:
+			return handle.maxMemoryClock
+		return 1245
+
+	@simulated
+	def nvmlDeviceGetSupportedMemoryClocks(self, handle):
+		return [handle.maxMemoryClock, 405]
+
+	@simulated
+	def nvmlDeviceGetSupportedGraphicsClocks(self, handle, memoryClockMHz):
+		if memoryClockMHz == 405:
+			return [405, 135]
+		return list(range(handle.maxGraphicsClock, 135 - 1, -15))
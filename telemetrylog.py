@@ -0,0 +1,258 @@
+from card import defaultSnapshotFields, snapshotType
+import json
+import mmap
+import numpy as np
+import struct
+import threading
+
+# magic, format version, total header size in bytes (schema JSON included)
+headerFormat = struct.Struct('<8sII')
+magic = b'NVMLTLOG'
+formatVersion = 2
+headerAlignment = 64
+
+# Column type of each snapshot field in a log: the narrowest unsigned type
+# that holds every value NVML reports for it (percentages, P-states and
+# modes in a byte, clocks in MHz in 16 bits, milliwatts and KB/s in 32).
+# The type's largest value marks a sample the device did not support.
+# Fields not listed are stored as float64 with NaN as the marker.
+logFieldTypes = {
+	'temperature':          np.uint8,
+	'fan_speed':            np.uint8,
+	'power_draw':           np.uint32,
+	'gpu_util':             np.uint8,
+	'mem_util':             np.uint8,
+	'encoder_util':         np.uint8,
+	'decoder_util':         np.uint8,
+	'gpu_clock':            np.uint16,
+	'sm_clock':             np.uint16,
+	'memory_clock':         np.uint16,
+	'mem_total':            np.uint64,
+	'mem_used':             np.uint64,
+	'mem_free':             np.uint64,
+	'performance_state':    np.uint8,
+	'power_limit':          np.uint32,
+	'enforced_power_limit': np.uint32,
+	'throttle_reasons':     np.uint64,
+	'compute_mode':         np.uint8,
+	'auto_boost':           np.uint8,
+	'pcie_tx_kb_sec':       np.uint32,
+	'pcie_rx_kb_sec':       np.uint32,
+}
+
+
+def logDtype(fields):
+	"""Packed record dtype of a log: index, timestamp, then each field's logFieldTypes type."""
+	return np.dtype([('index', np.uint16), ('timestamp', np.float64)] +
+		[(f, logFieldTypes.get(f, np.float64)) for f in fields])
+
+
+def missingValues(fields):
+	"""{field: the value marking an unsupported sample}; None for NaN-marked float columns."""
+	return dict((f, int(np.iinfo(logFieldTypes[f]).max) if f in logFieldTypes else None) for f in fields)
+
+
+def _schemaHeader(fields, dtype):
+	schema = json.dumps({'fields': list(fields), 'dtype': dtype.descr, 'missing': missingValues(fields)}).encode()
+	size = headerFormat.size + len(schema)
+	size += -size % headerAlignment
+	return headerFormat.pack(magic, formatVersion, size) + schema.ljust(size - headerFormat.size)
+
+
+def readHeader(f):
+	"""Reads a log's header from an open binary file.
+
+	Returns (fields, dtype, header size, missing), missing as from
+	missingValues(). Version 1 logs stored every field but throttle_reasons
+	as float64 with NaN for unsupported values, and are read as such."""
+	prefix = f.read(headerFormat.size)
+	if len(prefix) < headerFormat.size:
+		raise ValueError("not a telemetry log: file too short")
+	(tag, version, size) = headerFormat.unpack(prefix)
+	if tag != magic:
+		raise ValueError("not a telemetry log: bad magic {!r}".format(tag))
+	if version not in (1, formatVersion):
+		raise ValueError("unsupported telemetry log version {}".format(version))
+	schema = json.loads(f.read(size - headerFormat.size).decode())
+	dtype = np.dtype([tuple(column) for column in schema['dtype']])
+	fields = tuple(schema['fields'])
+	missing = schema.get('missing') or dict((f, None) for f in fields)
+	return fields, dtype, size, missing
+
+
+class TelemetryWriter:
+	"""Appends Snapshots to a log of fixed-width binary records.
+
+	The file starts with a header holding the schema (field names, record
+	dtype and missing-value markers), followed by one logDtype(fields)
+	record per sample: index, timestamp, then each field in its
+	logFieldTypes type, holding the type's largest value when unsupported.
+	Values too large for their column are clamped just below the marker. Records are buffered in memory and written once
+	bufferRecords are pending, on flush() and on close(), so at most
+	bufferRecords samples are lost if the process dies. Opening an existing
+	log appends to it; its fields must match."""
+
+	def __init__(self, path, fields=defaultSnapshotFields, bufferRecords=1024):
+		self.path = path
+		self.fields = tuple(fields)
+		self.dtype = logDtype(self.fields)
+		self.bufferRecords = bufferRecords
+		missing = missingValues(self.fields)
+		self._fills = [np.nan if missing[f] is None else missing[f] for f in self.fields]
+		self._pending = []
+		self._lock = threading.Lock()
+		self._file = open(path, 'a+b')
+		self._file.seek(0, 2)
+		if self._file.tell() == 0:
+			self._file.write(_schemaHeader(self.fields, self.dtype))
+		else:
+			self._file.seek(0)
+			(fields, dtype, size, missing) = readHeader(self._file)
+			if fields != self.fields or dtype != self.dtype:
+				self._file.close()
+				raise ValueError("{} was written with fields {}".format(path, fields))
+			# drop a torn record left by a writer that died mid-write
+			end = self._file.seek(0, 2)
+			self._file.truncate(end - (end - size) % self.dtype.itemsize)
+			self._file.seek(0, 2)
+
+	def append(self, snapshot):
+		"""Queues one Snapshot, or every sample of a fleet.Sweep."""
+		fills = self._fills
+		rows = [
+			(s[0], s[1]) + tuple(fill if v is None else v for (v, fill) in zip(s[2:], fills))
+			for s in getattr(snapshot, 'samples', (snapshot,))
+		]
+		with self._lock:
+			self._pending.extend(rows)
+			if len(self._pending) >= self.bufferRecords:
+				self._write()
+
+	def _write(self):
+		if self._pending:
+			try:
+				records = np.array(self._pending, dtype=self.dtype)
+			except OverflowError:
+				records = np.array(self._clamped(), dtype=self.dtype)
+			self._file.write(records.tobytes())
+			self._pending = []
+
+	def _clamped(self):
+		# only reached when some value does not fit its column
+		markers = [f if isinstance(f, int) else None for f in self._fills]
+		return [
+			row[:2] + tuple(v if marker is None or v <= marker else marker - 1 for (v, marker) in zip(row[2:], markers))
+			for row in self._pending
+		]
+
+	def flush(self):
+		"""Writes pending records and flushes them to the operating system."""
+		with self._lock:
+			self._write()
+			self._file.flush()
+
+	def close(self):
+		if not self._file.closed:
+			self.flush()
+			self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+class TelemetryLog:
+	"""Read-only, memory-mapped view of a log written by TelemetryWriter.
+
+	records is a structured array over the mapped file, so log['power_draw']
+	and log.records[mask] columns are views that read straight from the page
+	cache with nothing parsed or copied up front; opening a log costs the
+	same however large it is. Those raw columns hold missing[field] where a
+	device did not support the field; column() returns a float64 copy with
+	NaN there instead. A torn record at the end is ignored. Call refresh()
+	to see records appended since the log was opened."""
+
+	def __init__(self, path):
+		self.path = path
+		self._file = open(path, 'rb')
+		(self.fields, self.dtype, self.headerSize, self.missing) = readHeader(self._file)
+		self._map = None
+		self.records = None
+		self.refresh()
+
+	def refresh(self):
+		"""Remaps the file to pick up appended records."""
+		size = self._file.seek(0, 2)
+		count = (size - self.headerSize) // self.dtype.itemsize
+		if self.records is not None and count == len(self.records):
+			return self
+		if count:
+			self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+			self.records = np.frombuffer(self._map, self.dtype, count, self.headerSize)
+		else:
+			self.records = np.empty(0, self.dtype)
+		return self
+
+	def __len__(self):
+		return len(self.records)
+
+	def __getitem__(self, key):
+		"""A column by name, or the records selected by an index, slice or mask."""
+		return self.records[key]
+
+	def __repr__(self):
+		return 'TelemetryLog({!r}, {} records, fields={})'.format(self.path, len(self.records), self.fields)
+
+	def column(self, field, records=None):
+		"""A field of records (default: all) as float64, with NaN for unsupported samples."""
+		raw = (self.records if records is None else records)[field]
+		values = raw.astype(np.float64)
+		marker = self.missing.get(field)
+		if marker is not None:
+			values[raw == marker] = np.nan
+		return values
+
+	def devices(self):
+		"""Sorted array of the device indexes present in the log."""
+		return np.unique(self.records['index'])
+
+	def device(self, index):
+		"""Records of one device, in the order they were written (a copy)."""
+		return self.records[self.records['index'] == index]
+
+	def between(self, start, end):
+		"""Records with start <= timestamp < end, assuming timestamps never go back."""
+		timestamps = self.records['timestamp']
+		return self.records[np.searchsorted(timestamps, start):np.searchsorted(timestamps, end)]
+
+	def snapshots(self, start=0, stop=None):
+		"""Generator of Snapshot namedtuples, with None for unsupported values.
+
+		NVML reports every snapshot field as an integer, so values come back
+		as ints, as they would from VideoCard.snapshot()."""
+		Snapshot = snapshotType(self.fields)
+		markers = [self.missing.get(f) for f in self.fields]
+		for row in self.records[start:stop].tolist():
+			yield Snapshot(row[0], row[1], *[
+				(int(v) if v == v else None) if marker is None else (None if v == marker else v)
+				for (v, marker) in zip(row[2:], markers)
+			])
+
+	def close(self):
+		self.records = None
+		if self._map is not None:
+			try:
+				self._map.close()
+			except BufferError:
+				# column views are still alive; the map closes once they go
+				pass
+			self._map = None
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
@@ -0,0 +1,104 @@
+from card import NOT_SUPPORTED, VideoCard, nvmlInit, nvmlShutdown
+from py3nvml.py3nvml import NVML_CLOCK_GRAPHICS, NVML_CLOCK_SM, NVML_ERROR_NOT_SUPPORTED, NVMLError
+from simulator import SimulatedBackend
+import pytest
+
+
+class CountingEncoder(SimulatedBackend):
+	"""Reports an encoder utilization that goes up by one on every read."""
+
+	encoderReads = 0
+
+	def nvmlDeviceGetEncoderUtilization(self, handle):
+		self.encoderReads += 1
+		return [self.encoderReads, 167000]
+
+
+class GeForce(SimulatedBackend):
+	"""Lacks graphics clock readings and GPU operation modes, and counts every device call."""
+
+	attempts = 0
+
+	def _attempt(self):
+		self.attempts += 1
+		raise NVMLError(NVML_ERROR_NOT_SUPPORTED)
+
+	def nvmlDeviceGetClockInfo(self, handle, clockType):
+		if clockType == NVML_CLOCK_GRAPHICS:
+			self._attempt()
+		return SimulatedBackend.nvmlDeviceGetClockInfo(self, handle, clockType)
+
+	def nvmlDeviceGetCurrentGpuOperationMode(self, handle):
+		self._attempt()
+
+	def nvmlDeviceGetPendingGpuOperationMode(self, handle):
+		self._attempt()
+
+
+@pytest.fixture
+def geforce():
+	backend = GeForce(1)
+	nvmlInit(backend)
+	yield backend
+	nvmlShutdown(backend)
+
+
+@pytest.fixture
+def backend():
+	backend = CountingEncoder(1, notSupported=('nvmlDeviceGetUtilizationRates', 'nvmlDeviceGetComputeMode'))
+	nvmlInit(backend)
+	yield backend
+	nvmlShutdown(backend)
+
+
+def test_unsupported_compute_mode(backend):
+	card = VideoCard(0, backend=backend)
+	for i in range(2):
+		assert card.computeMode() == {'mode': None, 'mode_str': NOT_SUPPORTED}
+
+
+def test_utilization_without_gpu_rates_keeps_reading_the_rest(backend):
+	card = VideoCard(0, backend=backend)
+	first = card.utilizationRates()
+	assert first['gpu_util'] == NOT_SUPPORTED
+	second = card.utilizationRates()
+	assert second is not first
+	assert second['encoder'] == first['encoder'] + 1
+
+
+def test_utilization_raw_mode_when_unsupported(backend):
+	card = VideoCard(0, backend=backend)
+	card.utilizationRates()
+	raw = card.utilizationRates(raw=True)
+	assert 'encoder_util' not in raw or raw['encoder_util'] == NOT_SUPPORTED
+	assert 'gpu' in raw and 'mem_util' in raw
+	assert card.utilizationRates(raw=False)['encoder_util'].endswith('%')
+
+
+def test_reading_one_metric_makes_one_call(backend):
+	card = VideoCard(0, backend=backend)
+	before = backend.calls
+	card.temperature()
+	assert backend.calls - before == 1
+
+
+def test_capabilities_are_kept_per_argument(geforce):
+	card = VideoCard(0, backend=geforce)
+	assert card.gpuClock()['rate_str'] == NOT_SUPPORTED
+	assert isinstance(card.smClock()['rate'], int)
+	assert card.unsupported() == frozenset([('nvmlDeviceGetClockInfo', (NVML_CLOCK_GRAPHICS,))])
+	assert card.supports('nvmlDeviceGetClockInfo', NVML_CLOCK_SM)
+	for i in range(2):
+		snapshot = card.snapshot(('gpu_clock', 'sm_clock', 'memory_clock'))
+		assert snapshot.gpu_clock is None
+		assert snapshot.sm_clock is not None and snapshot.memory_clock is not None
+	# gpuClock() found it lacking, so no snapshot tried it
+	assert geforce.attempts == 1
+
+
+def test_unsupported_gpu_operation_modes_are_tried_once(geforce):
+	card = VideoCard(0, backend=geforce)
+	for i in range(3):
+		assert card.currentGpuOperationMode() == NOT_SUPPORTED
+		assert card.pendingGpuOperationMode() == NOT_SUPPORTED
+	assert geforce.attempts == 2
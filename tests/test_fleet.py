@@ -0,0 +1,40 @@
+from backend import setBackend
+from card import getVideoCards, nvmlInit, nvmlShutdown
+from fleet import pollAll
+from simulator import SimulatedBackend
+import delta
+import pytest
+
+
+@pytest.fixture
+def backend():
+	backend = SimulatedBackend(2)
+	previous = setBackend(backend)
+	nvmlInit(backend)
+	yield backend
+	nvmlShutdown(backend)
+	setBackend(previous)
+
+
+def test_default_cards_are_reused(backend):
+	pollAll()
+	before = backend.calls
+	sweep = pollAll()
+	byDefault = backend.calls - before
+
+	cards = getVideoCards(backend)
+	pollAll(cards)
+	before = backend.calls
+	pollAll(cards)
+	assert byDefault == backend.calls - before
+	assert [s.index for s in sweep.samples] == [0, 1]
+
+
+def test_delta_stream_resolves_cards_once(backend, monkeypatch):
+	lookups = []
+	getRegistry = delta.getRegistry
+	monkeypatch.setattr(delta, 'getRegistry', lambda: lookups.append(1) or getRegistry())
+	stream = delta.pollDeltas(interval=0.0)
+	for i in range(6):
+		next(stream)
+	assert len(lookups) == 1
@@ -0,0 +1,18 @@
+import os
+import subprocess
+import sys
+
+# modules that reach py3nvml only through backend.py3nvml
+lazyModules = (
+	'card', 'fleet', 'delta', 'fleetsnapshot', 'registry', 'scheduler', 'throttle',
+	'instrument', 'session', 'sampler', 'exporter', 'energy', 'processes', 'sharedmemory', 'remote',
+)
+
+
+def test_importing_does_not_load_py3nvml():
+	script = "import sys\n"
+	script += "".join("import {}\n".format(m) for m in lazyModules)
+	script += "print(sorted(m for m in sys.modules if m.startswith('py3nvml')))\n"
+	root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	output = subprocess.check_output([sys.executable, '-c', script], cwd=root)
+	assert output.decode().strip() == '[]'
@@ -0,0 +1,58 @@
+from backend import Backend
+from card import VideoCard, nvmlInit, nvmlShutdown
+from instrument import InstrumentedBackend
+from py3nvml.py3nvml import c_nvmlDevice_t, struct_c_nvmlDevice_t
+from simulator import SimulatedBackend
+import ctypes
+
+
+class PointerBackend(Backend):
+	"""Hands out fresh ctypes handles on every lookup, as py3nvml does."""
+
+	def __init__(self, count):
+		# NVML's devices: handles for the same index point at the same one
+		self.devices = [struct_c_nvmlDevice_t() for i in range(count)]
+
+	def nvmlDeviceGetHandleByIndex(self, index):
+		return ctypes.cast(ctypes.pointer(self.devices[index]), c_nvmlDevice_t)
+
+	def nvmlDeviceGetTemperature(self, handle, sensor):
+		return 40
+
+
+def test_ctypes_handles_are_matched_to_indexes():
+	backend = InstrumentedBackend(PointerBackend(2))
+	for index in (0, 1, 1):
+		handle = backend.nvmlDeviceGetHandleByIndex(index)
+		backend.nvmlDeviceGetTemperature(handle, 0)
+	assert backend.stats('nvmlDeviceGetTemperature', 0).calls == 1
+	assert backend.stats('nvmlDeviceGetTemperature', 1).calls == 2
+	assert backend.stats('nvmlDeviceGetHandleByIndex').calls == 3
+
+
+def test_fetching_handles_again_does_not_grow_the_map():
+	inner = PointerBackend(2)
+	backend = InstrumentedBackend(inner)
+	for i in range(10):
+		backend.nvmlDeviceGetHandleByIndex(i % 2)
+	assert len(backend._devices) == 2
+	# a device that moved to a new address replaces its old entry
+	inner.devices[0] = struct_c_nvmlDevice_t()
+	handle = backend.nvmlDeviceGetHandleByIndex(0)
+	backend.nvmlDeviceGetTemperature(handle, 0)
+	assert len(backend._devices) == 2
+	assert backend.stats('nvmlDeviceGetTemperature', 0).calls == 1
+
+
+def test_plans_built_while_disabled_are_timed_once_enabled():
+	backend = InstrumentedBackend(SimulatedBackend(1), enabled=False)
+	nvmlInit(backend)
+	try:
+		card = VideoCard(0, backend=backend)
+		card.snapshot()
+		assert backend.stats('nvmlDeviceGetPowerUsage').calls == 0
+		backend.enabled = True
+		card.snapshot()
+		assert backend.stats('nvmlDeviceGetPowerUsage').calls == 1
+	finally:
+		nvmlShutdown(backend)
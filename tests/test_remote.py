@@ -0,0 +1,125 @@
+from card import VideoCard, nvmlInit, nvmlShutdown
+from fleet import pollAll
+from fleetsnapshot import FleetSnapshot
+from remote import Agent, BatchDecoder, BatchEncoder, Collector
+from simulator import SimulatedBackend
+import numpy as np
+import pytest
+import threading
+import time
+
+
+class Batches:
+	"""Collects the batches a Collector decodes, for waiting on from the test."""
+
+	def __init__(self):
+		self.batches = []
+		self._arrived = threading.Semaphore(0)
+
+	def __call__(self, batch):
+		self.batches.append(batch)
+		self._arrived.release()
+
+	def next(self):
+		assert self._arrived.acquire(timeout=5), "no batch arrived"
+		return self.batches[-1]
+
+
+@pytest.fixture
+def now():
+	# simulated time, moved on by hand so every sweep sees new values
+	return [100.0]
+
+
+@pytest.fixture
+def cards(now):
+	# the second device has no fan, so its fan_speed is null on the wire
+	backend = SimulatedBackend(2, notSupported={1: ('nvmlDeviceGetFanSpeed',)}, clock=lambda: now[0])
+	nvmlInit(backend)
+	yield [VideoCard(i, backend=backend) for i in range(2)]
+	nvmlShutdown(backend)
+
+
+@pytest.fixture(params=['tcp', 'unix'])
+def address(request, tmp_path):
+	return ('127.0.0.1', 0) if request.param == 'tcp' else str(tmp_path / 'collector.sock')
+
+
+def sweep(agent, now):
+	now[0] += 7.0
+	return agent.sample()
+
+
+def assertSame(records, sweep, fields):
+	expected = FleetSnapshot.fromSweep(sweep, fields).data
+	assert records['index'].tolist() == expected['index'].tolist()
+	for f in fields:
+		np.testing.assert_array_equal(records[f], expected[f], err_msg=f)
+
+
+def test_values_round_trip(cards, now, address):
+	batches = Batches()
+	with Collector(address, batches) as collector:
+		agent = Agent(collector.address, cards, batchSweeps=3, deadbands={}, host='test')
+		sent = [sweep(agent, now) for i in range(3)]
+		batch = batches.next()
+		agent.close()
+
+	assert batch.host == 'test'
+	assert batch.records.shape == (3, 2)
+	for (records, taken) in zip(batch.records, sent):
+		assertSame(records, taken, agent.fields)
+	assert collector.hosts() == ['test']
+	latest = collector.latest('test').data
+	assertSame(latest, sent[-1], agent.fields)
+	# unsupported values travel as nulls
+	assert np.isnan(latest['fan_speed'][1])
+	assert not np.isnan(latest['fan_speed'][0])
+
+
+def test_reconnects_with_a_keyframe_after_the_collector_restarts(cards, now, address):
+	batches = Batches()
+	collector = Collector(address, batches).start()
+	address = collector.address
+	agent = Agent(address, cards, batchSweeps=2, deadbands={}, host='test')
+	try:
+		for i in range(2):
+			sweep(agent, now)
+		batches.next()
+		collector.stop()
+		# let the agent see the hang-up
+		time.sleep(0.1)
+
+		batches = Batches()
+		collector = Collector(address, batches).start()
+		sweep(agent, now)
+		with pytest.raises(OSError):
+			sweep(agent, now)
+		assert agent.droppedSweeps == 2
+
+		sent = [sweep(agent, now) for i in range(2)]
+		batch = batches.next()
+		# static fields only come with a keyframe, so their being there
+		# means the new collector got one
+		assertSame(batch.records[-1], sent[-1], agent.fields)
+		assert not np.isnan(batch.records[-1]['mem_total']).any()
+	finally:
+		agent.close()
+		collector.stop()
+
+
+@pytest.mark.parametrize('keyframeInterval', [0.0, None])
+def test_keyframes_let_a_decoder_join_mid_stream(cards, now, keyframeInterval):
+	encoder = BatchEncoder(deadbands={}, keyframeInterval=keyframeInterval)
+	frames = []
+	for i in range(3):
+		now[0] += 7.0
+		taken = pollAll(cards, encoder.fields)
+		encoder.add(taken)
+		frames.append(encoder.frame())
+	late = BatchDecoder('test', encoder.fields, [0, 1]).decode(memoryview(frames[-1])[5:])
+	if keyframeInterval is None:
+		# a static field never changes, so it never reaches a late decoder
+		assert np.isnan(late.records[-1]['mem_total']).all()
+	else:
+		assertSame(late.records[-1], taken, encoder.fields)
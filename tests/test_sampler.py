@@ -0,0 +1,67 @@
+from collections import namedtuple
+from sampler import History
+import math
+import numpy as np
+
+Snapshot = namedtuple('Snapshot', ('index', 'timestamp', 'temperature', 'power_draw'))
+
+
+def filled(count, capacity=4):
+	history = History(('temperature', 'power_draw'), capacity)
+	for t in range(count):
+		history.append(Snapshot(0, float(t), 40 + t, None if t % 2 else 1000 * t))
+	return history
+
+
+def test_partial_fill():
+	history = filled(3)
+	assert len(history) == 3
+	assert history.window()[:, 0].tolist() == [0.0, 1.0, 2.0]
+	assert history.window(1)[:, 0].tolist() == [1.0, 2.0]
+	assert history.mean('temperature', 1) == 41.5
+
+
+def test_empty():
+	history = filled(0)
+	assert len(history.window(10)) == 0
+	assert math.isnan(history.mean('temperature', 10))
+
+
+def test_exactly_full():
+	history = filled(4)
+	assert history.window(10)[:, 0].tolist() == [0.0, 1.0, 2.0, 3.0]
+	assert history.window(1)[:, 0].tolist() == [2.0, 3.0]
+	assert history.mean('temperature', 10) == 41.5
+	assert history.max('temperature', 1) == 43
+	assert history.rate('temperature', 10) == 1.0
+
+
+def test_wraparound():
+	history = filled(6)
+	assert len(history) == 4
+	assert history.window()[:, 0].tolist() == [2.0, 3.0, 4.0, 5.0]
+	assert history.window(2)[:, 0].tolist() == [3.0, 4.0, 5.0]
+	# the cutoff falls in the wrapped part
+	assert history.window(0.5)[:, 0].tolist() == [5.0]
+	assert history.min('temperature', 10) == 42
+
+
+def test_wraparound_twice():
+	history = filled(8)
+	assert history.head == 0
+	assert history.window(1)[:, 0].tolist() == [6.0, 7.0]
+	assert history.percentile(50, 'temperature', 10) == 45.5
+
+
+def test_now():
+	history = filled(6)
+	assert history.window(1, now=4)[:, 0].tolist() == [3.0, 4.0]
+	assert history.window(10, now=2.5)[:, 0].tolist() == [2.0]
+	assert history.mean('temperature', 1, now=4) == 43.5
+
+
+def test_unsupported_values_are_nan():
+	history = filled(4)
+	(times, power) = history.series('power_draw', 10)
+	assert np.isnan(power[1::2]).all()
+	assert history.max('power_draw', 10) == 2000
@@ -0,0 +1,109 @@
+from card import CardError, VideoCard, nvmlInit, nvmlShutdown, snapshotType
+from nvmlconstants import nvmlClocksThrottleReasonGpuIdle
+from py3nvml.py3nvml import NVML_ERROR_UNKNOWN, NVMLError
+from scheduler import AdaptiveScheduler
+from simulator import SimulatedBackend
+import pytest
+import time
+
+
+class Clock:
+	def __init__(self, now=0.0):
+		self.now = now
+
+	def __call__(self):
+		return self.now
+
+
+class FlakyTemperature(SimulatedBackend):
+	"""Fails nvmlDeviceGetTemperature the given number of times, then recovers."""
+
+	failures = 0
+
+	def nvmlDeviceGetTemperature(self, handle, sensor):
+		if self.failures:
+			self.failures -= 1
+			raise NVMLError(NVML_ERROR_UNKNOWN)
+		return SimulatedBackend.nvmlDeviceGetTemperature(self, handle, sensor)
+
+
+class FakeCard:
+	"""Reports the power and idle flag it is told to."""
+
+	def __init__(self):
+		self.index = 0
+		self.power = 100000
+		self.idle = False
+
+	def temperatureThresholds(self):
+		return {'slowdown_threshold': 90}
+
+	def snapshot(self, fields):
+		values = {'power_draw': self.power, 'throttle_reasons': nvmlClocksThrottleReasonGpuIdle if self.idle else 0}
+		return snapshotType(fields)(self.index, 0.0, *[values[f] for f in fields])
+
+
+@pytest.fixture
+def clock():
+	# ten seconds in, both simulated devices are busy
+	return Clock(10.0)
+
+
+@pytest.fixture
+def backend(clock):
+	backend = FlakyTemperature(2, clock=clock)
+	backend.start = 0.0
+	nvmlInit(backend)
+	yield backend
+	nvmlShutdown(backend)
+
+
+def test_failed_read_is_retried(backend, clock):
+	cards = [VideoCard(i, backend=backend) for i in range(2)]
+	scheduler = AdaptiveScheduler(cards, clock=clock)
+	scheduler.step()
+	backend.failures = 1
+	clock.now += 0.1
+	with pytest.raises(CardError):
+		scheduler.step()
+	# the other device was still read, and nothing fell out of the queue
+	assert scheduler.reads == 3
+	assert len(scheduler._queue) == 6
+	clock.now += 0.1
+	assert len(scheduler.step()) == 2
+
+
+def test_thread_counts_errors_and_keeps_going(backend):
+	cards = [VideoCard(0, backend=backend)]
+	cards[0].snapshot()
+	backend.failures = 1
+	with AdaptiveScheduler(cards, minInterval=0.01) as scheduler:
+		deadline = time.monotonic() + 5
+		while scheduler.reads < 3 and time.monotonic() < deadline:
+			time.sleep(0.01)
+	assert scheduler.errors == 1
+	assert isinstance(scheduler.lastError, CardError)
+	assert scheduler.reads >= 3
+
+
+def test_waking_up_returns_to_the_fastest_rate():
+	clock = Clock()
+	card = FakeCard()
+	card.idle = True
+	scheduler = AdaptiveScheduler([card], policies={'power_draw': 20000}, idleInterval=10.0, clock=clock)
+	scheduler.step()
+	assert scheduler.interval(0, 'power_draw') == 10.0
+	card.idle = False
+	clock.now += 10.0
+	scheduler.step()
+	assert scheduler.interval(0, 'power_draw') == scheduler.minInterval
+
+
+def test_quiet_metrics_back_off():
+	clock = Clock()
+	card = FakeCard()
+	scheduler = AdaptiveScheduler([card], policies={'power_draw': 20000}, clock=clock)
+	for i in range(3):
+		scheduler.step()
+		clock.now = scheduler.nextDue()
+	assert scheduler.interval(0, 'power_draw') == pytest.approx(0.1 * 1.5 ** 2)
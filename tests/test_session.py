@@ -0,0 +1,64 @@
+from card import VideoCard, initGeneration
+from session import Session, getSession
+from simulator import SimulatedBackend
+import json
+import os
+import pytest
+
+
+class CountingHandles(SimulatedBackend):
+	"""Counts how often device handles are fetched."""
+
+	handleFetches = 0
+
+	def nvmlDeviceGetHandleByIndex(self, index):
+		self.handleFetches += 1
+		return SimulatedBackend.nvmlDeviceGetHandleByIndex(self, index)
+
+
+def test_sessions_nest():
+	backend = SimulatedBackend(1)
+	session = Session(backend, linger=False)
+	with session:
+		with session:
+			assert backend.initCount == 1
+		assert session.initialized
+	assert not session.initialized
+	assert backend.initCount == 0
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork()")
+def test_inherited_cards_reinitialize_in_a_forked_child():
+	backend = CountingHandles(1)
+	session = getSession(backend)
+	session.acquire()
+	card = VideoCard(0, backend=backend)
+	card.serial()
+	(read, write) = os.pipe()
+	pid = os.fork()
+	if pid == 0:
+		try:
+			before = (session.initialized, backend.initCount, backend.handleFetches)
+			# the first call on an inherited card initializes NVML again
+			card.temperature()
+			result = {
+				'before': before,
+				'after': (session.initialized, backend.initCount, backend.handleFetches),
+				'current': card._generation == initGeneration(),
+				'count': session.count,
+			}
+			os.write(write, json.dumps(result).encode())
+		finally:
+			os._exit(0)
+	os.close(write)
+	with os.fdopen(read) as pipe:
+		result = json.loads(pipe.read())
+	os.waitpid(pid, 0)
+
+	assert result['before'] == [False, 1, 1]
+	assert result['after'] == [True, 2, 2]
+	assert result['current']
+	assert result['count'] == 1
+	# nothing changed in the parent
+	assert session.initialized and backend.initCount == 1
+	session.close()
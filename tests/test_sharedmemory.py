@@ -0,0 +1,64 @@
+from card import VideoCard, nvmlInit, nvmlShutdown
+from simulator import SimulatedBackend
+from sharedmemory import SharedPublisher, SharedReader, ownerFormat, ownerOffset
+import os
+import pytest
+import subprocess
+import sys
+
+
+@pytest.fixture
+def cards():
+	backend = SimulatedBackend(2)
+	nvmlInit(backend)
+	yield [VideoCard(i, backend=backend) for i in range(2)]
+	nvmlShutdown(backend)
+
+
+@pytest.fixture
+def name():
+	return 'nvml-test-{}'.format(os.getpid())
+
+
+@pytest.fixture
+def publisher(cards, name):
+	# sampled by hand rather than started, so the sequence is predictable
+	publisher = SharedPublisher(cards, name=name)
+	publisher.sample()
+	yield publisher
+	publisher.close()
+
+
+def test_publish_and_read(publisher, name):
+	with SharedReader(name) as reader:
+		assert reader.sequence == 1
+		assert reader.read().data['index'].tolist() == [0, 1]
+		assert reader.snapshot(1).index == 1
+
+
+def test_live_segment_is_not_replaced(cards, publisher, name):
+	with pytest.raises(FileExistsError):
+		SharedPublisher(cards, name=name)
+	with SharedReader(name) as reader:
+		assert reader.sequence == 1
+
+
+def test_stale_segment_is_replaced(cards, publisher, name):
+	dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+	dead.wait()
+	ownerFormat.pack_into(publisher.segment.buf, ownerOffset, dead.pid)
+	replacement = SharedPublisher(cards, name=name)
+	try:
+		with SharedReader(name) as reader:
+			assert reader.sequence == 0
+	finally:
+		replacement.close()
+
+
+def test_reader_gives_up_on_an_unfinished_write(publisher, name):
+	with SharedReader(name, timeout=0.05) as reader:
+		publisher._sequence[0] += 1
+		with pytest.raises(TimeoutError):
+			reader.read()
+		publisher._sequence[0] += 1
+		assert reader.sequence == 2
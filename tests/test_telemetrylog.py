@@ -0,0 +1,45 @@
+from card import snapshotType
+from telemetrylog import TelemetryLog, TelemetryWriter, logDtype
+import math
+
+fields = ('temperature', 'power_draw', 'mem_used', 'throttle_reasons')
+Snapshot = snapshotType(fields)
+
+
+def test_record_is_packed():
+	assert logDtype(fields).itemsize == 2 + 8 + 1 + 4 + 8 + 8
+
+
+def test_round_trip_with_unsupported_values(tmp_path):
+	path = str(tmp_path / 'log')
+	written = [
+		Snapshot(0, 1.0, 45, 120000, 2 ** 33, 0x8000000000000000),
+		Snapshot(1, 1.0, None, 80000, None, None),
+		Snapshot(0, 2.0, 46, None, 2 ** 33 + 1, 1),
+	]
+	with TelemetryWriter(path, fields) as writer:
+		for s in written:
+			writer.append(s)
+	with TelemetryLog(path) as log:
+		assert list(log.snapshots()) == written
+		power = log.column('power_draw')
+		assert power[0] == 120000 and math.isnan(power[2])
+		assert log['temperature'].tolist() == [45, 255, 46]
+
+
+def test_out_of_range_values_are_clamped(tmp_path):
+	path = str(tmp_path / 'log')
+	with TelemetryWriter(path, fields) as writer:
+		writer.append(Snapshot(0, 1.0, 300, 1, 1, 1))
+	with TelemetryLog(path) as log:
+		assert next(log.snapshots()).temperature == 254
+
+
+def test_appending_to_an_existing_log(tmp_path):
+	path = str(tmp_path / 'log')
+	with TelemetryWriter(path, fields) as writer:
+		writer.append(Snapshot(0, 1.0, 45, 1, 1, 1))
+	with TelemetryWriter(path, fields) as writer:
+		writer.append(Snapshot(0, 2.0, 46, 1, 1, 1))
+	with TelemetryLog(path) as log:
+		assert log['timestamp'].tolist() == [1.0, 2.0]
@@ -0,0 +1,156 @@
+from card import getVideoCards, throttleReasonNames, NOT_SUPPORTED
+from fleet import pollAll
+from collections import deque, namedtuple
+from nvmlconstants import nvmlClocksThrottleReasonHwSlowdown
+import threading
+
+ThrottleEvent = namedtuple('ThrottleEvent', ('index', 'timestamp', 'reason', 'entered', 'duration'))
+ThrottleEvent.__doc__ = """One device entering or leaving one throttle reason.
+
+reason is the clocksThrottleReasons() key (or the hex bit for bits this
+library has no name for). duration is the seconds spent in the reason
+when leaving it, and None when entering."""
+
+
+def reasonName(bit):
+	name = throttleReasonNames.get(bit)
+	return name if name is not None else hex(bit)
+
+
+class ThrottleMonitor:
+	"""Follows each device's raw throttle bitmask and records every transition.
+
+	update() compares the new mask with the last one by XOR, so an unchanged
+	mask costs about a microsecond; only the bits that flipped are walked.
+	For every reason and device it keeps the number of entries and the total
+	seconds spent in it, plus the last maxIntervals closed intervals to
+	answer windowed questions like timeIn(index, reason, 3600). callback,
+	if given, receives each ThrottleEvent as soon as it is seen. Bits outside
+	the device's supportedThrottleReasons() are never reported."""
+
+	def __init__(self, cards=None, callback=None, maxIntervals=4096):
+		self.cards = getVideoCards() if cards is None else list(cards)
+		self.callback = callback
+		self.maxIntervals = maxIntervals
+		self.supported = {}
+		for c in self.cards:
+			supported = c.supportedThrottleReasons()
+			self.supported[c.index] = 0 if supported == NOT_SUPPORTED else supported
+		self.masks = dict((index, 0) for index in self.supported)
+		# device: timestamp of its last update
+		self.seen = {}
+		# (device, bit): [entries, seconds in closed intervals, entered at or None, closed intervals]
+		self._reasons = {}
+		self._lock = threading.Lock()
+
+	def _state(self, index, bit):
+		state = self._reasons.get((index, bit))
+		if state is None:
+			state = self._reasons[(index, bit)] = [0, 0.0, None, deque(maxlen=self.maxIntervals)]
+		return state
+
+	def update(self, index, mask, timestamp):
+		"""Feeds one device's current throttle mask; returns the ThrottleEvents it caused."""
+		if mask is None:
+			return ()
+		with self._lock:
+			self.seen[index] = timestamp
+			mask &= self.supported.get(index, mask)
+			changed = mask ^ self.masks.get(index, 0)
+			if not changed:
+				return ()
+			self.masks[index] = mask
+			events = []
+			while changed:
+				bit = changed & -changed
+				changed ^= bit
+				state = self._state(index, bit)
+				if mask & bit:
+					state[0] += 1
+					state[2] = timestamp
+					events.append(ThrottleEvent(index, timestamp, reasonName(bit), True, None))
+				else:
+					entered = state[2]
+					state[2] = None
+					duration = None
+					if entered is not None:
+						duration = timestamp - entered
+						state[1] += duration
+						state[3].append((entered, timestamp))
+					events.append(ThrottleEvent(index, timestamp, reasonName(bit), False, duration))
+		if self.callback is not None:
+			for event in events:
+				self.callback(event)
+		return events
+
+	def observe(self, snapshot):
+		"""Feeds a Snapshot (or every Snapshot of a Sweep) holding throttle_reasons."""
+		events = []
+		for s in getattr(snapshot, 'samples', (snapshot,)):
+			events.extend(self.update(s.index, s.throttle_reasons, s.timestamp))
+		return events
+
+	def poll(self):
+		"""Reads every card's throttle mask in one sweep; returns the events."""
+		return self.observe(pollAll(self.cards, ('throttle_reasons',)))
+
+	def active(self, index):
+		"""Names of the reasons currently holding a device's clocks down."""
+		mask = self.masks.get(index, 0)
+		names = []
+		while mask:
+			bit = mask & -mask
+			mask ^= bit
+			names.append(reasonName(bit))
+		return names
+
+	def _bit(self, reason):
+		if isinstance(reason, int):
+			return reason
+		for (bit, name) in throttleReasonNames.items():
+			if name == reason:
+				return bit
+		raise KeyError(reason)
+
+	def entries(self, index, reason):
+		"""How many times a device entered reason (a name or a bit)."""
+		state = self._reasons.get((index, self._bit(reason)))
+		return state[0] if state is not None else 0
+
+	def timeIn(self, index, reason, seconds=None, now=None):
+		"""Seconds a device spent in reason, in total or over the last seconds.
+
+		now is the time the window ends and the time an ongoing interval is
+		counted up to; it defaults to the timestamp of the device's last
+		update."""
+		state = self._reasons.get((index, self._bit(reason)))
+		if state is None:
+			return 0.0
+		(count, total, entered, intervals) = state
+		if now is None:
+			now = self.seen.get(index, 0.0)
+		if seconds is None:
+			return total + (now - entered if entered is not None else 0.0)
+		start = now - seconds
+		spent = 0.0
+		for (began, ended) in reversed(intervals):
+			if ended <= start:
+				break
+			spent += max(0.0, min(ended, now) - max(began, start))
+		if entered is not None and entered < now:
+			spent += now - max(entered, start)
+		return spent
+
+	def counters(self, index):
+		"""{reason: (entries, total seconds)} for one device, ongoing intervals excluded."""
+		return dict((reasonName(bit), (state[0], state[1]))
+			for ((i, bit), state) in self._reasons.items() if i == index)
+
+
+def hwSlowdownAlert(handler):
+	"""A ThrottleMonitor callback calling handler(event) whenever a device enters HW slowdown."""
+	name = reasonName(nvmlClocksThrottleReasonHwSlowdown)
+	def callback(event):
+		if event.entered and event.reason == name:
+			handler(event)
+	return callback